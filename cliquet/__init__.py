@@ -3,7 +3,7 @@
 import pkg_resources
 
 from cornice import Service as CorniceService
-from pyramid.settings import aslist
+from pyramid.settings import aslist, asbool
 
 from cliquet import authentication
 from cliquet import errors
@@ -41,10 +41,32 @@ PROTOCOL_VERSION = '2'
 DEFAULT_SETTINGS = {
     'backoff': None,
     'batch_max_requests': 25,
+    'batch_max_cost': None,
+    'batch_get_cost': 1,
+    'batch_head_cost': 1,
+    'batch_delete_cost': 2,
+    'batch_patch_cost': 2,
+    'batch_post_cost': 2,
+    'batch_put_cost': 2,
+    'batch_record_cost': 0.01,
+    'batch_user_max_cost': None,
+    'batch_user_cost_period_seconds': 60,
+    'batch_parallel_max_workers': 4,
     'cache_backend': '',
     'cache_url': '',
     'cache_pool_size': 25,
     'cache_prefix': '',
+    'cache_max_items': None,
+    'cache_max_size_bytes': None,
+    'cache_eviction_policy': 'lru',
+    'cache_purge_interval_seconds': 60,
+    'cache_purge_batch_size': 1000,
+    'cache_unlogged': False,
+    'cache_tiered_backend': '',
+    'cache_tiered_max_items': 1000,
+    'cache_tiered_ttl_seconds': 5,
+    'cache_tiered_invalidation_url': '',
+    'changes_enabled': False,
     'cors_origins': '*',
     'cors_max_age_seconds': 3600,
     'eos': None,
@@ -70,14 +92,24 @@ DEFAULT_SETTINGS = {
         'cliquet.initialization.setup_backoff',
         'cliquet.initialization.setup_statsd',
         'cliquet.initialization.setup_listeners',
+        'cliquet.initialization.setup_longpoll',
         'cliquet.events.setup_transaction_hook',
     ),
     'event_listeners': '',
+    'event_outbox': False,
+    'event_outbox_relay_batch_size': 100,
+    'event_outbox_relay_interval_seconds': 1,
+    'event_outbox_relay_max_attempts': 10,
     'logging_renderer': 'cliquet.logs.ClassicLogRenderer',
+    'longpoll_check_interval_seconds': 5,
+    'longpoll_max_wait_seconds': 0,
+    'longpoll_notifier_channel': 'cliquet.longpoll',
+    'longpoll_notifier_url': '',
     'newrelic_config': None,
     'newrelic_env': 'dev',
     'paginate_by': None,
     'permission_backend': '',
+    'permission_cache_ttl_seconds': None,
     'permission_url': '',
     'permission_pool_size': 25,
     'profiler_dir': '/tmp',
@@ -93,6 +125,7 @@ DEFAULT_SETTINGS = {
     'storage_url': '',
     'storage_max_fetch_size': 10000,
     'storage_pool_size': 25,
+    'storage_timestamp_cache_ttl_seconds': None,
     'tm.annotate_user': False,  # Do annotate transactions with the user-id.
     'transaction_per_request': True,
     'userid_hmac_secret': '',
@@ -134,7 +167,8 @@ def includeme(config):
     config.registry.heartbeats = {}
 
     # Public settings registry.
-    config.registry.public_settings = {'batch_max_requests', 'readonly'}
+    config.registry.public_settings = {'batch_max_requests',
+                                       'batch_max_cost', 'readonly'}
 
     # Directive to declare arbitrary API capabilities.
     def add_api_capability(config, identifier, description="", url="", **kw):
@@ -190,7 +224,15 @@ def includeme(config):
     #     logger.info('Using %s = %s' % (key, value))
 
     # Scan views.
-    config.scan("cliquet.views")
+    ignored_views = []
+    if asbool(settings['changes_enabled']):
+        config.add_api_capability(
+            "changes",
+            description="Track the changes of every collection at once.",
+            url="http://cliquet.readthedocs.org/en/latest/api/changes.html")
+    else:
+        ignored_views.append('cliquet.views.changes')
+    config.scan("cliquet.views", ignore=ignored_views)
 
     # Give sign of life.
     msg = "%(project_name)s %(project_version)s starting."
@@ -69,6 +69,53 @@ class CacheBase(object):
         """
         raise NotImplementedError
 
+    def purge_expired(self, limit=None):
+        """Delete the expired values.
+
+        Backends that expire values by themselves do not need to override it.
+
+        This is excuted when the ``cliquet purge-cache`` command is ran.
+
+        :param int limit: maximum number of values to delete
+        :returns: the number of deleted values.
+        :rtype: int
+        """
+        return 0
+
+    def get_many(self, keys):
+        """Obtain the values of the specified `keys`.
+
+        Backends can override it in order to obtain every value at once.
+
+        :param list keys: keys
+        :returns: the stored values by key, missing keys are omitted.
+        :rtype: dict
+        """
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def set_many(self, items, ttl=None):
+        """Store several values at once. If `ttl` is provided, set an
+        expiration value for each of them.
+
+        :param dict items: values to store by key
+        :param float ttl: expire after number of seconds
+        """
+        for key, value in items.items():
+            self.set(key, value, ttl)
+
+    def delete_many(self, keys):
+        """Delete the values of the specified `keys`.
+
+        :param list keys: keys
+        """
+        for key in keys:
+            self.delete(key)
+
 
 def heartbeat(backend):
     def ping(request):
@@ -1,19 +1,112 @@
+import heapq
+import threading
+from collections import OrderedDict, defaultdict
+
 from cliquet import utils
 from cliquet.cache import CacheBase
 
 
+class _LRUPolicy(object):
+    """Evict the least recently used keys first."""
+
+    def __init__(self):
+        self._keys = OrderedDict()
+
+    def add(self, key):
+        self._keys[key] = True
+
+    def touch(self, key):
+        self._keys.pop(key, None)
+        self._keys[key] = True
+
+    def remove(self, key):
+        self._keys.pop(key, None)
+
+    def victim(self, exclude=None):
+        for key in self._keys:
+            if key != exclude:
+                return key
+
+
+class _LFUPolicy(object):
+    """Evict the least frequently used keys first (and the least recently
+    used among them)."""
+
+    def __init__(self):
+        self._counts = {}
+        self._buckets = defaultdict(OrderedDict)
+        self._min_count = 0
+
+    def add(self, key):
+        self._counts[key] = 1
+        self._buckets[1][key] = True
+        self._min_count = 1
+
+    def touch(self, key):
+        count = self._counts.get(key)
+        if count is None:
+            return self.add(key)
+        self._unlink(key, count)
+        self._counts[key] = count + 1
+        self._buckets[count + 1][key] = True
+
+    def remove(self, key):
+        count = self._counts.pop(key, None)
+        if count is not None:
+            self._unlink(key, count)
+
+    def _unlink(self, key, count):
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            if self._min_count == count:
+                self._min_count = count + 1
+
+    def victim(self, exclude=None):
+        for key in self._buckets.get(self._min_count, {}):
+            if key != exclude:
+                return key
+        for count in sorted(self._buckets.keys()):
+            for key in self._buckets[count]:
+                if key != exclude:
+                    return key
+
+
+_POLICIES = {
+    'lru': _LRUPolicy,
+    'lfu': _LFUPolicy,
+}
+
+
 class Cache(CacheBase):
-    """Cache backend implementation in local thread memory.
+    """Cache backend implementation in local process memory.
 
     Enable in configuration::
 
         cliquet.cache_backend = cliquet.cache.memory
 
+    *(Optional)* The number of stored items, or their total size (estimated
+    from their JSON representation), can be bounded::
+
+        cliquet.cache_max_items = 10000
+        cliquet.cache_max_size_bytes = 52428800
+
+    When full, the least recently used values are evicted. The least
+    frequently used can be evicted instead::
+
+        cliquet.cache_eviction_policy = lfu
+
     :noindex:
     """
 
     def __init__(self, *args, **kwargs):
+        self.max_items = kwargs.pop('max_items', None)
+        self.max_size_bytes = kwargs.pop('max_size_bytes', None)
+        policy = kwargs.pop('eviction_policy', None) or 'lru'
+        self._policy_factory = _POLICIES[policy.lower()]
         super(Cache, self).__init__(*args, **kwargs)
+        self._lock = threading.RLock()
         self.flush()
 
     def initialize_schema(self):
@@ -21,36 +114,123 @@ class Cache(CacheBase):
         pass
 
     def flush(self):
-        self._ttl = {}
-        self._store = {}
+        with self._lock:
+            self._store = {}
+            self._ttl = {}
+            # Heap of (expiration, key), with lazy removal of outdated items.
+            self._expirations = []
+            self._sizes = {}
+            self._total_size = 0
+            self._policy = self._policy_factory()
 
     def ttl(self, key):
-        ttl = self._ttl.get(self.prefix + key)
-        if ttl is not None:
-            return (ttl - utils.msec_time()) / 1000.0
-        return -1
+        with self._lock:
+            ttl = self._ttl.get(self.prefix + key)
+            if ttl is not None:
+                return (ttl - utils.msec_time()) / 1000.0
+            return -1
 
     def expire(self, key, ttl):
-        self._ttl[self.prefix + key] = utils.msec_time() + int(ttl * 1000.0)
+        with self._lock:
+            self._expire(self.prefix + key, ttl)
 
     def set(self, key, value, ttl=None):
-        if ttl is not None:
-            self.expire(key, ttl)
-        self._store[self.prefix + key] = value
+        key = self.prefix + key
+        with self._lock:
+            self._purge_expired()
+            if key in self._store:
+                self._policy.touch(key)
+            else:
+                self._policy.add(key)
+            self._store[key] = value
+            if ttl is not None:
+                self._expire(key, ttl)
+            if self.max_size_bytes is not None:
+                size = len(key) + len(utils.json.dumps(value))
+                self._total_size += size - self._sizes.get(key, 0)
+                self._sizes[key] = size
+            self._evict(protect=key)
 
     def get(self, key):
-        current = utils.msec_time()
-        expired = [k for k, v in self._ttl.items() if current >= v]
-        for expired_item_key in expired:
-            self.delete(expired_item_key[len(self.prefix):])
-        return self._store.get(self.prefix + key)
+        key = self.prefix + key
+        with self._lock:
+            self._purge_expired()
+            if key not in self._store:
+                return None
+            self._policy.touch(key)
+            return self._store[key]
 
     def delete(self, key):
-        key = self.prefix + key
+        with self._lock:
+            self._delete(self.prefix + key)
+
+    def get_many(self, keys):
+        with self._lock:
+            values = {}
+            for key in keys:
+                value = self.get(key)
+                if value is not None:
+                    values[key] = value
+            return values
+
+    def set_many(self, items, ttl=None):
+        with self._lock:
+            for key, value in items.items():
+                self.set(key, value, ttl)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._delete(self.prefix + key)
+
+    def _delete(self, key):
         self._ttl.pop(key, None)
+        self._total_size -= self._sizes.pop(key, 0)
         self._store.pop(key, None)
+        self._policy.remove(key)
+
+    def _expire(self, key, ttl):
+        expiration = utils.msec_time() + int(ttl * 1000.0)
+        self._ttl[key] = expiration
+        heapq.heappush(self._expirations, (expiration, key))
+        # Rebuild the heap when it is mostly filled with outdated items.
+        if len(self._expirations) > 2 * len(self._ttl) + 64:
+            self._expirations = [(v, k) for k, v in self._ttl.items()]
+            heapq.heapify(self._expirations)
+
+    def _purge_expired(self):
+        current = utils.msec_time()
+        heap = self._expirations
+        while heap and heap[0][0] <= current:
+            expiration, key = heapq.heappop(heap)
+            # Ignore items whose expiration was changed or removed.
+            if self._ttl.get(key) == expiration:
+                self._delete(key)
+
+    def _is_full(self):
+        too_many = (self.max_items is not None and
+                    len(self._store) > self.max_items)
+        too_big = (self.max_size_bytes is not None and
+                   self._total_size > self.max_size_bytes)
+        return too_many or too_big
+
+    def _evict(self, protect):
+        """Evict values until the cache is within bounds, keeping the value
+        that was just stored, unless it does not fit at all."""
+        while self._is_full():
+            key = self._policy.victim(exclude=protect)
+            if key is None:
+                self._delete(protect)
+                break
+            self._delete(key)
 
 
 def load_from_config(config):
     settings = config.get_settings()
-    return Cache(cache_prefix=settings['cache_prefix'])
+    max_items = settings.get('cache_max_items')
+    max_size_bytes = settings.get('cache_max_size_bytes')
+    return Cache(cache_prefix=settings['cache_prefix'],
+                 max_items=int(max_items) if max_items else None,
+                 max_size_bytes=int(max_size_bytes) if max_size_bytes
+                 else None,
+                 eviction_policy=settings.get('cache_eviction_policy'))
@@ -1,6 +1,9 @@
 from __future__ import absolute_import
 
 import os
+import time
+
+from pyramid.settings import asbool
 
 from cliquet import logger
 from cliquet.cache import CacheBase
@@ -58,11 +61,29 @@ class Cache(CacheBase):
         recommended to allow load balancing, replication or limit the number
         of connections used in a multi-process deployment.
 
+    Expired values are never returned, and are deleted by the writers at
+    most once per interval, by batches (``0`` to disable)::
+
+        cliquet.cache_purge_interval_seconds = 60
+        cliquet.cache_purge_batch_size = 1000
+
+    They can also be deleted using the ``cliquet purge-cache`` command.
+
+    *(Optional)* The cache table can be made ``UNLOGGED`` when
+    ``cliquet migrate`` is run. Writes are faster, but the values are lost
+    if the server crashes::
+
+        cliquet.cache_unlogged = true
+
     :noindex:
     """  # NOQA
     def __init__(self, client, *args, **kwargs):
+        self.purge_interval = kwargs.pop('purge_interval', None)
+        self.purge_batch_size = kwargs.pop('purge_batch_size', None)
+        self.unlogged = kwargs.pop('unlogged', False)
         super(Cache, self).__init__(*args, **kwargs)
         self.client = client
+        self._last_purge = time.time()
 
     def initialize_schema(self):
         # Create schema
@@ -71,6 +92,16 @@ class Cache(CacheBase):
         # Since called outside request, force commit.
         with self.client.connect(force_commit=True) as conn:
             conn.execute(schema)
+            persistence = 'UNLOGGED' if self.unlogged else 'LOGGED'
+            query = """
+            SELECT relpersistence
+              FROM pg_class
+             WHERE oid = 'cache'::regclass;
+            """
+            current = conn.execute(query).fetchone()['relpersistence']
+            # Avoid rewriting the whole table if unchanged.
+            if (current == 'u') != self.unlogged:
+                conn.execute('ALTER TABLE cache SET %s;' % persistence)
         logger.info('Created PostgreSQL cache tables')
 
     def flush(self):
@@ -87,7 +118,8 @@ class Cache(CacheBase):
         SELECT EXTRACT(SECOND FROM (ttl - now())) AS ttl
           FROM cache
          WHERE key = :key
-           AND ttl IS NOT NULL;
+           AND ttl IS NOT NULL
+           AND ttl > now();
         """
         with self.client.connect(readonly=True) as conn:
             result = conn.execute(query, dict(key=self.prefix + key))
@@ -104,24 +136,25 @@ class Cache(CacheBase):
 
     def set(self, key, value, ttl=None):
         query = """
-        WITH upsert AS (
-            UPDATE cache SET value = :value, ttl = sec2ttl(:ttl)
-             WHERE key=:key
-            RETURNING *)
         INSERT INTO cache (key, value, ttl)
-        SELECT :key, :value, sec2ttl(:ttl)
-        WHERE NOT EXISTS (SELECT * FROM upsert)
+        VALUES (:key, :value, sec2ttl(:ttl))
+        ON CONFLICT (key) DO UPDATE
+           SET value = EXCLUDED.value, ttl = EXCLUDED.ttl;
         """
         value = json.dumps(value)
         with self.client.connect() as conn:
             conn.execute(query, dict(key=self.prefix + key,
                                      value=value, ttl=ttl))
+        self._purge_periodically()
 
     def get(self, key):
-        purge = "DELETE FROM cache WHERE ttl IS NOT NULL AND now() > ttl;"
-        query = "SELECT value FROM cache WHERE key = :key;"
-        with self.client.connect() as conn:
-            conn.execute(purge)
+        query = """
+        SELECT value
+          FROM cache
+         WHERE key = :key
+           AND (ttl IS NULL OR ttl > now());
+        """
+        with self.client.connect(readonly=True) as conn:
             result = conn.execute(query, dict(key=self.prefix + key))
             if result.rowcount > 0:
                 value = result.fetchone()['value']
@@ -132,8 +165,80 @@ class Cache(CacheBase):
         with self.client.connect() as conn:
             conn.execute(query, dict(key=self.prefix + key))
 
+    def purge_expired(self, limit=None):
+        # Concurrent purges skip the rows that are already being deleted.
+        query = """
+        DELETE FROM cache
+         WHERE key IN (SELECT key
+                         FROM cache
+                        WHERE ttl IS NOT NULL
+                          AND ttl <= now()
+                        ORDER BY ttl
+                        LIMIT :limit
+                          FOR UPDATE SKIP LOCKED);
+        """
+        with self.client.connect() as conn:
+            result = conn.execute(query, dict(limit=limit))
+            deleted = result.rowcount
+        logger.debug('Purged %s expired PostgreSQL cache values' % deleted)
+        return deleted
+
+    def _purge_periodically(self):
+        """Delete a batch of expired values, if the last purge from this
+        process is older than the configured interval."""
+        if not self.purge_interval:
+            return
+        now = time.time()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        self.purge_expired(limit=self.purge_batch_size)
+
+    def get_many(self, keys):
+        query = """
+        SELECT key, value
+          FROM cache
+         WHERE key = ANY(CAST(:keys AS VARCHAR[]))
+           AND (ttl IS NULL OR ttl > now());
+        """
+        prefixed = [self.prefix + key for key in keys]
+        with self.client.connect(readonly=True) as conn:
+            result = conn.execute(query, dict(keys=prefixed))
+            results = result.fetchall()
+        return dict([(r['key'][len(self.prefix):], json.loads(r['value']))
+                     for r in results])
+
+    def set_many(self, items, ttl=None):
+        if not items:
+            return
+        query = """
+        INSERT INTO cache (key, value, ttl)
+        SELECT key, value, sec2ttl(:ttl)
+          FROM unnest(CAST(:keys AS VARCHAR[]), CAST(:values AS TEXT[]))
+               AS items(key, value)
+        ON CONFLICT (key) DO UPDATE
+           SET value = EXCLUDED.value, ttl = EXCLUDED.ttl;
+        """
+        keys = [self.prefix + key for key in items.keys()]
+        values = [json.dumps(value) for value in items.values()]
+        with self.client.connect() as conn:
+            conn.execute(query, dict(keys=keys, values=values, ttl=ttl))
+        self._purge_periodically()
+
+    def delete_many(self, keys):
+        query = "DELETE FROM cache WHERE key = ANY(CAST(:keys AS VARCHAR[]))"
+        with self.client.connect() as conn:
+            conn.execute(query, dict(keys=[self.prefix + k for k in keys]))
+
 
 def load_from_config(config):
     settings = config.get_settings()
     client = create_from_config(config, prefix='cache_')
-    return Cache(client=client, cache_prefix=settings['cache_prefix'])
+    purge_interval = settings.get('cache_purge_interval_seconds')
+    purge_batch_size = settings.get('cache_purge_batch_size')
+    return Cache(client=client,
+                 cache_prefix=settings['cache_prefix'],
+                 purge_interval=float(purge_interval or 0),
+                 purge_batch_size=int(purge_batch_size) if purge_batch_size
+                 else None,
+                 unlogged=asbool(settings.get('cache_unlogged')))
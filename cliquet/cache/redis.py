@@ -72,6 +72,32 @@ class Cache(CacheBase):
     def delete(self, key):
         self._client.delete(self.prefix + key)
 
+    @wrap_redis_error
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self._client.mget([self.prefix + key for key in keys])
+        return dict([(key, json.loads(value.decode('utf-8')))
+                     for key, value in zip(keys, values) if value])
+
+    @wrap_redis_error
+    def set_many(self, items, ttl=None):
+        with self._client.pipeline() as pipe:
+            for key, value in items.items():
+                value = json.dumps(value)
+                if ttl:
+                    pipe.psetex(self.prefix + key, int(ttl * 1000), value)
+                else:
+                    pipe.set(self.prefix + key, value)
+            pipe.execute()
+
+    @wrap_redis_error
+    def delete_many(self, keys):
+        keys = [self.prefix + key for key in keys]
+        if keys:
+            self._client.delete(*keys)
+
 
 def load_from_config(config):
     settings = config.get_settings()
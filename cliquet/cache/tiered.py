@@ -0,0 +1,244 @@
+from __future__ import absolute_import
+
+import threading
+import time
+import uuid
+
+import redis
+from pyramid.exceptions import ConfigurationError
+
+from cliquet import logger
+from cliquet.cache import CacheBase, memory
+from cliquet.utils import json
+
+
+_INVALIDATION_CHANNEL = 'cliquet.cache.invalidations'
+_LISTENER_RETRY_SECONDS = 1
+
+
+class Cache(CacheBase):
+    """Cache backend that keeps the most used values in process memory, in
+    front of another cache backend.
+
+    Enable in configuration::
+
+        cliquet.cache_backend = cliquet.cache.tiered
+        cliquet.cache_tiered_backend = cliquet.cache.redis
+
+    The remote backend is configured with the usual cache settings
+    (e.g. ``cliquet.cache_url``).
+
+    *(Optional)* The number of values kept in memory, and for how long they
+    can be served without asking the remote backend, can be customized::
+
+        cliquet.cache_tiered_max_items = 1000
+        cliquet.cache_tiered_ttl_seconds = 5
+
+    When several processes share the remote backend, changes can be
+    broadcast with Redis Pub/Sub, so that they evict their in memory copies
+    instead of serving them until they expire::
+
+        cliquet.cache_tiered_invalidation_url = redis://localhost:6379/0
+
+    If StatsD is enabled, hits and misses of each tier are counted.
+
+    :noindex:
+    """
+
+    def __init__(self, remote, near, *args, **kwargs):
+        self.near_ttl = kwargs.pop('near_ttl', None)
+        self.invalidation_client = kwargs.pop('invalidation_client', None)
+        super(Cache, self).__init__(*args, **kwargs)
+        self.remote = remote
+        self.near = near
+        # Assigned when StatsD is enabled.
+        self.statsd = None
+        self._id = uuid.uuid4().hex
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def initialize_schema(self):
+        self.remote.initialize_schema()
+
+    def flush(self):
+        self.remote.flush()
+        self.near.flush()
+        self._broadcast(None)
+
+    def ttl(self, key):
+        return self.remote.ttl(key)
+
+    def expire(self, key, ttl):
+        self.remote.expire(key, ttl)
+        self.near.delete(key)
+        self._broadcast([key])
+
+    def set(self, key, value, ttl=None):
+        self._start_listener()
+        self.remote.set(key, value, ttl)
+        self.near.set(key, value, self._near_ttl(ttl))
+        self._broadcast([key])
+
+    def get(self, key):
+        self._start_listener()
+        value = self.near.get(key)
+        if value is not None:
+            self._count('near.hits')
+            return value
+        self._count('near.misses')
+
+        value = self.remote.get(key)
+        if value is None:
+            self._count('remote.misses')
+            return None
+        self._count('remote.hits')
+        self._set_near(key, value)
+        return value
+
+    def delete(self, key):
+        self.remote.delete(key)
+        self.near.delete(key)
+        self._broadcast([key])
+
+    def purge_expired(self, limit=None):
+        return self.remote.purge_expired(limit=limit)
+
+    def get_many(self, keys):
+        self._start_listener()
+        values = self.near.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        self._count('near.hits', len(values))
+        self._count('near.misses', len(missing))
+        if not missing:
+            return values
+
+        fetched = self.remote.get_many(missing)
+        self._count('remote.hits', len(fetched))
+        self._count('remote.misses', len(missing) - len(fetched))
+        for key, value in fetched.items():
+            self._set_near(key, value)
+        values.update(fetched)
+        return values
+
+    def set_many(self, items, ttl=None):
+        self._start_listener()
+        self.remote.set_many(items, ttl)
+        self.near.set_many(items, self._near_ttl(ttl))
+        self._broadcast(list(items.keys()))
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        self.remote.delete_many(keys)
+        self.near.delete_many(keys)
+        self._broadcast(keys)
+
+    def _near_ttl(self, ttl):
+        if ttl is None:
+            return self.near_ttl
+        if self.near_ttl is None:
+            return ttl
+        return min(ttl, self.near_ttl)
+
+    def _set_near(self, key, value):
+        """Keep a copy of the remote `value`, no longer than the remote
+        one."""
+        ttl = self.remote.ttl(key)
+        ttl = self._near_ttl(ttl if ttl >= 0 else None)
+        if ttl != 0:
+            self.near.set(key, value, ttl)
+
+    def _count(self, key, count=1):
+        if self.statsd is None or count == 0:
+            return
+        self.statsd.count('cache.tiered.%s' % key, count=count)
+
+    def _broadcast(self, keys):
+        """Tell the other processes to evict their copies of the specified
+        `keys` (or every value if ``None``)."""
+        if self.invalidation_client is None:
+            return
+        if keys is not None:
+            keys = [self.prefix + key for key in keys]
+        message = json.dumps({'sender': self._id, 'keys': keys})
+        try:
+            self.invalidation_client.publish(_INVALIDATION_CHANNEL, message)
+        except redis.RedisError as e:
+            # Copies on other processes will expire anyway.
+            logger.error(e)
+
+    def _on_invalidation(self, message):
+        payload = json.loads(message['data'])
+        if payload['sender'] == self._id:
+            return
+        if payload['keys'] is None:
+            self.near.flush()
+            return
+        # Processes with other prefixes share the channel.
+        keys = [key[len(self.prefix):] for key in payload['keys']
+                if key.startswith(self.prefix)]
+        self.near.delete_many(keys)
+
+    def _start_listener(self):
+        """Subscribe to invalidations, in a background thread started lazily
+        so that it runs in every forked worker."""
+        if self.invalidation_client is None:
+            return
+        listener = self._listener
+        if listener is not None and listener.is_alive():
+            return
+        with self._listener_lock:
+            if self._listener is listener:
+                subscribed = threading.Event()
+                thread = threading.Thread(target=self._listen,
+                                          args=(subscribed,))
+                thread.daemon = True
+                thread.start()
+                self._listener = thread
+                # Do not serve values that could have been invalidated while
+                # not subscribed.
+                subscribed.wait(_LISTENER_RETRY_SECONDS)
+                self.near.flush()
+
+    def _listen(self, subscribed):
+        while True:
+            pubsub = self.invalidation_client.pubsub(
+                ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(_INVALIDATION_CHANNEL)
+                subscribed.set()
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self._on_invalidation(message)
+            except redis.RedisError as e:
+                logger.error(e)
+                # Invalidations may have been missed.
+                self.near.flush()
+                time.sleep(_LISTENER_RETRY_SECONDS)
+            finally:
+                pubsub.close()
+
+
+def load_from_config(config):
+    settings = config.get_settings()
+    remote_mod = settings.get('cache_tiered_backend')
+    if not remote_mod:
+        raise ConfigurationError("Missing setting cache_tiered_backend")
+    remote = config.maybe_dotted(remote_mod).load_from_config(config)
+    if not isinstance(remote, CacheBase):
+        raise ConfigurationError("Invalid cache backend: %s" % remote)
+
+    max_items = settings.get('cache_tiered_max_items')
+    near = memory.Cache(cache_prefix=settings['cache_prefix'],
+                        max_items=int(max_items) if max_items else None)
+
+    near_ttl = settings.get('cache_tiered_ttl_seconds')
+    invalidation_url = settings.get('cache_tiered_invalidation_url')
+    invalidation_client = None
+    if invalidation_url:
+        invalidation_client = redis.StrictRedis.from_url(invalidation_url)
+
+    return Cache(remote=remote,
+                 near=near,
+                 cache_prefix=settings['cache_prefix'],
+                 near_ttl=float(near_ttl) if near_ttl else None,
+                 invalidation_client=invalidation_client)
@@ -1,8 +1,11 @@
+import copy
 from collections import OrderedDict
 
 import transaction
 from pyramid.events import NewRequest
+from pyramid.settings import asbool
 from enum import Enum
+from zope.interface import implementedBy
 
 from cliquet.logs import logger
 from cliquet.utils import strip_uri_prefix
@@ -70,6 +73,18 @@ class AfterResourceChanged(_ResourceEvent):
         self.impacted_records = impacted_records
 
 
+class RelayedResourceChanged(object):
+    """Triggered by the ``cliquet relay-events`` command, for each resource
+    change read from the events outbox.
+
+    Unlike the other events, it is not bound to any request.
+    """
+    def __init__(self, payload, impacted_records):
+        self.request = None
+        self.payload = payload
+        self.impacted_records = impacted_records
+
+
 def setup_transaction_hook(config):
     """
     Resource events are plugged with the transactions of ``pyramid_tm``.
@@ -77,37 +92,57 @@ def setup_transaction_hook(config):
     Once a transaction is committed, ``AfterResourceRead`` and
     ``AfterResourceChanged`` events are sent.
     """
-    def _notify_resource_events_before(request):
-        """Notify the accumulated resource events before end of transaction.
-        """
-        for event in request.get_resource_events():
-            request.registry.notify(event)
-
-    def _notify_resource_events_after(success, request):
-        """Notify the accumulated resource events if transaction succeeds.
-        """
-        if success:
-            for event in request.get_resource_events(after_commit=True):
-                try:
-                    request.registry.notify(event)
-                except Exception:
-                    logger.error("Unable to notify", exc_info=True)
-
     def on_new_request(event):
         """When a new request comes in, hook on transaction commit.
         """
         # Since there is one transaction per batch, ignore subrequests.
         if hasattr(event.request, 'parent'):
             return
-        current = transaction.get()
-        current.addBeforeCommitHook(_notify_resource_events_before,
-                                    args=(event.request,))
-        current.addAfterCommitHook(_notify_resource_events_after,
-                                   args=(event.request,))
+        notify_on_commit(event.request)
 
     config.add_subscriber(on_new_request, NewRequest)
 
 
+def _notify_resource_events_before(request):
+    """Notify the accumulated resource events before end of transaction.
+
+    If the events outbox is enabled, the changes are also stored in it, as
+    part of the transaction.
+    """
+    events = request.get_resource_events()
+    for event in events:
+        request.registry.notify(event)
+
+    if outbox_enabled(request.registry):
+        entries = [{'payload': event.payload,
+                    'impacted_records': event.impacted_records}
+                   for event in events if isinstance(event, ResourceChanged)]
+        request.registry.storage.outbox_add(entries)
+
+
+def _notify_resource_events_after(success, request):
+    """Notify the accumulated resource events if transaction succeeds.
+    """
+    if success:
+        for event in request.get_resource_events(after_commit=True):
+            try:
+                request.registry.notify(event)
+            except Exception:
+                logger.error("Unable to notify", exc_info=True)
+
+
+def notify_on_commit(request):
+    """Hook on the current transaction, in order to notify the resource
+    events accumulated by the specified `request` (and its subrequests)
+    when it is committed.
+    """
+    current = transaction.get()
+    current.addBeforeCommitHook(_notify_resource_events_before,
+                                args=(request,))
+    current.addAfterCommitHook(_notify_resource_events_after,
+                               args=(request,))
+
+
 def get_resource_events(request, after_commit=False):
     """
     Request helper to return the list of events triggered on resources.
@@ -131,6 +166,23 @@ def get_resource_events(request, after_commit=False):
     return events
 
 
+def has_subscribers(registry, action):
+    """Return ``True`` if some subscribers are registered for the events of
+    the specified `action`.
+
+    :rtype: bool
+    """
+    if action == ACTIONS.READ:
+        event_classes = (ResourceRead, AfterResourceRead)
+    else:
+        if outbox_enabled(registry):
+            return True
+        event_classes = (ResourceChanged, AfterResourceChanged)
+    subscriptions = registry.adapters.subscriptions
+    return any([subscriptions((implementedBy(event_cls),), None)
+                for event_cls in event_classes])
+
+
 def notify_resource_event(request, timestamp, data, action, old=None):
     """
     Request helper to stack a resource event.
@@ -138,7 +190,12 @@ def notify_resource_event(request, timestamp, data, action, old=None):
     If a similar event (same resource, same action) already occured during the
     current transaction (e.g. batch) then just extend the impacted records of
     the previous one.
+
+    Nothing is stacked if no subscriber would receive the event.
     """
+    if not has_subscribers(request.registry, action):
+        return
+
     if action == ACTIONS.READ:
         if not isinstance(data, list):
             data = [data]
@@ -159,8 +216,72 @@ def notify_resource_event(request, timestamp, data, action, old=None):
     # Add to impacted records or create new event.
     group_by = resource_name + action.value
 
-    if group_by in events:
-        already_impacted = events[group_by][2]
-        already_impacted.extend(impacted)
+    # Never extend the ``data`` list itself, it may not be rendered yet.
+    event = events.setdefault(group_by, (action, timestamp, [], request))
+    already_impacted = event[2]
+    already_impacted.extend(impacted)
+
+
+def outbox_enabled(registry):
+    """Return ``True`` if the resource changes are relayed to the listeners
+    through the events outbox (``cliquet.event_outbox`` setting).
+
+    :rtype: bool
+    """
+    return asbool(registry.settings.get('event_outbox', False))
+
+
+def relay_outbox(registry, limit=None, max_attempts=None):
+    """Notify the oldest changes of the events outbox as
+    :class:`RelayedResourceChanged` events, and delete them from the outbox
+    once delivered.
+
+    If a subscriber fails, the change remains in the outbox and will be
+    relayed again, unless it already failed `max_attempts` times: it is
+    then moved aside.
+
+    :param int limit: maximum number of changes to relay.
+    :param int max_attempts: number of failures before a change is moved
+        aside, unlimited if ``None``.
+    :returns: the number of relayed changes.
+    :rtype: int
+    """
+    def notify(entries):
+        failed = []
+        for i, entry in enumerate(entries):
+            try:
+                event = RelayedResourceChanged(entry['payload'],
+                                               entry['impacted_records'])
+                registry.notify(event)
+            except Exception:
+                logger.error("Unable to relay the change", exc_info=True)
+                failed.append(i)
+        return failed
+
+    with transaction.manager:
+        return registry.storage.outbox_relay(notify, limit=limit,
+                                             max_attempts=max_attempts)
+
+
+COMPACT_FIELDS = ('id', 'last_modified')
+
+
+def compact_event(event):
+    """Return a copy of the specified `event`, whose records only contain
+    their ids and timestamps.
+
+    :param event: a resource event
+    :returns: the compacted event
+    """
+    def compact(record):
+        return dict([(field, record[field]) for field in COMPACT_FIELDS
+                     if field in record])
+
+    compacted = copy.copy(event)
+    if hasattr(event, 'read_records'):
+        compacted.read_records = [compact(r) for r in event.read_records]
     else:
-        events[group_by] = (action, timestamp, impacted, request)
+        compacted.impacted_records = [
+            dict([(k, compact(r)) for k, r in impacted.items()])
+            for impacted in event.impacted_records]
+    return compacted
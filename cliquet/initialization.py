@@ -6,7 +6,6 @@ import structlog
 from pyramid.events import NewRequest, NewResponse
 from pyramid.exceptions import ConfigurationError
 from pyramid.httpexceptions import HTTPTemporaryRedirect, HTTPGone
-from pyramid.renderers import JSON as JSONRenderer
 from pyramid.security import NO_PERMISSION_REQUIRED
 from pyramid.interfaces import IAuthenticationPolicy
 from pyramid.settings import asbool, aslist
@@ -27,8 +26,14 @@ from cliquet import statsd
 from cliquet import cache
 from cliquet import storage
 from cliquet import permission
+from cliquet import longpoll
+from cliquet.listeners.asynchronous import Dispatcher
+from cliquet.permission.caching import CachedPermission
+from cliquet.storage.caching import CachedTimestampStorage
 from cliquet.logs import logger
-from cliquet.events import ResourceRead, ResourceChanged, ACTIONS
+from cliquet.events import (ResourceRead, ResourceChanged,
+                            AfterResourceChanged, RelayedResourceChanged,
+                            ACTIONS, compact_event, outbox_enabled)
 
 
 def setup_request_bound_data(config):
@@ -50,7 +55,7 @@ def setup_json_serializer(config):
     requests.models.json = utils.json
 
     # Override json renderer using ujson
-    renderer = JSONRenderer(serializer=utils.json_serializer)
+    renderer = utils.JSONRenderer(serializer=utils.json_serializer)
     config.add_renderer('json', renderer)
 
 
@@ -203,6 +208,12 @@ def setup_storage(config):
         raise ConfigurationError("Invalid storage backend: %s" % backend)
     config.registry.storage = backend
 
+    # Optionally keep the collections timestamps in the cache backend.
+    ttl = settings['storage_timestamp_cache_ttl_seconds']
+    if ttl:
+        config.registry.storage = CachedTimestampStorage(
+            backend, registry=config.registry, ttl=float(ttl))
+
     heartbeat = storage.heartbeat(backend)
     config.registry.heartbeats['storage'] = heartbeat
 
@@ -217,9 +228,17 @@ def setup_permission(config):
     backend = permission_mod.load_from_config(config)
     if not isinstance(backend, permission.PermissionBase):
         raise ConfigurationError("Invalid permission backend: %s" % backend)
-    config.registry.permission = backend
 
     heartbeat = permission.heartbeat(backend)
+
+    # Memoize permission lookups, and optionally share them across requests
+    # using the cache backend.
+    ttl = settings['permission_cache_ttl_seconds']
+    ttl = float(ttl) if ttl else None
+    config.registry.permission = CachedPermission(backend,
+                                                  registry=config.registry,
+                                                  ttl=ttl)
+
     config.registry.heartbeats['permission'] = heartbeat
 
 
@@ -249,9 +268,16 @@ def setup_statsd(config):
         config.registry.statsd = client
 
         client.watch_execution_time(config.registry.cache, prefix='cache')
-        client.watch_execution_time(config.registry.storage, prefix='storage')
-        client.watch_execution_time(config.registry.permission,
-                                    prefix='permission')
+        if hasattr(config.registry.cache, 'statsd'):
+            # Count hits and misses of the tiered cache.
+            config.registry.cache.statsd = client
+        # Monitor the actual backends, not their cache layer.
+        storage_backend = getattr(config.registry.storage, 'backend',
+                                  config.registry.storage)
+        client.watch_execution_time(storage_backend, prefix='storage')
+        permission_backend = getattr(config.registry.permission, 'backend',
+                                     config.registry.permission)
+        client.watch_execution_time(permission_backend, prefix='permission')
 
         # Commit so that configured policy can be queried.
         config.commit()
@@ -403,6 +429,17 @@ def setup_listeners(config):
     settings = config.get_settings()
     listeners = aslist(settings['event_listeners'])
 
+    if outbox_enabled(config.registry):
+        backend = getattr(config.registry, 'storage', None)
+        # Unwrap the cache layer of the backend (see ``setup_storage()``).
+        backend = getattr(backend, 'backend', backend)
+        outbox_add = getattr(backend.__class__, 'outbox_add', None)
+        if outbox_add in (None, storage.StorageBase.outbox_add):
+            error_msg = ("The events outbox is not supported by the "
+                         "storage backend: %s" %
+                         settings.get('storage_backend'))
+            raise ConfigurationError(error_msg)
+
     for name in listeners:
         logger.info('Setting up %r listener' % name)
         prefix = 'event_listeners.%s.' % name
@@ -415,12 +452,30 @@ def setup_listeners(config):
             listener_mod = config.maybe_dotted(settings[prefix + 'use'])
             listener = listener_mod.load_from_config(config, prefix)
 
-        # If StatsD is enabled, monitor execution time of listeners.
-        if getattr(config.registry, "statsd", None):
-            statsd_client = config.registry.statsd
+        statsd_client = getattr(config.registry, "statsd", None)
+        if asbool(settings.get(prefix + 'async', False)):
+            # Deliver the events from worker threads (also monitored).
+            listener = Dispatcher(
+                listener,
+                name=name,
+                queue_size=int(settings.get(prefix + 'async_queue_size',
+                                            1000)),
+                batch_size=int(settings.get(prefix + 'async_batch_size',
+                                            100)),
+                flush_interval=float(settings.get(
+                    prefix + 'async_flush_interval_seconds', 0.5)),
+                workers=int(settings.get(prefix + 'async_workers', 1)),
+                overflow=settings.get(prefix + 'async_overflow', 'drop'),
+                statsd=statsd_client)
+        elif statsd_client:
+            # If StatsD is enabled, monitor execution time of listeners.
             key = 'listeners.%s' % name
             listener = statsd_client.timer(key)(listener.__call__)
 
+        if asbool(settings.get(prefix + 'compact', False)):
+            # Only send the records ids and timestamps.
+            listener = _compacting(listener)
+
         actions = aslist(settings.get(prefix + 'actions', ''))
         if len(actions) > 0:
             actions = ACTIONS.from_string_list(actions)
@@ -435,7 +490,40 @@ def setup_listeners(config):
             if len(actions) == 1:
                 return
 
-        config.add_subscriber(listener, ResourceChanged, **options)
+        if outbox_enabled(config.registry):
+            # Changes are delivered by the ``cliquet relay-events`` command.
+            config.add_subscriber(listener, RelayedResourceChanged, **options)
+        else:
+            config.add_subscriber(listener, ResourceChanged, **options)
+
+
+def setup_longpoll(config):
+    settings = config.get_settings()
+    config.registry.longpoll = None
+
+    if not int(settings['longpoll_max_wait_seconds']):
+        return
+
+    notifier = longpoll.load_from_config(config)
+    config.registry.longpoll = notifier
+
+    def on_resource_changed(event):
+        """Wake up the requests waiting for the changes of this resource."""
+        notifier.notify(event.payload['resource_name'])
+
+    config.add_subscriber(on_resource_changed, AfterResourceChanged)
+
+    config.add_api_capability(
+        "longpoll",
+        description="Wait for the changes of collections.",
+        url="http://cliquet.readthedocs.org/en/latest/api/resource.html"
+            "#waiting-for-changes")
+
+
+def _compacting(listener):
+    def compacting_listener(event):
+        return listener(compact_event(event))
+    return compacting_listener
 
 
 def load_default_settings(config, default_settings):
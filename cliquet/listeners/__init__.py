@@ -8,3 +8,12 @@ class ListenerBase(object):
         :param event: Incoming event
         """
         raise NotImplementedError()
+
+    def call_many(self, events):
+        """Listeners can override it in order to process several events at
+        once (e.g. when delivered asynchronously).
+
+        :param list events: Incoming events
+        """
+        for event in events:
+            self(event)
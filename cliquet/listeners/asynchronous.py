@@ -0,0 +1,124 @@
+import atexit
+import threading
+import time
+
+from six.moves import queue
+
+from cliquet.logs import logger
+from cliquet.listeners import ListenerBase
+
+
+OVERFLOW_POLICIES = ('drop', 'block')
+
+
+class Dispatcher(ListenerBase):
+    """Listener that delivers the events to another listener asynchronously.
+
+    The events are put in a bounded queue, drained by worker threads that
+    deliver them by batches
+    (see :meth:`cliquet.listeners.ListenerBase.call_many`).
+
+    Enable in configuration::
+
+        cliquet.event_listeners.redis.async = true
+
+    *(Optional)* The queue size, the number of events delivered at once
+    (or after how long), and the number of workers can be customized::
+
+        cliquet.event_listeners.redis.async_queue_size = 1000
+        cliquet.event_listeners.redis.async_batch_size = 100
+        cliquet.event_listeners.redis.async_flush_interval_seconds = 0.5
+        cliquet.event_listeners.redis.async_workers = 1
+
+    When the queue is full, new events are dropped (``drop``), or the
+    request waits for room in the queue (``block``)::
+
+        cliquet.event_listeners.redis.async_overflow = drop
+
+    If StatsD is enabled, deliveries are timed and dropped events counted.
+
+    :param listener: the listener receiving the events.
+    :type listener: :class:`cliquet.listeners.ListenerBase`
+    """
+    def __init__(self, listener, name='', queue_size=1000, batch_size=100,
+                 flush_interval=0.5, workers=1, overflow='drop', statsd=None,
+                 *args, **kwargs):
+        super(Dispatcher, self).__init__(*args, **kwargs)
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy %r" % overflow)
+        self.listener = listener
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.workers = workers
+        self.overflow = overflow
+        self.statsd = statsd
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._threads_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def __call__(self, event):
+        self._start_workers()
+        try:
+            self._queue.put(event, block=self.overflow == 'block')
+        except queue.Full:
+            logger.warning("Event dropped by %r listener" % self.name)
+            if self.statsd is not None:
+                self.statsd.count('listeners.%s.dropped' % self.name)
+
+    def call_many(self, events):
+        for event in events:
+            self(event)
+
+    def flush(self):
+        """Deliver the queued events from the current thread."""
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for i in range(0, len(events), self.batch_size):
+            self._deliver(events[i:i + self.batch_size])
+
+    def _deliver(self, events):
+        try:
+            if self.statsd is not None:
+                key = 'listeners.%s' % self.name
+                with self.statsd.timer(key):
+                    self.listener.call_many(events)
+            else:
+                self.listener.call_many(events)
+        except Exception:
+            logger.error("Unable to deliver events", exc_info=True)
+
+    def _start_workers(self):
+        """Start the worker threads lazily, so that they run in every forked
+        worker process."""
+        threads = self._threads
+        if threads and all([thread.is_alive() for thread in threads]):
+            return
+        with self._threads_lock:
+            self._threads = [thread for thread in self._threads
+                             if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            events = [self._queue.get()]
+            # Wait a bit for more events, in order to deliver them at once.
+            deadline = time.time() + self.flush_interval
+            while len(events) < self.batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    events.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._deliver(events)
@@ -20,13 +20,20 @@ class Listener(ListenerBase):
         self.listname = listname
 
     def __call__(self, event):
-        try:
-            payload = json.dumps(event.payload)
-        except TypeError:
-            logger.error("Unable to dump the payload", exc_info=True)
+        self.call_many([event])
+
+    def call_many(self, events):
+        payloads = []
+        for event in events:
+            try:
+                payloads.append(json.dumps(event.payload))
+            except TypeError:
+                logger.error("Unable to dump the payload", exc_info=True)
+        if not payloads:
             return
         try:
-            self._client.lpush(self.listname, payload)
+            # Push them all at once.
+            self._client.lpush(self.listname, *payloads)
         except Exception:
             logger.error("Unable to send the payload to Redis", exc_info=True)
 
@@ -0,0 +1,163 @@
+from __future__ import absolute_import
+import json
+
+from redis.exceptions import ResponseError
+
+from cliquet.listeners import ListenerBase
+from cliquet.storage.redis import create_from_config
+from cliquet.logs import logger
+
+
+class Listener(ListenerBase):
+    """
+    A Redis-based event listener that appends the events payloads to Redis
+    Streams (Redis 5.0 or higher), one per resource (e.g.
+    ``cliquet.events.article``).
+
+    Streams are trimmed to approximately ``maxlen`` entries, and the events
+    of a batch are sent in a single round trip. Several workers can share
+    the events using consumer groups (see :class:`Consumer`).
+    """
+    def __init__(self, client, stream, maxlen=None, *args, **kwargs):
+        super(Listener, self).__init__(*args, **kwargs)
+        self._client = client
+        self.stream = stream
+        self.maxlen = maxlen
+
+    def stream_name(self, event):
+        """Return the name of the stream the specified `event` is sent to.
+        """
+        return '%s.%s' % (self.stream, event.payload['resource_name'])
+
+    def __call__(self, event):
+        self.call_many([event])
+
+    def call_many(self, events):
+        entries = []
+        for event in events:
+            try:
+                entries.append((self.stream_name(event),
+                                json.dumps(event.payload)))
+            except TypeError:
+                logger.error("Unable to dump the payload", exc_info=True)
+        if not entries:
+            return
+
+        trimming = ('MAXLEN', '~', self.maxlen) if self.maxlen else ()
+        pipeline = self._client.pipeline(transaction=False)
+        for stream, payload in entries:
+            arguments = trimming + ('*', 'event', payload)
+            pipeline.execute_command('XADD', stream, *arguments)
+        try:
+            pipeline.execute()
+        except Exception:
+            logger.error("Unable to send the payloads to Redis",
+                         exc_info=True)
+
+
+class Consumer(object):
+    """
+    Read the events sent by the :class:`Listener` as a member of a Redis
+    consumer group: each event is delivered to one consumer of the group,
+    until it is acknowledged.
+
+    .. code-block:: python
+
+        consumer = Consumer(client, ['cliquet.events.article'],
+                            group='indexers', name='worker-1')
+        consumer.create_group()
+        for stream, event_id, payload in consumer.read():
+            index(payload)
+            consumer.ack(stream, event_id)
+
+    :param client: a ``redis.StrictRedis`` client
+    :param list streams: the names of the streams to read from
+    :param str group: the consumer group name
+    :param str name: this consumer name, unique within the group
+    :param int count: maximum number of events per read
+    :param int block_ms: how long a read waits for new events
+    """
+    def __init__(self, client, streams, group, name, count=100,
+                 block_ms=5000):
+        self._client = client
+        self.streams = list(streams)
+        self.group = group
+        self.name = name
+        self.count = count
+        self.block_ms = block_ms
+
+    def create_group(self, start='$'):
+        """Create the consumer group on every stream (and the streams
+        themselves), unless it already exists.
+
+        :param str start: the id after which events are delivered to the
+            group (``$`` for new events only, ``0`` for every event).
+        """
+        for stream in self.streams:
+            try:
+                self._client.execute_command('XGROUP', 'CREATE', stream,
+                                             self.group, start, 'MKSTREAM')
+            except ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+
+    def read(self, pending=False):
+        """Read the next events of the group.
+
+        :param bool pending: if ``True``, read the events previously
+            delivered to this consumer and not acknowledged yet (e.g. after a
+            crash) instead of new events.
+        :returns: the list of ``(stream, event_id, payload)`` tuples.
+        :rtype: list
+        """
+        start = '0' if pending else '>'
+        command = ['XREADGROUP', 'GROUP', self.group, self.name,
+                   'COUNT', self.count]
+        if not pending:
+            command += ['BLOCK', self.block_ms]
+        command += ['STREAMS'] + self.streams + [start] * len(self.streams)
+        reply = self._client.execute_command(*command) or []
+
+        # Depending on the client version, the reply is raw, or parsed
+        # (e.g. fields as a mapping, streams as a mapping with RESP3).
+        if isinstance(reply, dict):
+            reply = reply.items()
+
+        events = []
+        for stream, entries in reply:
+            stream = _decode(stream)
+            for event_id, fields in entries:
+                if not fields:
+                    # Deleted meanwhile (e.g. trimmed).
+                    continue
+                if not isinstance(fields, dict):
+                    fields = dict(zip(fields[::2], fields[1::2]))
+                fields = dict([(_decode(field), value)
+                               for field, value in fields.items()])
+                payload = json.loads(_decode(fields['event']))
+                events.append((stream, _decode(event_id), payload))
+        return events
+
+    def ack(self, stream, *event_ids):
+        """Acknowledge the specified events, that will no longer be
+        delivered to the group.
+        """
+        if event_ids:
+            self._client.execute_command('XACK', stream, self.group,
+                                         *event_ids)
+
+
+def _decode(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value
+
+
+def load_from_config(config, prefix):
+    settings = config.get_settings()
+    settings.setdefault(prefix + 'url', '')
+    settings.setdefault(prefix + 'pool_size', 25)
+    stream = settings.get(prefix + 'stream', 'cliquet.events')
+    maxlen = int(settings.get(prefix + 'maxlen', 10000))
+    client = create_from_config(config, prefix)
+    return Listener(client, stream=stream, maxlen=maxlen)
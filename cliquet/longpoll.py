@@ -0,0 +1,132 @@
+from __future__ import absolute_import
+
+import threading
+import time
+from collections import defaultdict
+
+import redis
+
+from cliquet.logs import logger
+from cliquet.utils import json
+
+
+_LISTENER_RETRY_SECONDS = 1
+
+
+class Notifier(object):
+    """Wake up the requests that wait for the changes of a collection
+    (*long polling*).
+
+    Waiting requests read the current generation of a key (e.g. the resource
+    name), check the collection timestamp, and then block until the
+    generation changes. Since the generation is read before the timestamp, a
+    change committed meanwhile is never missed.
+
+    By default, only the requests of the current process are woken up. When
+    several processes serve the same storage, the notifications can be
+    broadcast with Redis Pub/Sub::
+
+        cliquet.longpoll_notifier_url = redis://localhost:6379/0
+
+    .. note::
+
+        Waiting requests block their thread. Serve the application with a
+        cooperative worker (e.g. ``gunicorn -k gevent``, which patches the
+        ``threading`` module), so that they do not exhaust the thread pool.
+    """
+    def __init__(self, client=None, channel='cliquet.longpoll'):
+        self.client = client
+        self.channel = channel
+        self._generations = defaultdict(int)
+        self._condition = threading.Condition()
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def generation(self, key):
+        """Return the current generation of the specified `key`, to be given
+        to :meth:`wait`.
+
+        :rtype: int
+        """
+        self._start_listener()
+        with self._condition:
+            return self._generations[key]
+
+    def wait(self, key, generation, timeout):
+        """Block until the `key` is notified after the specified
+        `generation`, or until the `timeout` (in seconds) expires.
+
+        :returns: ``True`` if the `key` was notified.
+        :rtype: bool
+        """
+        deadline = time.time() + timeout
+        with self._condition:
+            while self._generations[key] == generation:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def notify(self, key):
+        """Wake up the requests waiting on the specified `key`, in every
+        process if Pub/Sub is configured.
+        """
+        if self.client is None:
+            self._wake(key)
+            return
+        try:
+            self.client.publish(self.channel, json.dumps({'key': key}))
+        except redis.RedisError as e:
+            # Waiting requests will check the timestamps periodically anyway.
+            logger.error(e)
+            self._wake(key)
+
+    def _wake(self, key):
+        with self._condition:
+            self._generations[key] += 1
+            self._condition.notify_all()
+
+    def _start_listener(self):
+        """Subscribe to notifications, in a background thread started lazily
+        so that it runs in every forked worker."""
+        if self.client is None:
+            return
+        listener = self._listener
+        if listener is not None and listener.is_alive():
+            return
+        with self._listener_lock:
+            if self._listener is listener:
+                subscribed = threading.Event()
+                thread = threading.Thread(target=self._listen,
+                                          args=(subscribed,))
+                thread.daemon = True
+                thread.start()
+                self._listener = thread
+                subscribed.wait(_LISTENER_RETRY_SECONDS)
+
+    def _listen(self, subscribed):
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                subscribed.set()
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        payload = json.loads(message['data'])
+                        self._wake(payload['key'])
+            except redis.RedisError as e:
+                logger.error(e)
+                time.sleep(_LISTENER_RETRY_SECONDS)
+            finally:
+                pubsub.close()
+
+
+def load_from_config(config):
+    settings = config.get_settings()
+    client = None
+    notifier_url = settings['longpoll_notifier_url']
+    if notifier_url:
+        client = redis.StrictRedis.from_url(notifier_url)
+    return Notifier(client=client,
+                    channel=settings['longpoll_notifier_channel'])
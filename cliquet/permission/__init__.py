@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 from pyramid.settings import asbool
 
 from cliquet.logs import logger
@@ -169,6 +171,62 @@ class PermissionBase(object):
         """
         raise NotImplementedError
 
+    def apply_many(self, changes):
+        """Apply several permissions modifications, on one or many objects.
+
+        Backends can override it in order to apply every change at once
+        (e.g. in a single query or pipeline).
+
+        :param list changes: List of ``(operation, object_id, permissions)``
+            tuples, applied in order. The operation is either ``'replace'``
+            (like :meth:`replace_object_permissions`), ``'add'`` (the
+            principals are added to each specified permission) or
+            ``'delete'`` (like :meth:`delete_object_permissions`, the
+            permissions are ignored).
+        :returns: The resulting permissions of each modified object.
+        :rtype: dict
+        """
+        changes = list(changes)
+        squashed = self._squash_changes(changes)
+        for operation, object_id, permissions in changes:
+            if operation == 'delete':
+                self.delete_object_permissions(object_id)
+            elif operation == 'replace':
+                self.replace_object_permissions(object_id, permissions)
+            else:
+                for permission, principals in permissions.items():
+                    for principal in principals:
+                        self.add_principal_to_ace(object_id, permission,
+                                                  principal)
+        return dict([(object_id, self.object_permissions(object_id))
+                     for object_id in squashed.keys()])
+
+    def _squash_changes(self, changes):
+        """Reduce the list of changes to their resulting effect on each
+        object.
+
+        :returns: For each object id, whether its permissions are deleted, the
+            permissions to replace, and the principals to add to permissions.
+        :rtype: :class:`collections.OrderedDict`
+        """
+        squashed = OrderedDict()
+        for operation, object_id, permissions in changes:
+            cleared, replaced, added = squashed.setdefault(object_id,
+                                                           (False, {}, {}))
+            if operation == 'delete':
+                squashed[object_id] = (True, {}, {})
+            elif operation == 'replace':
+                for permission, principals in permissions.items():
+                    replaced[permission] = set(principals)
+                    added.pop(permission, None)
+            elif operation == 'add':
+                for permission, principals in permissions.items():
+                    target = replaced if permission in replaced else added
+                    target.setdefault(permission, set()).update(principals)
+            else:
+                raise ValueError('Unknown permission operation %r' % operation)
+        return squashed
+
 
 def heartbeat(backend):
     def ping(request):
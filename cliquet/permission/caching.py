@@ -0,0 +1,267 @@
+from __future__ import absolute_import
+
+import transaction
+from pyramid.threadlocal import get_current_request
+
+from cliquet import utils
+from cliquet.permission import PermissionBase
+
+
+_REQUEST_STORE_KEY = 'permission_cache'
+_ACL_CACHE_KEY = 'permission_acl:%s'
+_PRINCIPALS_CACHE_KEY = 'permission_principals:%s'
+_PRINCIPALS_VERSION_KEY = 'permission_principals_version'
+
+
+class CachedPermission(PermissionBase):
+    """Permission backend wrapper that memoizes the lookups.
+
+    The results of :meth:`check_permission`, :meth:`object_permissions` and
+    :meth:`user_principals` are kept for the duration of the current request.
+    Since they are stored in ``request.bound_data``, they are shared among the
+    subrequests of a batch.
+
+    *(Optional)* Objects Access Control Lists and users effective principals
+    can also be kept in the cache backend, in order to be shared across
+    requests::
+
+        cliquet.permission_cache_ttl_seconds = 60
+
+    Every write operation going through this wrapper invalidates the
+    memoized values of the current request, and the cached ACLs of the
+    modified objects (again once the current transaction is committed).
+
+    Cached users principals are invalidated when the user principals are
+    modified. Since :meth:`remove_principal` concerns every user, the
+    cached principals are stamped with a version, that is changed on
+    removal.
+
+    .. note::
+
+        :meth:`flush` does not purge the ACLs kept in the cache backend.
+        The cached principals are invalidated though.
+
+    :param backend: the wrapped permission backend.
+    :type backend: :class:`cliquet.permission.PermissionBase`
+    :param registry: the application registry, where the cache backend
+        is looked up.
+    :param float ttl: expiration of ACLs in the cache backend, disabled
+        if ``None``.
+    """
+
+    def __init__(self, backend, registry=None, ttl=None, *args, **kwargs):
+        super(CachedPermission, self).__init__(*args, **kwargs)
+        self.backend = backend
+        self._registry = registry
+        self._ttl = ttl
+
+    def __getattr__(self, name):
+        # Expose the wrapped backend specific attributes (e.g. ``settings``).
+        if name == 'backend':
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    @property
+    def _cache(self):
+        if self._ttl is None:
+            return None
+        return getattr(self._registry, 'cache', None)
+
+    def _request_store(self):
+        """Return the memoization dict of the current request, or ``None``
+        when called outside of a request (e.g. scripts)."""
+        request = get_current_request()
+        bound_data = getattr(request, 'bound_data', None)
+        if not isinstance(bound_data, dict):
+            return None
+        return bound_data.setdefault(_REQUEST_STORE_KEY, {})
+
+    def _memoize(self, key, func):
+        store = self._request_store()
+        if store is None:
+            return func()
+        if key not in store:
+            store[key] = func()
+        return store[key]
+
+    def _invalidate(self, *object_id_list):
+        self._purge([_ACL_CACHE_KEY % object_id
+                     for object_id in object_id_list])
+
+    def _purge(self, keys, bump_version=False):
+        store = self._request_store()
+        if store is not None:
+            store.clear()
+
+        cache = self._cache
+        if cache is None or not (keys or bump_version):
+            return
+
+        def purge(success=True):
+            if keys:
+                cache.delete_many(keys)
+            if bump_version:
+                self._bump_principals_version(cache)
+
+        purge()
+        if store is not None:
+            # Concurrent requests may have cached the values that were
+            # committed before this request transaction: purge them again
+            # once over.
+            transaction.get().addAfterCommitHook(purge)
+
+    def _bump_principals_version(self, cache):
+        version = utils.random_bytes_hex(8)
+        cache.set(_PRINCIPALS_VERSION_KEY, version)
+        return version
+
+    def _user_principals(self, user_id):
+        """Return the principals of the specified user, looked up in the
+        cache backend first if enabled."""
+        cache = self._cache
+        if cache is None:
+            return self.backend.user_principals(user_id)
+
+        # Obtain the version before reading the backend, so that the values
+        # read during a change are not cached with the new version.
+        version = cache.get(_PRINCIPALS_VERSION_KEY)
+        if version is None:
+            version = self._bump_principals_version(cache)
+
+        key = _PRINCIPALS_CACHE_KEY % user_id
+        cached = cache.get(key)
+        if cached is not None and cached['version'] == version:
+            return set(cached['principals'])
+
+        principals = self.backend.user_principals(user_id)
+        cached = {'version': version, 'principals': list(principals)}
+        cache.set(key, cached, self._ttl)
+        return principals
+
+    def _object_acl(self, object_id):
+        """Return every permission of the specified object, looked up in the
+        cache backend first if enabled."""
+        cache = self._cache
+        if cache is None:
+            return self.backend.object_permissions(object_id)
+        return self._object_acls([object_id])[object_id]
+
+    def _object_acls(self, object_id_list):
+        """Return every permission of the specified objects, looked up in
+        one round trip to the cache backend."""
+        keys = dict([(_ACL_CACHE_KEY % object_id, object_id)
+                     for object_id in object_id_list])
+        cached = self._cache.get_many(list(keys.keys()))
+
+        acls = {}
+        missing = {}
+        for key, object_id in keys.items():
+            if key in cached:
+                acls[object_id] = dict([(perm, set(principals))
+                                        for perm, principals
+                                        in cached[key].items()])
+                continue
+            acl = self.backend.object_permissions(object_id)
+            acls[object_id] = acl
+            missing[key] = dict([(perm, list(principals))
+                                 for perm, principals in acl.items()])
+        if missing:
+            self._cache.set_many(missing, self._ttl)
+        return acls
+
+    def initialize_schema(self):
+        self.backend.initialize_schema()
+
+    def flush(self):
+        self._purge([], bump_version=True)
+        self.backend.flush()
+
+    def add_user_principal(self, user_id, principal):
+        self._purge([_PRINCIPALS_CACHE_KEY % user_id])
+        self.backend.add_user_principal(user_id, principal)
+
+    def remove_user_principal(self, user_id, principal):
+        self._purge([_PRINCIPALS_CACHE_KEY % user_id])
+        self.backend.remove_user_principal(user_id, principal)
+
+    def remove_principal(self, principal):
+        self._purge([], bump_version=True)
+        self.backend.remove_principal(principal)
+
+    def user_principals(self, user_id):
+        key = ('user_principals', user_id)
+        principals = self._memoize(key, lambda: self._user_principals(user_id))
+        return set(principals)
+
+    def add_principal_to_ace(self, object_id, permission, principal):
+        self._invalidate(object_id)
+        self.backend.add_principal_to_ace(object_id, permission, principal)
+
+    def remove_principal_from_ace(self, object_id, permission, principal):
+        self._invalidate(object_id)
+        self.backend.remove_principal_from_ace(object_id, permission,
+                                               principal)
+
+    def object_permission_principals(self, object_id, permission):
+        return self.backend.object_permission_principals(object_id,
+                                                         permission)
+
+    def principals_accessible_objects(self, principals, permission,
+                                      object_id_match=None,
+                                      get_bound_permissions=None):
+        return self.backend.principals_accessible_objects(
+            principals, permission,
+            object_id_match=object_id_match,
+            get_bound_permissions=get_bound_permissions)
+
+    def object_permission_authorized_principals(self, object_id, permission,
+                                                get_bound_permissions=None):
+        return self.backend.object_permission_authorized_principals(
+            object_id, permission,
+            get_bound_permissions=get_bound_permissions)
+
+    def check_permission(self, object_id, permission, principals,
+                         get_bound_permissions=None):
+        if get_bound_permissions is None:
+            perms = [(object_id, permission)]
+        else:
+            perms = get_bound_permissions(object_id, permission)
+        perms = tuple([tuple(p) for p in perms])
+        principals = frozenset(principals)
+
+        def check():
+            if self._cache is None:
+                return self.backend.check_permission(
+                    object_id, permission, principals,
+                    get_bound_permissions=lambda o, p: list(perms))
+
+            acls = self._object_acls(set([obj_id for obj_id, _ in perms]))
+            authorized = set()
+            for obj_id, perm in perms:
+                authorized |= acls[obj_id].get(perm, set())
+            return len(authorized & principals) > 0
+
+        key = ('check_permission', perms, principals)
+        return self._memoize(key, check)
+
+    def object_permissions(self, object_id, permissions=None):
+        acl = self._memoize(('object_permissions', object_id),
+                            lambda: self._object_acl(object_id))
+        if permissions is not None:
+            permissions = set(permissions)
+        return dict([(perm, set(principals))
+                     for perm, principals in acl.items()
+                     if permissions is None or perm in permissions])
+
+    def replace_object_permissions(self, object_id, permissions):
+        self._invalidate(object_id)
+        return self.backend.replace_object_permissions(object_id, permissions)
+
+    def delete_object_permissions(self, *object_id_list):
+        self._invalidate(*object_id_list)
+        self.backend.delete_object_permissions(*object_id_list)
+
+    def apply_many(self, changes):
+        changes = list(changes)
+        self._invalidate(*set([object_id for (_, object_id, _) in changes]))
+        return self.backend.apply_many(changes)
@@ -1,8 +1,74 @@
 import re
+from collections import defaultdict
 
 from cliquet.permission import PermissionBase
 
 
+class _PrefixTree(object):
+    """Set of objects ids, that can be looked up by prefix.
+
+    Objects ids are split on ``/``, so that looking up the objects of a
+    collection (e.g. ``/buckets/abc/collections/def/records/``) only walks
+    the matching branch.
+    """
+
+    def __init__(self):
+        self._root = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, object_id):
+        node = self._root
+        for segment in object_id.split('/'):
+            node = node.setdefault(segment, {})
+        if None not in node:
+            node[None] = object_id
+            self._size += 1
+
+    def discard(self, object_id):
+        path = [self._root]
+        for segment in object_id.split('/'):
+            node = path[-1].get(segment)
+            if node is None:
+                return
+            path.append(node)
+        if path[-1].pop(None, None) is None:
+            return
+        self._size -= 1
+        # Prune empty branches.
+        segments = object_id.split('/')
+        for parent, segment in reversed(list(zip(path[:-1], segments))):
+            if parent[segment]:
+                break
+            del parent[segment]
+
+    def startswith(self, prefix):
+        """Iterate the objects ids starting with the specified prefix."""
+        segments = prefix.split('/')
+        node = self._root
+        for segment in segments[:-1]:
+            node = node.get(segment)
+            if node is None:
+                return
+        partial = segments[-1]
+        for segment, child in list(node.items()):
+            if segment is not None and segment.startswith(partial):
+                for object_id in self._walk(child):
+                    yield object_id
+
+    def _walk(self, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for segment, child in node.items():
+                if segment is None:
+                    yield child
+                else:
+                    stack.append(child)
+
+
 class Permission(PermissionBase):
     """Permission backend implementation in local thread memory.
 
@@ -22,86 +88,98 @@ class Permission(PermissionBase):
         pass
 
     def flush(self):
-        self._store = {}
+        # user_id -> set of principals
+        self._user_principals = {}
+        # object_id -> permission -> set of principals
+        self._aces = {}
+        # (principal, permission) -> prefix tree of objects ids
+        self._principal_objects = {}
 
     def add_user_principal(self, user_id, principal):
-        user_key = 'user:%s' % user_id
-        user_principals = self._store.get(user_key, set())
-        user_principals.add(principal)
-        self._store[user_key] = user_principals
+        self._user_principals.setdefault(user_id, set()).add(principal)
 
     def remove_user_principal(self, user_id, principal):
-        user_key = 'user:%s' % user_id
-        user_principals = self._store.get(user_key, set())
-        try:
-            user_principals.remove(principal)
-        except KeyError:
-            pass
+        user_principals = self._user_principals.get(user_id, set())
+        user_principals.discard(principal)
         if len(user_principals) == 0:
-            if user_key in self._store:
-                del self._store[user_key]
-        else:
-            self._store[user_key] = user_principals
+            self._user_principals.pop(user_id, None)
 
     def remove_principal(self, principal):
-        for user_principals in self._store.values():
-            try:
-                user_principals.remove(principal)
-            except KeyError:
-                pass
+        for user_id in list(self._user_principals.keys()):
+            self.remove_user_principal(user_id, principal)
 
     def user_principals(self, user_id):
-        user_key = 'user:%s' % user_id
-        members = self._store.get(user_key, set())
-        return members
+        return set(self._user_principals.get(user_id, set()))
+
+    def _index(self, object_id, permission, principals):
+        for principal in principals:
+            key = (principal, permission)
+            tree = self._principal_objects.setdefault(key, _PrefixTree())
+            tree.add(object_id)
+
+    def _unindex(self, object_id, permission, principals):
+        for principal in principals:
+            key = (principal, permission)
+            tree = self._principal_objects.get(key)
+            if tree is not None:
+                tree.discard(object_id)
+                if len(tree) == 0:
+                    del self._principal_objects[key]
 
     def add_principal_to_ace(self, object_id, permission, principal):
-        permission_key = 'permission:%s:%s' % (object_id, permission)
-        object_permission_principals = self._store.get(permission_key, set())
-        object_permission_principals.add(principal)
-        self._store[permission_key] = object_permission_principals
+        acl = self._aces.setdefault(object_id, {})
+        acl.setdefault(permission, set()).add(principal)
+        self._index(object_id, permission, [principal])
 
     def remove_principal_from_ace(self, object_id, permission, principal):
-        permission_key = 'permission:%s:%s' % (object_id, permission)
-        object_permission_principals = self._store.get(permission_key, set())
-        try:
-            object_permission_principals.remove(principal)
-        except KeyError:
-            pass
-        if len(object_permission_principals) == 0:
-            if permission_key in self._store:
-                del self._store[permission_key]
-        else:
-            self._store[permission_key] = object_permission_principals
+        acl = self._aces.get(object_id, {})
+        principals = acl.get(permission, set())
+        if principal in principals:
+            principals.remove(principal)
+            self._unindex(object_id, permission, [principal])
+        if len(principals) == 0:
+            acl.pop(permission, None)
+        if len(acl) == 0:
+            self._aces.pop(object_id, None)
 
     def object_permission_principals(self, object_id, permission):
-        permission_key = 'permission:%s:%s' % (object_id, permission)
-        members = self._store.get(permission_key, set())
-        return members
+        acl = self._aces.get(object_id, {})
+        return set(acl.get(permission, set()))
+
+    def _compile(self, pattern):
+        parts = [re.escape(part) for part in pattern.split('*')]
+        return re.compile('^%s$' % '.*'.join(parts), re.DOTALL)
 
     def principals_accessible_objects(self, principals, permission,
                                       object_id_match=None,
                                       get_bound_permissions=None):
-        principals = set(principals)
         if object_id_match is None:
             object_id_match = '*'
 
         if get_bound_permissions is None:
-            object_id_match = object_id_match.replace('*', '.*')
-            keys = [(re.compile(object_id_match), permission)]
+            keys = [(object_id_match, permission)]
         else:
             keys = get_bound_permissions(object_id_match, permission)
-            keys = [(re.compile(obj_id.replace('*', '.*')), p) for (obj_id, p)
-                    in keys if obj_id.endswith(object_id_match)]
+            keys = [(obj_id, p) for (obj_id, p) in keys
+                    if obj_id.endswith(object_id_match)]
 
         objects = set()
-        for obj_id, perm in keys:
-            for key, value in self._store.items():
-                if key.endswith(perm):
-                    if len(principals & value) > 0:
-                        object_id = key.split(':')[1]
-                        if obj_id.match(object_id):
-                            objects.add(object_id)
+        for pattern, perm in keys:
+            prefix = pattern.split('*', 1)[0]
+            regexp = self._compile(pattern) if '*' in pattern else None
+            for principal in set(principals):
+                tree = self._principal_objects.get((principal, perm))
+                if tree is None:
+                    continue
+                if regexp is None:
+                    # Exact object id.
+                    acl = self._aces.get(pattern, {})
+                    if principal in acl.get(perm, set()):
+                        objects.add(pattern)
+                    continue
+                for object_id in tree.startswith(prefix):
+                    if regexp.match(object_id):
+                        objects.add(object_id)
         return objects
 
     def object_permission_authorized_principals(self, object_id, permission,
@@ -116,36 +194,49 @@ class Permission(PermissionBase):
         return principals
 
     def object_permissions(self, object_id, permissions=None):
+        acl = self._aces.get(object_id, {})
         if permissions is None:
-            aces = [k for k in self._store.keys()
-                    if k.startswith('permission:%s' % object_id)]
-        else:
-            aces = ['permission:%s:%s' % (object_id, permission)
-                    for permission in permissions]
-        permissions = {}
-        for ace in aces:
-            # Should work with stuff like 'permission:/url/id:record:create'.
-            permission = ace.split(':', 2)[2]
-            permissions[permission] = set(self._store[ace])
-        return permissions
+            permissions = acl.keys()
+        result = defaultdict(set)
+        for permission in permissions:
+            if permission in acl:
+                result[permission] = set(acl[permission])
+        return result
 
     def replace_object_permissions(self, object_id, permissions):
+        acl = self._aces.setdefault(object_id, {})
         for permission, principals in permissions.items():
-            permission_key = 'permission:%s:%s' % (object_id, permission)
-            if permission_key in self._store and len(principals) == 0:
-                del self._store[permission_key]
-            else:
-                self._store[permission_key] = set(principals)
+            principals = set(principals)
+            previous = acl.pop(permission, set())
+            self._unindex(object_id, permission, previous - principals)
+            self._index(object_id, permission, principals - previous)
+            if len(principals) > 0:
+                acl[permission] = principals
+        if len(acl) == 0:
+            self._aces.pop(object_id, None)
         return permissions
 
+    def apply_many(self, changes):
+        results = {}
+        squashed = self._squash_changes(changes)
+        for object_id, (cleared, replaced, added) in squashed.items():
+            if cleared:
+                self.delete_object_permissions(object_id)
+            self.replace_object_permissions(object_id, replaced)
+            for permission, principals in added.items():
+                for principal in principals:
+                    self.add_principal_to_ace(object_id, permission,
+                                              principal)
+            acl = self._aces.get(object_id, {})
+            results[object_id] = dict([(perm, set(principals))
+                                       for perm, principals in acl.items()])
+        return results
+
     def delete_object_permissions(self, *object_id_list):
-        to_delete = []
-        for key in self._store.keys():
-            object_id = key.split(':')[1]
-            if object_id in object_id_list:
-                to_delete.append(key)
-        for k in to_delete:
-            del self._store[k]
+        for object_id in object_id_list:
+            acl = self._aces.pop(object_id, {})
+            for permission, principals in acl.items():
+                self._unindex(object_id, permission, principals)
 
 
 def load_from_config(config):
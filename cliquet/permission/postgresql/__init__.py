@@ -87,13 +87,8 @@ class Permission(PermissionBase):
     def add_user_principal(self, user_id, principal):
         query = """
         INSERT INTO user_principals (user_id, principal)
-        SELECT :user_id, :principal
-         WHERE NOT EXISTS (
-            SELECT principal
-            FROM user_principals
-            WHERE user_id = :user_id
-              AND principal = :principal
-        );"""
+        VALUES (:user_id, :principal)
+        ON CONFLICT (user_id, principal) DO NOTHING;"""
         with self.client.connect() as conn:
             conn.execute(query, dict(user_id=user_id, principal=principal))
 
@@ -125,14 +120,8 @@ class Permission(PermissionBase):
     def add_principal_to_ace(self, object_id, permission, principal):
         query = """
         INSERT INTO access_control_entries (object_id, permission, principal)
-        SELECT :object_id, :permission, :principal
-         WHERE NOT EXISTS (
-            SELECT principal
-              FROM access_control_entries
-             WHERE object_id = :object_id
-               AND permission = :permission
-               AND principal = :principal
-        );"""
+        VALUES (:object_id, :permission, :principal)
+        ON CONFLICT (object_id, permission, principal) DO NOTHING;"""
         with self.client.connect() as conn:
             conn.execute(query, dict(object_id=object_id,
                                      permission=permission,
@@ -172,7 +161,12 @@ class Permission(PermissionBase):
         if not perms:
             return set()
 
-        perms_values = ','.join(["('%s', '%s')" % p for p in perms])
+        placeholders = {}
+        perms_values = []
+        for i, (obj_id, perm) in enumerate(perms):
+            placeholders['obj_%s' % i] = obj_id
+            placeholders['perm_%s' % i] = perm
+            perms_values.append('(:obj_%s, :perm_%s)' % (i, i))
         query = """
         WITH required_perms AS (
           VALUES %s
@@ -180,17 +174,15 @@ class Permission(PermissionBase):
         SELECT principal
           FROM required_perms JOIN access_control_entries
             ON (object_id = column1 AND permission = column2);
-        """ % perms_values
+        """ % ','.join(perms_values)
         with self.client.connect(readonly=True) as conn:
-            result = conn.execute(query)
+            result = conn.execute(query, placeholders)
             results = result.fetchall()
         return set([r['principal'] for r in results])
 
-    def principals_accessible_objects(self, principals, permission,
-                                      object_id_match=None,
-                                      get_bound_permissions=None):
-        placeholders = {'permission': permission}
-
+    def _accessible_objects_query(self, principals, permission,
+                                  object_id_match=None,
+                                  get_bound_permissions=None):
         if object_id_match is None:
             object_id_match = '*'
 
@@ -199,30 +191,34 @@ class Permission(PermissionBase):
         else:
             perms = get_bound_permissions(object_id_match, permission)
 
-        perms = [(o.replace('*', '.*'), p) for (o, p) in perms
-                 if o.endswith(object_id_match)]
-        perms_values = ','.join(["('%s', '%s')" % p for p in perms])
-        principals_values = ','.join(["('%s')" % p for p in principals])
+        perms = [(o, p) for (o, p) in perms if o.endswith(object_id_match)]
+
+        placeholders = {'principals': list(principals)}
+        conditions = []
+        for i, (pattern, perm) in enumerate(perms):
+            # Anchored LIKE patterns, to benefit from the prefix index scans.
+            pattern = pattern.replace('\\', '\\\\')
+            pattern = pattern.replace('%', '\\%').replace('_', '\\_')
+            placeholders['pattern_%s' % i] = pattern.replace('*', '%')
+            placeholders['perm_%s' % i] = perm
+            conditions.append('(permission = :perm_%s'
+                              ' AND object_id LIKE :pattern_%s)' % (i, i))
+
         query = """
-        WITH required_perms AS (
-          VALUES %(perms)s
-        ),
-        user_principals AS (
-          VALUES %(principals)s
-        ),
-        potential_objects AS (
-          SELECT object_id, required_perms.column1 AS pattern
-            FROM access_control_entries
-            JOIN user_principals
-              ON (principal = user_principals.column1)
-            JOIN required_perms
-              ON (permission = required_perms.column2)
-        )
-        SELECT object_id
-          FROM potential_objects
-         WHERE object_id ~ pattern;
-        """ % dict(perms=perms_values,
-                   principals=principals_values)
+        SELECT DISTINCT object_id
+          FROM access_control_entries
+         WHERE principal = ANY(:principals)
+           AND (%(conditions)s);
+        """ % dict(conditions=' OR '.join(conditions) or 'FALSE')
+        return query, placeholders
+
+    def principals_accessible_objects(self, principals, permission,
+                                      object_id_match=None,
+                                      get_bound_permissions=None):
+        query, placeholders = self._accessible_objects_query(
+            principals, permission,
+            object_id_match=object_id_match,
+            get_bound_permissions=get_bound_permissions)
 
         with self.client.connect(readonly=True) as conn:
             result = conn.execute(query, placeholders)
@@ -239,29 +235,28 @@ class Permission(PermissionBase):
         if not perms:
             return False
 
-        perms_values = ','.join(["('%s', '%s')" % p for p in perms])
-        principals_values = ','.join(["('%s')" % p for p in principals])
+        # Constant query text (arrays parameters), short-circuited on the
+        # first matching entry of the primary key index.
         query = """
-        WITH required_perms AS (
-          VALUES %(perms)s
-        ),
-        allowed_principals AS (
-          SELECT principal
-            FROM required_perms JOIN access_control_entries
-              ON (object_id = column1 AND permission = column2)
-        ),
-        required_principals AS (
-          VALUES %(principals)s
-        )
-        SELECT COUNT(*) AS matched
-          FROM required_principals JOIN allowed_principals
-            ON (required_principals.column1 = principal);
-        """ % dict(perms=perms_values, principals=principals_values)
+        SELECT EXISTS (
+          SELECT 1
+            FROM access_control_entries AS ace
+            JOIN unnest(CAST(:object_ids AS TEXT[]),
+                        CAST(:permissions AS TEXT[]))
+                 AS required_perms(object_id, permission)
+              ON (ace.object_id = required_perms.object_id
+                  AND ace.permission = required_perms.permission)
+           WHERE ace.principal = ANY(CAST(:principals AS TEXT[]))
+        ) AS matched;
+        """
+        placeholders = dict(object_ids=[o for (o, p) in perms],
+                            permissions=[p for (o, p) in perms],
+                            principals=list(principals))
 
         with self.client.connect(readonly=True) as conn:
-            result = conn.execute(query)
-            total = result.fetchone()
-        return total['matched'] > 0
+            result = conn.execute(query, placeholders)
+            matched = result.fetchone()
+        return matched['matched']
 
     def object_permissions(self, object_id, permissions=None):
         query = """
@@ -323,6 +318,68 @@ class Permission(PermissionBase):
             if new_perms:
                 conn.execute(insert_query, placeholders)
 
+    def apply_many(self, changes):
+        squashed = self._squash_changes(changes)
+        if not squashed:
+            return {}
+
+        placeholders = {
+            'object_ids': list(squashed.keys()),
+            'cleared_ids': [],
+            'replaced_ids': [],
+            'replaced_perms': [],
+            'new_ids': [],
+            'new_perms': [],
+            'new_principals': [],
+        }
+        for object_id, (cleared, replaced, added) in squashed.items():
+            if cleared:
+                placeholders['cleared_ids'].append(object_id)
+            for permission in replaced.keys():
+                placeholders['replaced_ids'].append(object_id)
+                placeholders['replaced_perms'].append(permission)
+            for aces in (replaced, added):
+                for permission, principals in aces.items():
+                    for principal in principals:
+                        placeholders['new_ids'].append(object_id)
+                        placeholders['new_perms'].append(permission)
+                        placeholders['new_principals'].append(principal)
+
+        # Every statement is sent at once, and the resulting ACEs are
+        # returned by the last one.
+        query = """
+        DELETE FROM access_control_entries
+         WHERE object_id = ANY(CAST(:cleared_ids AS TEXT[]));
+
+        DELETE FROM access_control_entries AS ace
+         USING unnest(CAST(:replaced_ids AS TEXT[]),
+                      CAST(:replaced_perms AS TEXT[]))
+               AS replaced(object_id, permission)
+         WHERE ace.object_id = replaced.object_id
+           AND ace.permission = replaced.permission;
+
+        INSERT INTO access_control_entries (object_id, permission, principal)
+        SELECT DISTINCT object_id, permission, principal
+          FROM unnest(CAST(:new_ids AS TEXT[]),
+                      CAST(:new_perms AS TEXT[]),
+                      CAST(:new_principals AS TEXT[]))
+               AS new_aces(object_id, permission, principal)
+        ON CONFLICT (object_id, permission, principal) DO NOTHING;
+
+        SELECT object_id, permission, principal
+          FROM access_control_entries
+         WHERE object_id = ANY(CAST(:object_ids AS TEXT[]));
+        """
+        with self.client.connect() as conn:
+            result = conn.execute(query, placeholders)
+            results = result.fetchall()
+
+        permissions = dict([(object_id, defaultdict(set))
+                            for object_id in squashed.keys()])
+        for r in results:
+            permissions[r['object_id']][r['permission']].add(r['principal'])
+        return permissions
+
     def delete_object_permissions(self, *object_id_list):
         if len(object_id_list) == 0:
             return
@@ -24,31 +24,21 @@ CREATE TABLE IF NOT EXISTS access_control_entries (
 DO $$
 BEGIN
 
+  -- Lookup of objects by principal, with object id prefix (LIKE 'abc%').
   IF NOT EXISTS (
     SELECT 1 FROM pg_indexes
-       WHERE indexname = 'idx_access_control_entries_object_id'
+       WHERE indexname = 'idx_access_control_entries_principal_object_id'
        AND tablename = 'access_control_entries'
   ) THEN
-  CREATE INDEX idx_access_control_entries_object_id
-    ON access_control_entries(object_id);
-  END IF;
-
-  IF NOT EXISTS (
-    SELECT 1 FROM pg_indexes
-       WHERE indexname = 'idx_access_control_entries_permission'
-       AND tablename = 'access_control_entries'
-  ) THEN
-  CREATE INDEX idx_access_control_entries_permission
-    ON access_control_entries(permission);
-  END IF;
-
-  IF NOT EXISTS (
-    SELECT 1 FROM pg_indexes
-       WHERE indexname = 'idx_access_control_entries_principal'
-       AND tablename = 'access_control_entries'
-  ) THEN
-  CREATE INDEX idx_access_control_entries_principal
-    ON access_control_entries(principal);
+  CREATE INDEX idx_access_control_entries_principal_object_id
+    ON access_control_entries(principal, permission,
+                              object_id text_pattern_ops);
   END IF;
 
 END$$;
+
+-- Lookups by object are served by the primary key, and by principal with
+-- the index above.
+DROP INDEX IF EXISTS idx_access_control_entries_object_id;
+DROP INDEX IF EXISTS idx_access_control_entries_permission;
+DROP INDEX IF EXISTS idx_access_control_entries_principal;
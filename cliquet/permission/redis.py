@@ -1,6 +1,10 @@
 from __future__ import absolute_import
 
 from collections import defaultdict
+from fnmatch import fnmatchcase
+
+import redis
+import six
 
 from cliquet.permission import PermissionBase
 from cliquet.storage.redis import create_from_config, wrap_redis_error
@@ -21,6 +25,19 @@ class Permission(PermissionBase):
 
         cliquet.permission_pool_size = 50
 
+    Besides the ``permission:<object_id>:<permission>`` sets of principals,
+    reverse indexes are maintained in order to avoid scanning the whole
+    keyspace:
+
+    * ``principal:<principal>:<permission>``: the set of objects ids on which
+      the principal was granted the permission;
+    * ``object:<object_id>:permissions``: the set of permissions that have
+      principals on the object.
+
+    .. note::
+
+        The indexes of existing data are built with ``cliquet init``.
+
     :noindex:
     """
 
@@ -32,13 +49,99 @@ class Permission(PermissionBase):
     def settings(self):
         return dict(self._client.connection_pool.connection_kwargs)
 
+    @wrap_redis_error
     def initialize_schema(self):
-        # Nothing to do.
-        pass
+        # (Re)build the reverse indexes from the objects ACEs.
+        with self._client.pipeline() as pipe:
+            for key in self._client.scan_iter(match='permission:*'):
+                _, object_id, permission = self._split_key(key)
+                principals = self._client.smembers(key)
+                pipe.sadd(self._object_key(object_id), permission)
+                for principal in self._decode_set(principals):
+                    principal_key = self._principal_key(principal, permission)
+                    pipe.sadd(principal_key, object_id)
+            pipe.execute()
 
     def _decode_set(self, results):
         return set([r.decode('utf-8') for r in results])
 
+    def _permission_key(self, object_id, permission):
+        return 'permission:%s:%s' % (object_id, permission)
+
+    def _principal_key(self, principal, permission):
+        return 'principal:%s:%s' % (principal, permission)
+
+    def _object_key(self, object_id):
+        return 'object:%s:permissions' % object_id
+
+    def _split_key(self, key):
+        """Return the prefix, object id and permission of a permission key.
+        """
+        if isinstance(key, six.binary_type):
+            key = key.decode('utf-8')
+        prefix, rest = key.split(':', 1)
+        object_id, permission = rest.rsplit(':', 1)
+        return prefix, object_id, permission
+
+    def _object_acls(self, object_id_list, permissions=None, watch=None):
+        """Return the ACLs of the specified objects, as a list of dicts.
+
+        If a ``watch`` pipeline is specified, the keys that are read are
+        watched on it, so that its transaction fails if they change.
+        """
+        if permissions is None:
+            object_keys = [self._object_key(object_id)
+                           for object_id in object_id_list]
+            if watch is not None and object_keys:
+                watch.watch(*object_keys)
+            with self._client.pipeline() as pipe:
+                for object_key in object_keys:
+                    pipe.smembers(object_key)
+                results = pipe.execute()
+            permissions_list = [self._decode_set(r) for r in results]
+        else:
+            permissions_list = [permissions] * len(object_id_list)
+
+        permission_keys = [self._permission_key(object_id, permission)
+                           for object_id, perms in zip(object_id_list,
+                                                       permissions_list)
+                           for permission in perms]
+        if watch is not None and permission_keys:
+            watch.watch(*permission_keys)
+        with self._client.pipeline() as pipe:
+            for permission_key in permission_keys:
+                pipe.smembers(permission_key)
+            results = iter(pipe.execute())
+
+        acls = []
+        for perms in permissions_list:
+            acl = defaultdict(set)
+            for permission in perms:
+                acl[permission] = self._decode_set(next(results))
+            acls.append(acl)
+        return acls
+
+    def _update_acls(self, update, object_id_list, permissions=None):
+        """Read the ACLs of the specified objects and write them back with
+        ``update(pipe, acls)`` atomically: the indexes are derived from the
+        ACLs read, hence it is retried if they are modified meanwhile.
+        """
+        with self._client.pipeline() as pipe:
+            while True:
+                try:
+                    acls = self._object_acls(object_id_list, permissions,
+                                             watch=pipe)
+                    pipe.multi()
+                    result = update(pipe, acls)
+                    pipe.execute()
+                    return result
+                except redis.WatchError:
+                    continue
+
+    def _unindex_ace(self, pipe, object_id, permission, principals):
+        for principal in principals:
+            pipe.srem(self._principal_key(principal, permission), object_id)
+
     @wrap_redis_error
     def flush(self):
         self._client.flushdb()
@@ -69,15 +172,25 @@ class Permission(PermissionBase):
 
     @wrap_redis_error
     def add_principal_to_ace(self, object_id, permission, principal):
-        permission_key = 'permission:%s:%s' % (object_id, permission)
-        self._client.sadd(permission_key, principal)
+        permission_key = self._permission_key(object_id, permission)
+        with self._client.pipeline() as pipe:
+            pipe.sadd(permission_key, principal)
+            pipe.sadd(self._principal_key(principal, permission), object_id)
+            pipe.sadd(self._object_key(object_id), permission)
+            pipe.execute()
 
     @wrap_redis_error
     def remove_principal_from_ace(self, object_id, permission, principal):
-        permission_key = 'permission:%s:%s' % (object_id, permission)
-        self._client.srem(permission_key, principal)
+        permission_key = self._permission_key(object_id, permission)
+        with self._client.pipeline() as pipe:
+            pipe.srem(permission_key, principal)
+            pipe.srem(self._principal_key(principal, permission), object_id)
+            pipe.execute()
         if self._client.scard(permission_key) == 0:
-            self._client.delete(permission_key)
+            with self._client.pipeline() as pipe:
+                pipe.delete(permission_key)
+                pipe.srem(self._object_key(object_id), permission)
+                pipe.execute()
 
     @wrap_redis_error
     def object_permission_principals(self, object_id, permission):
@@ -97,18 +210,22 @@ class Permission(PermissionBase):
                 return [(object_id, permission)]
 
         keys = get_bound_permissions(object_id_match, permission)
-        keys = ['permission:%s:%s' % key for key in keys
-                if key[0].endswith(object_id_match)]
-        principals = set(principals)
-        objects = set()
-        for key_pattern in keys:
-            matched = self._client.scan_iter(match=key_pattern)
-            for key in matched:
-                authorized = self._decode_set(self._client.smembers(key))
-                if len(authorized & principals) > 0:
-                    object_id = key.decode('utf-8').split(':')[1]
-                    objects.add(object_id)
+        keys = [key for key in keys if key[0].endswith(object_id_match)]
+        principals = list(principals)
+
+        with self._client.pipeline() as pipe:
+            for _, perm in keys:
+                principal_keys = [self._principal_key(principal, perm)
+                                  for principal in principals]
+                if principal_keys:
+                    pipe.sunion(principal_keys)
+            results = pipe.execute()
 
+        objects = set()
+        for (pattern, _), candidates in zip(keys, results):
+            objects.update([object_id
+                            for object_id in self._decode_set(candidates)
+                            if fnmatchcase(object_id, pattern)])
         return objects
 
     @wrap_redis_error
@@ -126,48 +243,85 @@ class Permission(PermissionBase):
 
     @wrap_redis_error
     def object_permissions(self, object_id, permissions=None):
-        if permissions is not None:
-            keys = ['permission:%s:%s' % (object_id, permission)
-                    for permission in permissions]
-        else:
-            keys = [key.decode('utf-8') for key in self._client.scan_iter(
-                match='permission:%s:*' % object_id)]
-
-        with self._client.pipeline() as pipe:
-            for permission_key in keys:
-                pipe.smembers(permission_key)
-
-            results = pipe.execute()
-
-        permissions = defaultdict(set)
-        for i, result in enumerate(results):
-            permission = keys[i].split(':', 2)[-1]
-            permissions[permission] = self._decode_set(result)
-
-        return permissions
+        return self._object_acls([object_id], permissions)[0]
 
     @wrap_redis_error
     def replace_object_permissions(self, object_id, permissions):
-        keys = ['permission:%s:%s' % (object_id, permission)
-                for permission in permissions]
-        with self._client.pipeline() as pipe:
-            for key in keys:
+        object_key = self._object_key(object_id)
+
+        def update(pipe, acls):
+            previous = acls[0]
+            for permission, principals in permissions.items():
+                key = self._permission_key(object_id, permission)
                 pipe.delete(key)
-                permission = key.split(':', 2)[-1]
-                principals = permissions[permission]
+                self._unindex_ace(pipe, object_id, permission,
+                                  previous[permission])
                 if len(principals) > 0:
                     pipe.sadd(key, *principals)
-            pipe.execute()
+                    pipe.sadd(object_key, permission)
+                    for principal in principals:
+                        principal_key = self._principal_key(principal,
+                                                            permission)
+                        pipe.sadd(principal_key, object_id)
+                else:
+                    pipe.srem(object_key, permission)
+
+        self._update_acls(update, [object_id], list(permissions))
+
+    @wrap_redis_error
+    def apply_many(self, changes):
+        squashed = self._squash_changes(changes)
+        object_id_list = list(squashed.keys())
+
+        def update(pipe, previous_acls):
+            results = {}
+            for object_id, previous in zip(object_id_list, previous_acls):
+                cleared, replaced, added = squashed[object_id]
+                acl = defaultdict(set)
+                if not cleared:
+                    acl.update([(perm, set(principals))
+                                for perm, principals in previous.items()])
+                acl.update(replaced)
+                for permission, principals in added.items():
+                    acl[permission] |= principals
+
+                # Only write the differences with the current ACEs.
+                for permission in set(previous.keys()) | set(acl.keys()):
+                    before = previous.get(permission, set())
+                    after = acl.get(permission, set())
+                    key = self._permission_key(object_id, permission)
+                    if before - after:
+                        pipe.srem(key, *(before - after))
+                        self._unindex_ace(pipe, object_id, permission,
+                                          before - after)
+                    if after - before:
+                        pipe.sadd(key, *(after - before))
+                        for principal in after - before:
+                            principal_key = self._principal_key(principal,
+                                                                permission)
+                            pipe.sadd(principal_key, object_id)
+                    if not after:
+                        pipe.srem(self._object_key(object_id), permission)
+                        acl.pop(permission, None)
+                    elif not before:
+                        pipe.sadd(self._object_key(object_id), permission)
+                results[object_id] = acl
+            return results
+
+        return self._update_acls(update, object_id_list)
 
     @wrap_redis_error
     def delete_object_permissions(self, *object_id_list):
-        with self._client.pipeline() as pipe:
-            for object_id in object_id_list:
-                keys = list(self._client.scan_iter(
-                    match='permission:%s:*' % object_id))
-                if len(keys) > 0:
-                    pipe.delete(*keys)
-            pipe.execute()
+        object_id_list = list(object_id_list)
+
+        def update(pipe, acls):
+            for object_id, acl in zip(object_id_list, acls):
+                for permission, principals in acl.items():
+                    pipe.delete(self._permission_key(object_id, permission))
+                    self._unindex_ace(pipe, object_id, permission, principals)
+                pipe.delete(self._object_key(object_id))
+
+        self._update_acls(update, object_id_list)
 
 
 def load_from_config(config):
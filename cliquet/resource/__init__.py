@@ -1,5 +1,6 @@
 import re
 import functools
+import hashlib
 import warnings
 
 import colander
@@ -23,7 +24,7 @@ from cliquet.utils import (
 
 from .model import Model, ShareableModel
 from .schema import ResourceSchema
-from .viewset import ViewSet, ShareableViewSet
+from .viewset import ViewSet, ShareableViewSet, EVENT_STREAM
 
 
 def register(depth=1, **kwargs):
@@ -96,6 +97,14 @@ def register_resource(resource_cls, settings=None, viewset=None, depth=1,
             argument_getter = getattr(viewset, '%s_arguments' % endpoint_type)
             view_args = argument_getter(resource_cls, method)
 
+            is_collection_get = (endpoint_type, method) == ('collection',
+                                                            'GET')
+            if is_collection_get and 'accept' in view_args and \
+                    int(settings.get('longpoll_max_wait_seconds') or 0):
+                # Changes can be streamed to ``EventSource`` clients.
+                view_args['accept'] = list(view_args['accept']) + [
+                    EVENT_STREAM]
+
             view = viewset.get_view(endpoint_type, method.lower())
             service.add_view(method, view, klass=resource_cls, **view_args)
 
@@ -122,6 +131,14 @@ def register_resource(resource_cls, settings=None, viewset=None, depth=1,
     return callback
 
 
+def _overrides(cls, base, *names):
+    """Return ``True`` if the specified class overrides any of the specified
+    methods of the base class."""
+    return any([six.get_unbound_function(getattr(cls, name)) is not
+                six.get_unbound_function(getattr(base, name))
+                for name in names])
+
+
 class UserResource(object):
     """Base resource class providing every endpoint."""
 
@@ -203,6 +220,25 @@ class UserResource(object):
         """
         return request.prefixed_userid
 
+    @classmethod
+    def get_collection_ids(cls, request, context=None):
+        """Return the collection_id and parent_id of the collection targeted
+        by the current request, without instantiating the resource.
+
+        They are used to compare the collection timestamp before running the
+        view (e.g. ``If-None-Match`` or long polling). Resources that
+        customize their constructor or :meth:`get_parent_id` have to override
+        it, otherwise ``None`` is returned and the view handles the request.
+
+        :param request:
+            The current request.
+
+        :rtype: tuple
+        """
+        if _overrides(cls, UserResource, '__init__', 'get_parent_id'):
+            return None
+        return cls.__name__.lower(), request.prefixed_userid
+
     def _get_known_fields(self):
         """Return all the `field` defined in the ressource mapping."""
         known_fields = [c.name for c in self.mapping.children] + \
@@ -245,6 +281,16 @@ class UserResource(object):
         self._raise_412_if_modified()
 
         headers = self.request.response.headers
+
+        cache_key, cache_ttl = self._response_cache_key()
+        if cache_key is not None:
+            cached = self.request.registry.cache.get(cache_key)
+            if cached is not None:
+                for name, value in cached['headers'].items():
+                    headers[name] = encode_header(value)
+                logger.bind(nb_records=len(cached['data']))
+                return self.postprocess(cached['data'])
+
         filters = self._extract_filters()
         limit = self._extract_limit()
         sorting = self._extract_sorting(limit)
@@ -281,6 +327,13 @@ class UserResource(object):
         logger.bind(nb_records=len(records), limit=limit)
         headers['Total-Records'] = encode_header('%s' % total_records)
 
+        if cache_key is not None:
+            cached_headers = {'Total-Records': '%s' % total_records}
+            if next_page is not None:
+                cached_headers['Next-Page'] = next_page
+            cached = {'headers': cached_headers, 'data': records}
+            self.request.registry.cache.set(cache_key, cached, cache_ttl)
+
         return self.postprocess(records)
 
     def collection_post(self):
@@ -716,6 +769,34 @@ class UserResource(object):
             # order to omit it.
             response.cache_control.no_cache = True
 
+    def _response_cache_key(self):
+        """Return the cache key and TTL of the current collection response,
+        based on a setting for the current resource.
+
+        The key changes with the collection timestamp, the querystring, and
+        the records the current user is allowed to read. Returns ``(None,
+        None)`` if responses are not cached.
+        """
+        resource_name = self.context.resource_name if self.context else ''
+        setting_key = '%s_response_cache_ttl_seconds' % resource_name
+        cache_ttl = self.request.registry.settings.get(setting_key)
+        cache = getattr(self.request.registry, 'cache', None)
+        if not cache_ttl or cache is None:
+            return None, None
+
+        shared_ids = getattr(self.context, 'shared_ids', None)
+        if shared_ids:
+            shared_ids = sorted(shared_ids)
+        parts = [self.model.parent_id,
+                 self.timestamp,
+                 sorted(self.request.GET.items()),
+                 sorted(self.request.effective_principals),
+                 shared_ids]
+        digest = hashlib.sha256(json.dumps(parts).encode('utf-8'))
+        cache_key = 'response_cache:%s:%s' % (resource_name,
+                                              digest.hexdigest())
+        return cache_key, float(cache_ttl)
+
     def _raise_400_if_invalid_id(self, record_id):
         """Raise 400 if specified record id does not match the format excepted
         by storage backends.
@@ -758,7 +839,7 @@ class UserResource(object):
         if record:
             current_timestamp = record[self.model.modified_field]
         else:
-            current_timestamp = self.model.timestamp()
+            current_timestamp = self.timestamp
 
         if current_timestamp <= modified_since:
             response = HTTPNotModified()
@@ -805,7 +886,7 @@ class UserResource(object):
         if record:
             current_timestamp = record[self.model.modified_field]
         else:
-            current_timestamp = self.model.timestamp()
+            current_timestamp = self.timestamp
 
         if current_timestamp > modified_since:
             error_msg = 'Resource was modified meanwhile'
@@ -1119,6 +1200,12 @@ class ShareableResource(UserResource):
         """
         return ''
 
+    @classmethod
+    def get_collection_ids(cls, request, context=None):
+        if _overrides(cls, ShareableResource, '__init__', 'get_parent_id'):
+            return None
+        return cls.__name__.lower(), ''
+
     def _extract_filters(self, queryparams=None):
         """Override default filters extraction from QueryString to allow
         partial collection of records.
@@ -255,12 +255,16 @@ class ShareableModel(Model):
         # Current user main principal.
         self.current_principal = None
 
-    def _allow_write(self, perm_object_id):
-        """Helper to give the ``write`` permission to the current user.
+    def _replace_permissions(self, perm_object_id, permissions):
+        """Helper to replace the specified permissions, and give the ``write``
+        permission to the current user, in a single permission backend call.
+
+        :returns: the resulting object permissions.
         """
-        self.permission.add_principal_to_ace(perm_object_id,
-                                             'write',
-                                             self.current_principal)
+        owner = {'write': [self.current_principal]}
+        changes = [('replace', perm_object_id, permissions),
+                   ('add', perm_object_id, owner)]
+        return self.permission.apply_many(changes)[perm_object_id]
 
     def delete_records(self, filters=None, parent_id=None):
         """Delete permissions when collection records are deleted in bulk.
@@ -294,9 +298,7 @@ class ShareableModel(Model):
                                                            unique_fields)
         record_id = record[self.id_field]
         perm_object_id = self.get_permission_object_id(record_id)
-        self.permission.replace_object_permissions(perm_object_id, permissions)
-        self._allow_write(perm_object_id)
-        permissions = self.permission.object_permissions(perm_object_id)
+        permissions = self._replace_permissions(perm_object_id, permissions)
 
         annotated = record.copy()
         annotated[self.permissions_field] = permissions
@@ -316,9 +318,7 @@ class ShareableModel(Model):
                                                            unique_fields)
         record_id = record[self.id_field]
         perm_object_id = self.get_permission_object_id(record_id)
-        self.permission.replace_object_permissions(perm_object_id, permissions)
-        self._allow_write(perm_object_id)
-        permissions = self.permission.object_permissions(perm_object_id)
+        permissions = self._replace_permissions(perm_object_id, permissions)
 
         annotated = record.copy()
         annotated[self.permissions_field] = permissions
@@ -1,15 +1,249 @@
 import functools
+import time
 
 import colander
 import six
+import transaction
+from pyramid.httpexceptions import HTTPNotModified
 from pyramid.settings import asbool
 
 from cliquet import authorization
+from cliquet import logger
+from cliquet.errors import raise_invalid
+from cliquet.events import notify_on_commit
 from cliquet.resource.schema import PermissionsSchema
-from cliquet.utils import DeprecatedMeta
+from cliquet.storage import exceptions as storage_exceptions
+from cliquet.utils import (DeprecatedMeta, decode_header, encode_header,
+                           json, native_value)
 
 CONTENT_TYPES = ["application/json"]
 
+EVENT_STREAM = "text/event-stream"
+
+
+def _extract_integer(value):
+    """Return the specified querystring value as an integer, or ``None``
+    if invalid."""
+    if value is None:
+        return None
+    value = native_value(value.strip('"'))
+    if not isinstance(value, six.integer_types):
+        return None
+    return value
+
+
+def _extract_wait(request):
+    """Return how long the request can wait for changes, in seconds: the
+    ``_wait`` querystring parameter, up to ``longpoll_max_wait_seconds``.
+    """
+    settings = request.registry.settings
+    max_wait = int(settings['longpoll_max_wait_seconds'])
+    if '_wait' not in request.GET:
+        return max_wait
+
+    wait = _extract_integer(request.GET['_wait'])
+    if wait is None or wait < 0:
+        error_details = {
+            'name': '_wait',
+            'location': 'querystring',
+            'description': 'Invalid value for _wait'
+        }
+        raise_invalid(request, **error_details)
+    return min(wait, max_wait)
+
+
+def _release_transaction(request):
+    """Terminate the request transaction, so that no storage connection is
+    held while waiting.
+
+    It is committed rather than aborted: reading the timestamp of an empty
+    collection can store it (e.g. with PostgreSQL), and it would otherwise
+    be a new one on the next read.
+    """
+    request.tm.commit()
+    request.tm.begin()
+    notify_on_commit(request)
+
+
+def not_modified_shortcut(resource_cls):
+    """Return a view decorator that answers ``304 Not Modified`` to the
+    conditional requests on the collection of the specified resource class.
+
+    It runs once the request is authorized, and compares the ``If-None-Match``
+    header with the collection timestamp, without instantiating the resource.
+    Other requests are handled by the view.
+    """
+    def decorator(view):
+        def wrapped(context, request):
+            if_none_match = decode_header(
+                request.headers.get('If-None-Match', ''))
+            is_etag = (len(if_none_match) > 2 and
+                       if_none_match[0] == if_none_match[-1] == '"' and
+                       if_none_match[1:-1].isdigit())
+            if not is_etag:
+                # Let the view handle or reject it.
+                return view(context, request)
+
+            ids = resource_cls.get_collection_ids(request, context)
+            if ids is None:
+                return view(context, request)
+
+            collection_id, parent_id = ids
+            storage = request.registry.storage
+            try:
+                current_timestamp = storage.collection_timestamp(
+                    collection_id=collection_id,
+                    parent_id=parent_id,
+                    auth=request.headers.get('Authorization'))
+            except storage_exceptions.BackendError:
+                return view(context, request)
+
+            if current_timestamp > int(if_none_match[1:-1]):
+                return view(context, request)
+
+            logger.bind(collection_id=collection_id,
+                        collection_timestamp=current_timestamp)
+            response = HTTPNotModified()
+            response.last_modified = current_timestamp / 1000.0
+            response.headers['ETag'] = encode_header('"%s"' %
+                                                     current_timestamp)
+            raise response
+        return wrapped
+    return decorator
+
+
+def wait_for_changes(resource_cls):
+    """Return a view decorator that holds the requests on the collection of
+    the specified resource class with a ``_wait`` querystring parameter
+    (in seconds), until the collection timestamp becomes greater than
+    ``_since`` (*long polling*).
+
+    Waiting requests are woken up by the ``registry.longpoll`` notifier
+    (see :class:`cliquet.longpoll.Notifier`), and check the timestamp
+    periodically anyway. The view is then run as usual.
+    """
+    def decorator(view):
+        def wrapped(context, request):
+            notifier = getattr(request.registry, 'longpoll', None)
+            if notifier is None or '_wait' not in request.GET:
+                return view(context, request)
+
+            wait = _extract_wait(request)
+            since = _extract_integer(request.GET.get('_since'))
+            if since is None or hasattr(request, 'parent'):
+                # Subrequests of batch requests share their transaction.
+                return view(context, request)
+
+            settings = request.registry.settings
+            interval = float(settings['longpoll_check_interval_seconds'])
+            deadline = time.time() + wait
+
+            ids = resource_cls.get_collection_ids(request, context)
+            if ids is None:
+                return view(context, request)
+
+            key = request.current_resource_name
+            collection_id, parent_id = ids
+            storage = request.registry.storage
+            while True:
+                # Read before the timestamp, so that no change is missed.
+                generation = notifier.generation(key)
+                try:
+                    current_timestamp = storage.collection_timestamp(
+                        collection_id=collection_id,
+                        parent_id=parent_id,
+                        auth=request.headers.get('Authorization'))
+                except storage_exceptions.BackendError:
+                    break
+
+                remaining = deadline - time.time()
+                if current_timestamp > since or remaining <= 0:
+                    break
+
+                _release_transaction(request)
+                notifier.wait(key, generation, min(remaining, interval))
+
+            return view(context, request)
+        return wrapped
+    return decorator
+
+
+def stream_changes(resource_cls):
+    """Return a view decorator that answers the requests on the collection of
+    the specified resource class that accept ``text/event-stream`` with a
+    stream of `server-sent events
+    <https://html.spec.whatwg.org/multipage/server-sent-events.html>`_,
+    sent whenever the collection timestamp changes.
+
+    The current timestamp is sent first, unless it is not greater than the
+    ``Last-Event-ID`` header (or the ``_since`` querystring parameter). The
+    stream ends after ``_wait`` seconds (``longpoll_max_wait_seconds`` at
+    most), and the clients reconnect.
+    """
+    def decorator(view):
+        def wrapped(context, request):
+            notifier = getattr(request.registry, 'longpoll', None)
+            offers = CONTENT_TYPES + [EVENT_STREAM]
+            if notifier is None or hasattr(request, 'parent') or \
+                    request.accept.best_match(offers) != EVENT_STREAM:
+                return view(context, request)
+
+            ids = resource_cls.get_collection_ids(request, context)
+            if ids is None:
+                return view(context, request)
+
+            settings = request.registry.settings
+            interval = float(settings['longpoll_check_interval_seconds'])
+            deadline = time.time() + _extract_wait(request)
+
+            last_event_id = decode_header(
+                request.headers.get('Last-Event-ID', ''))
+            since = _extract_integer(last_event_id or
+                                     request.GET.get('_since'))
+
+            key = request.current_resource_name
+            collection_id, parent_id = ids
+            storage = request.registry.storage
+            auth = request.headers.get('Authorization')
+
+            def events(since):
+                while True:
+                    generation = notifier.generation(key)
+                    # Sent once the request transaction is over.
+                    try:
+                        with transaction.manager:
+                            current_timestamp = storage.collection_timestamp(
+                                collection_id=collection_id,
+                                parent_id=parent_id,
+                                auth=auth)
+                    except storage_exceptions.BackendError as e:
+                        # Response headers are sent already: end the stream,
+                        # clients will reconnect.
+                        logger.error(e)
+                        return
+
+                    if since is None or current_timestamp > since:
+                        since = current_timestamp
+                        data = json.dumps({'timestamp': current_timestamp})
+                        event = 'id: %s\ndata: %s\n\n' % (since, data)
+                        yield event.encode('utf-8')
+                    else:
+                        # Keep the connection alive.
+                        yield b':\n\n'
+
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return
+                    notifier.wait(key, generation, min(remaining, interval))
+
+            response = request.response
+            response.content_type = EVENT_STREAM
+            response.cache_control = 'no-cache'
+            response.app_iter = events(since)
+            return response
+        return wrapped
+    return decorator
+
 
 class ViewSet(object):
     """The default ViewSet object.
@@ -97,6 +331,11 @@ class ViewSet(object):
 
         args['schema'] = self.get_record_schema(resource_cls, method)
 
+        if endpoint_type == 'collection' and method.lower() == 'get':
+            args.setdefault('decorator', (stream_changes(resource_cls),
+                                          wait_for_changes(resource_cls),
+                                          not_modified_shortcut(resource_cls)))
+
         return args
 
     def get_record_schema(self, resource_cls, method):
@@ -1,14 +1,21 @@
 from __future__ import absolute_import, print_function
 import logging
 import argparse
+import functools
 import sys
 import textwrap
+import time
 import warnings
 
 from pyramid.paster import bootstrap
 from pyramid.settings import asbool
 
 from cliquet import __version__
+from cliquet.events import relay_outbox
+from cliquet.logs import logger
+
+
+RELAY_MAX_BACKOFF_SECONDS = 60
 
 
 def deprecated_init(env):
@@ -33,6 +40,39 @@ def init_schema(env):
                 getattr(registry, backend).initialize_schema()
 
 
+def purge_cache(env):
+    registry = env['registry']
+    deleted = registry.cache.purge_expired()
+    print('%s expired cache values deleted.' % deleted)
+
+
+def relay_events(env, once=False):
+    registry = env['registry']
+    settings = registry.settings
+    batch_size = int(settings['event_outbox_relay_batch_size'])
+    interval = float(settings['event_outbox_relay_interval_seconds'])
+    max_attempts = int(settings['event_outbox_relay_max_attempts']) or None
+    relay = functools.partial(relay_outbox, registry, limit=batch_size,
+                              max_attempts=max_attempts)
+    failures = 0
+    while True:
+        try:
+            # Relay as long as the outbox is not empty.
+            relayed = relay()
+            while relayed == batch_size:
+                relayed = relay()
+            failures = 0
+        except Exception:
+            if once:
+                raise
+            # Back off while the storage (or a listener) is unavailable.
+            logger.error("Unable to relay the events", exc_info=True)
+            failures += 1
+        if once:
+            return
+        time.sleep(min(interval * 2 ** failures, RELAY_MAX_BACKOFF_SECONDS))
+
+
 def main():
     description = """\
     Cliquet administration commands.
@@ -54,11 +94,21 @@ def main():
     parser_deprecated_init.set_defaults(func=deprecated_init)
     parser_init_schema = subparsers.add_parser('migrate')
     parser_init_schema.set_defaults(func=init_schema)
+    parser_purge_cache = subparsers.add_parser('purge-cache')
+    parser_purge_cache.set_defaults(func=purge_cache)
+    parser_relay_events = subparsers.add_parser('relay-events')
+    parser_relay_events.add_argument('--once',
+                                     action='store_true',
+                                     help='Stop once the outbox is empty.')
+    parser_relay_events.set_defaults(func=relay_events)
 
     args = parser.parse_args(sys.argv[1:])
+    options = vars(args).copy()
+    func = options.pop('func')
+    options.pop('ini_file')
 
     env = bootstrap(args.ini_file)
-    args.func(env)
+    func(env, **options)
 
 
 if __name__ == '__main__':  # pragma: no cover
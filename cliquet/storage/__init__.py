@@ -190,6 +190,9 @@ class StorageBase(object):
         """Delete all deleted object tombstones in this `collection_id`
         for this `parent_id`.
 
+        Entries of the changes log (see :meth:`get_changes`) of this
+        collection are purged along, up to the same timestamp.
+
         :param str collection_id: the collection id.
         :param str parent_id: the collection parent.
 
@@ -242,6 +245,58 @@ class StorageBase(object):
         """
         raise NotImplementedError
 
+    def get_changes(self, parent_id, since=None, after=None, limit=None,
+                    auth=None):
+        """Retrieve the changes of the objects of every collection of this
+        `parent_id`, in chronological order.
+
+        :param str parent_id: the collections parent.
+
+        :param int since: Optionally only retrieve the changes that occured
+            after this timestamp (exclusive).
+
+        :param tuple after: Optionally only retrieve the changes that follow
+            this ``(last_modified, collection_id, id)`` change (e.g. the last
+            change of the previous page).
+
+        :param int limit: Optionally limit the number of changes to be
+            retrieved.
+
+        :returns: the list of changes, with the ``id``, ``collection_id``
+            and ``last_modified`` of the objects, and the ``action``
+            (``create``, ``update`` or ``delete``).
+        :rtype: list of dict
+        """
+        raise NotImplementedError
+
+    def outbox_add(self, entries):
+        """Store the specified entries in the events outbox, as part of the
+        current transaction.
+
+        :param list entries: JSON serializable events entries.
+        """
+        raise NotImplementedError
+
+    def outbox_relay(self, callback, limit=None, max_attempts=None):
+        """Pass the oldest entries of the events outbox to `callback`, and
+        delete them once relayed.
+
+        The entries that `callback` could not relay are kept, and will be
+        passed again. After `max_attempts` failures, they are moved aside
+        (*dead letters*) so that they no longer delay the others.
+
+        Entries that are being relayed concurrently are skipped.
+
+        :param callback: called with the list of entries, returns the
+            positions of those that could not be relayed (if any).
+        :param int limit: maximum number of entries to relay.
+        :param int max_attempts: number of failures before an entry is
+            moved aside, unlimited if ``None``.
+        :returns: the number of relayed entries.
+        :rtype: int
+        """
+        raise NotImplementedError
+
 
 def heartbeat(backend):
     def ping(request):
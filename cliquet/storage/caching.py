@@ -0,0 +1,187 @@
+from __future__ import absolute_import
+
+import transaction
+from pyramid.settings import asbool
+from pyramid.threadlocal import get_current_request
+
+from cliquet import utils
+from cliquet.storage import StorageBase
+
+
+_REQUEST_STORE_KEY = 'storage_modified_collections'
+_TIMESTAMP_CACHE_KEY = 'storage_timestamp:%s:%s'
+_VERSION_CACHE_KEY = 'storage_timestamp_version:%s:%s'
+_ANY_PARENT = '*'
+
+
+class CachedTimestampStorage(StorageBase):
+    """Storage backend wrapper that keeps the collections timestamps in the
+    cache backend, so that conditional requests do not hit the storage
+    backend::
+
+        cliquet.storage_timestamp_cache_ttl_seconds = 60
+
+    The cached timestamps are stamped with a version, that every write
+    operation going through this wrapper changes (again once the current
+    transaction is committed). A timestamp read before a write is thus never
+    served once the write is committed. During the rest of the request, the
+    timestamp of the modified collection is read from the storage backend,
+    since it is not committed yet.
+
+    Within a request, the timestamps read from the storage backend are only
+    cached once the request transaction is committed, so that the values
+    of aborted transactions are never published to other requests.
+
+    Writes with a wildcard ``parent_id`` (``*``) change the version of the
+    whole collection, for every parent.
+
+    .. note::
+
+        :meth:`flush` does not purge the timestamps kept in the cache backend.
+
+    :param backend: the wrapped storage backend.
+    :type backend: :class:`cliquet.storage.StorageBase`
+    :param registry: the application registry, where the cache backend
+        is looked up.
+    :param float ttl: expiration of timestamps in the cache backend.
+    """
+
+    def __init__(self, backend, registry=None, ttl=None):
+        self.backend = backend
+        self._registry = registry
+        self._ttl = ttl
+
+    def __getattr__(self, name):
+        # Expose the wrapped backend specific attributes (e.g. ``client``).
+        if name == 'backend':
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    @property
+    def _cache(self):
+        return getattr(self._registry, 'cache', None)
+
+    @property
+    def _transaction_per_request(self):
+        settings = getattr(self._registry, 'settings', {})
+        return asbool(settings.get('transaction_per_request', True))
+
+    def _request_store(self):
+        """Return the set of collections modified during the current request,
+        or ``None`` when called outside of a request (e.g. scripts)."""
+        request = get_current_request()
+        bound_data = getattr(request, 'bound_data', None)
+        if not isinstance(bound_data, dict):
+            return None
+        return bound_data.setdefault(_REQUEST_STORE_KEY, set())
+
+    def _bump_version(self, cache, key):
+        version = utils.random_bytes_hex(8)
+        cache.set(key, version, self._ttl)
+        return version
+
+    def _invalidate(self, collection_id, parent_id):
+        cache = self._cache
+        if cache is None:
+            return
+        if _ANY_PARENT in parent_id:
+            parent_id = _ANY_PARENT
+        key = _VERSION_CACHE_KEY % (collection_id, parent_id)
+
+        def bump(success=True):
+            self._bump_version(cache, key)
+
+        bump()
+        modified = self._request_store()
+        if modified is not None and key not in modified:
+            modified.add(key)
+            # Concurrent requests may cache the previous timestamp until the
+            # request transaction is committed: bump the version again once
+            # over.
+            if self._transaction_per_request:
+                transaction.get().addAfterCommitHook(bump)
+
+    def initialize_schema(self):
+        self.backend.initialize_schema()
+
+    def flush(self, auth=None):
+        self.backend.flush(auth=auth)
+
+    def collection_timestamp(self, collection_id, parent_id, auth=None):
+        cache = self._cache
+        version_keys = [_VERSION_CACHE_KEY % (collection_id, _ANY_PARENT),
+                        _VERSION_CACHE_KEY % (collection_id, parent_id)]
+        modified = self._request_store()
+        if cache is None or set(version_keys) & (modified or set()):
+            return self.backend.collection_timestamp(collection_id,
+                                                     parent_id,
+                                                     auth=auth)
+
+        # Obtain the versions before reading the backend, so that the values
+        # read during a write are not cached with the new versions.
+        key = _TIMESTAMP_CACHE_KEY % (collection_id, parent_id)
+        cached = cache.get_many(version_keys + [key])
+        versions = [cached.get(version_key) or
+                    self._bump_version(cache, version_key)
+                    for version_key in version_keys]
+        if key in cached and cached[key]['versions'] == versions:
+            return cached[key]['timestamp']
+
+        timestamp = self.backend.collection_timestamp(collection_id,
+                                                      parent_id,
+                                                      auth=auth)
+        cached = {'versions': versions, 'timestamp': timestamp}
+
+        def store(success=True):
+            if success:
+                cache.set(key, cached, self._ttl)
+
+        if modified is not None and self._transaction_per_request:
+            # The value may have been written by the request transaction
+            # (e.g. PostgreSQL initializes missing timestamps).
+            transaction.get().addAfterCommitHook(store)
+        else:
+            store()
+        return timestamp
+
+    def create(self, collection_id, parent_id, *args, **kwargs):
+        result = self.backend.create(collection_id, parent_id, *args, **kwargs)
+        self._invalidate(collection_id, parent_id)
+        return result
+
+    def get(self, collection_id, parent_id, *args, **kwargs):
+        return self.backend.get(collection_id, parent_id, *args, **kwargs)
+
+    def update(self, collection_id, parent_id, *args, **kwargs):
+        result = self.backend.update(collection_id, parent_id, *args, **kwargs)
+        self._invalidate(collection_id, parent_id)
+        return result
+
+    def delete(self, collection_id, parent_id, *args, **kwargs):
+        result = self.backend.delete(collection_id, parent_id, *args, **kwargs)
+        self._invalidate(collection_id, parent_id)
+        return result
+
+    def delete_all(self, collection_id, parent_id, *args, **kwargs):
+        result = self.backend.delete_all(collection_id, parent_id,
+                                         *args, **kwargs)
+        self._invalidate(collection_id, parent_id)
+        return result
+
+    def purge_deleted(self, collection_id, parent_id, *args, **kwargs):
+        result = self.backend.purge_deleted(collection_id, parent_id,
+                                            *args, **kwargs)
+        self._invalidate(collection_id, parent_id)
+        return result
+
+    def get_all(self, collection_id, parent_id, *args, **kwargs):
+        return self.backend.get_all(collection_id, parent_id, *args, **kwargs)
+
+    def get_changes(self, *args, **kwargs):
+        return self.backend.get_changes(*args, **kwargs)
+
+    def outbox_add(self, *args, **kwargs):
+        return self.backend.outbox_add(*args, **kwargs)
+
+    def outbox_relay(self, *args, **kwargs):
+        return self.backend.outbox_relay(*args, **kwargs)
@@ -1,8 +1,10 @@
 import re
-from uuid import uuid4
+from uuid import UUID, uuid4
 
 import six
 
+from cliquet import utils
+
 
 class Generator(object):
     """Base generator for records ids.
@@ -57,3 +59,34 @@ Universally_unique_identifier#Random_UUID_probability_of_duplicates>`_).
 
     def __call__(self):
         return six.text_type(uuid4())
+
+
+class UUID7(UUID4):
+    """Time-ordered UUID record id generator.
+
+    The first 48 bits carry the creation time in milliseconds, the remaining
+    ones are random (*UUID version 7 layout*).
+    (example: ``'0155079d-ba5b-7e0a-a1c4-0f5e2c1d1a3b'``)
+
+    Since successive ids are lexicographically increasing, new records are
+    appended at the end of the storage indices instead of being scattered
+    among them, which reduces page splits and index bloat on insert-heavy
+    collections.
+
+    Enable in configuration::
+
+        cliquet.id_generator = cliquet.storage.generators.UUID7
+
+    .. note::
+
+        The ids pattern is the same as :class:`UUID4`, so that records created
+        before switching generator remain valid.
+    """
+
+    def __call__(self):
+        timestamp = utils.msec_time() & 0xFFFFFFFFFFFF
+        rand_a = int(utils.random_bytes_hex(2), 16) & 0xFFF
+        rand_b = int(utils.random_bytes_hex(8), 16) & 0x3FFFFFFFFFFFFFFF
+        value = ((timestamp << 80) | (0x7 << 76) | (rand_a << 64) |
+                 (0x2 << 62) | rand_b)
+        return six.text_type(UUID(int=value))
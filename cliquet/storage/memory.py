@@ -167,6 +167,14 @@ class Storage(MemoryBasedStorage):
         self._store = tree()
         self._cemetery = tree()
         self._timestamps = defaultdict(dict)
+        self._changes = defaultdict(list)
+
+    def _log_change(self, collection_id, parent_id, record, action,
+                    id_field=DEFAULT_ID_FIELD,
+                    modified_field=DEFAULT_MODIFIED_FIELD):
+        change = dict(id=record[id_field], collection_id=collection_id,
+                      last_modified=record[modified_field], action=action)
+        self._changes[parent_id].append(change)
 
     def collection_timestamp(self, collection_id, parent_id, auth=None):
         ts = self._timestamps[collection_id].get(parent_id)
@@ -229,6 +237,8 @@ class Storage(MemoryBasedStorage):
                                   modified_field=modified_field)
         self._store[collection_id][parent_id][_id] = record
         self._cemetery[collection_id][parent_id].pop(_id, None)
+        self._log_change(collection_id, parent_id, record, 'create',
+                         id_field=id_field, modified_field=modified_field)
         return record
 
     def get(self, collection_id, parent_id, object_id,
@@ -253,7 +263,12 @@ class Storage(MemoryBasedStorage):
 
         self.set_record_timestamp(collection_id, parent_id, record,
                                   modified_field=modified_field)
-        self._store[collection_id][parent_id][object_id] = record
+        collection = self._store[collection_id][parent_id]
+        # Records are created if missing.
+        action = 'update' if object_id in collection else 'create'
+        collection[object_id] = record
+        self._log_change(collection_id, parent_id, record, action,
+                         id_field=id_field, modified_field=modified_field)
         return record
 
     def delete(self, collection_id, parent_id, object_id,
@@ -276,6 +291,8 @@ class Storage(MemoryBasedStorage):
         if with_deleted:
             deleted = existing.copy()
             self._cemetery[collection_id][parent_id][object_id] = deleted
+            self._log_change(collection_id, parent_id, deleted, 'delete',
+                             id_field=id_field, modified_field=modified_field)
         self._store[collection_id][parent_id].pop(object_id)
 
         return existing
@@ -292,6 +309,12 @@ class Storage(MemoryBasedStorage):
         else:
             kept = {}
         self._cemetery[collection_id][parent_id] = kept
+        # Changes older than the remaining tombstones cannot be synchronized
+        # anymore: drop them too.
+        self._changes[parent_id] = [
+            c for c in self._changes[parent_id]
+            if c['collection_id'] != collection_id or
+            (before is not None and c['last_modified'] >= before)]
         return num_deleted - len(kept.keys())
 
     def get_all(self, collection_id, parent_id, filters=None, sorting=None,
@@ -314,6 +337,20 @@ class Storage(MemoryBasedStorage):
 
         return records, count
 
+    def get_changes(self, parent_id, since=None, after=None, limit=None,
+                    auth=None):
+        def key(change):
+            return (change['last_modified'], change['collection_id'],
+                    change['id'])
+
+        changes = self._changes[parent_id]
+        if since is not None:
+            changes = [c for c in changes if c['last_modified'] > since]
+        if after is not None:
+            changes = [c for c in changes if key(c) > tuple(after)]
+        changes = sorted(changes, key=key)[:limit]
+        return [change.copy() for change in changes]
+
 
 def get_unicity_rules(collection_id, parent_id, record, unique_fields,
                       id_field, for_creation):
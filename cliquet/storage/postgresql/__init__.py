@@ -66,7 +66,7 @@ class Storage(StorageBase):
 
     """  # NOQA
 
-    schema_version = 11
+    schema_version = 13
 
     def __init__(self, client, max_fetch_size, *args, **kwargs):
         super(Storage, self).__init__(*args, **kwargs)
@@ -186,6 +186,9 @@ class Storage(StorageBase):
         DELETE FROM records;
         DELETE FROM timestamps;
         DELETE FROM metadata;
+        DELETE FROM outbox;
+        DELETE FROM outbox_dead_letters;
+        DELETE FROM changes;
         """
         with self.client.connect(force_commit=True) as conn:
             conn.execute(query)
@@ -436,16 +439,113 @@ class Storage(StorageBase):
         # Safe strings
         safeholders = defaultdict(six.text_type)
 
+        # Changes older than the remaining tombstones cannot be synchronized
+        # anymore: drop them too.
+        changes_query = """
+        DELETE
+        FROM changes
+        WHERE parent_id = :parent_id
+          AND collection_id = :collection_id
+          %(changes_filter)s;
+        """
+
         if before is not None:
             safeholders['conditions_filter'] = (
                 'AND as_epoch(last_modified) < :before')
+            safeholders['changes_filter'] = 'AND last_modified < :before'
             placeholders['before'] = before
 
         with self.client.connect() as conn:
             result = conn.execute(query % safeholders, placeholders)
+            conn.execute(changes_query % safeholders, placeholders)
 
         return result.rowcount
 
+    def get_changes(self, parent_id, since=None, after=None, limit=None,
+                    auth=None):
+        query = """
+        SELECT id, collection_id, last_modified, action
+          FROM changes
+         WHERE parent_id = :parent_id
+               %(conditions_filter)s
+         ORDER BY last_modified, collection_id, id
+         LIMIT :limit;
+        """
+        placeholders = dict(parent_id=parent_id, limit=limit)
+        conditions = []
+        if since is not None:
+            conditions.append('AND last_modified > :since')
+            placeholders['since'] = since
+        if after is not None:
+            # Keyset pagination, served by the index.
+            conditions.append('AND (last_modified, collection_id, id) > '
+                              '(:after_modified, :after_collection_id, '
+                              ':after_id)')
+            (placeholders['after_modified'],
+             placeholders['after_collection_id'],
+             placeholders['after_id']) = after
+        safeholders = dict(conditions_filter='\n'.join(conditions))
+
+        with self.client.connect(readonly=True) as conn:
+            result = conn.execute(query % safeholders, placeholders)
+            changes = result.fetchall()
+        return [dict(change) for change in changes]
+
+    def outbox_add(self, entries):
+        if not entries:
+            return
+        query = """
+        INSERT INTO outbox (entry)
+        SELECT unnest((:entries)::TEXT[]);
+        """
+        placeholders = dict(entries=[json.dumps(e) for e in entries])
+        with self.client.connect() as conn:
+            conn.execute(query, placeholders)
+
+    def outbox_relay(self, callback, limit=None, max_attempts=None):
+        # Concurrent relays skip the entries that are being relayed.
+        query = """
+        SELECT id, entry
+          FROM outbox
+         ORDER BY id
+         LIMIT :limit
+           FOR UPDATE SKIP LOCKED;
+        """
+        with self.client.connect() as conn:
+            result = conn.execute(query, dict(limit=limit))
+            rows = result.fetchall()
+            if not rows:
+                return 0
+            failed = callback([json.loads(row['entry']) for row in rows])
+            failed = set(failed or [])
+            relayed_ids = [row['id'] for i, row in enumerate(rows)
+                           if i not in failed]
+            failed_ids = [row['id'] for i, row in enumerate(rows)
+                          if i in failed]
+
+            query = "DELETE FROM outbox WHERE id = ANY(:ids);"
+            conn.execute(query, dict(ids=relayed_ids))
+            if failed_ids:
+                query = """
+                UPDATE outbox SET attempts = attempts + 1
+                 WHERE id = ANY(:ids);
+                """
+                conn.execute(query, dict(ids=failed_ids))
+            if failed_ids and max_attempts:
+                query = """
+                WITH dead AS (
+                    DELETE FROM outbox
+                     WHERE id = ANY(:ids)
+                       AND attempts >= :max_attempts
+                    RETURNING id, entry, attempts
+                )
+                INSERT INTO outbox_dead_letters (id, entry, attempts)
+                SELECT id, entry, attempts FROM dead;
+                """
+                placeholders = dict(ids=failed_ids, max_attempts=max_attempts)
+                conn.execute(query, placeholders)
+        return len(relayed_ids)
+
     def get_all(self, collection_id, parent_id, filters=None, sorting=None,
                 pagination_rules=None, limit=None, include_deleted=False,
                 id_field=DEFAULT_ID_FIELD,
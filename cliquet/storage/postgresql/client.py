@@ -72,11 +72,15 @@ def create_from_config(config, prefix=''):
     from zope.sqlalchemy import ZopeTransactionExtension, invalidate
     from sqlalchemy.orm import sessionmaker, scoped_session
 
+    from cliquet import DEFAULT_SETTINGS
+
     settings = config.get_settings().copy()
-    # Custom Cliquet settings, unsupported by SQLAlchemy.
-    settings.pop(prefix + 'backend', None)
-    settings.pop(prefix + 'max_fetch_size', None)
-    settings.pop(prefix + 'prefix', None)
+    # Custom Cliquet settings (e.g. ``storage_max_fetch_size``) are
+    # unsupported by SQLAlchemy.
+    engine_settings = (prefix + 'url', prefix + 'pool_size')
+    for setting in DEFAULT_SETTINGS:
+        if setting.startswith(prefix) and setting not in engine_settings:
+            settings.pop(setting, None)
     transaction_per_request = settings.pop('transaction_per_request', False)
 
     url = settings[prefix + 'url']
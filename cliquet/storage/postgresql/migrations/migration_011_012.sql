@@ -0,0 +1,15 @@
+CREATE TABLE IF NOT EXISTS outbox (
+    id BIGSERIAL PRIMARY KEY,
+    entry TEXT NOT NULL,
+    attempts INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS outbox_dead_letters (
+    id BIGINT PRIMARY KEY,
+    entry TEXT NOT NULL,
+    attempts INT NOT NULL
+);
+
+
+-- Bump storage schema version.
+INSERT INTO metadata (name, value) VALUES ('storage_schema_version', '12');
@@ -0,0 +1,53 @@
+--
+-- Append-only log of the records changes, per parent.
+--
+CREATE TABLE IF NOT EXISTS changes (
+    parent_id TEXT NOT NULL,
+    collection_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    -- Epoch in milliseconds, like exposed in the API.
+    last_modified BIGINT NOT NULL,
+    action VARCHAR(16) NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_changes_parent_id_last_modified
+    ON changes(parent_id, last_modified, collection_id, id);
+
+
+CREATE OR REPLACE FUNCTION log_change()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO changes (parent_id, collection_id, id, last_modified, action)
+    VALUES (NEW.parent_id, NEW.collection_id, NEW.id,
+            as_epoch(NEW.last_modified), TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tgr_records_log_create ON records;
+DROP TRIGGER IF EXISTS tgr_records_log_update ON records;
+DROP TRIGGER IF EXISTS tgr_deleted_log_delete ON deleted;
+
+CREATE TRIGGER tgr_records_log_create
+AFTER INSERT ON records
+FOR EACH ROW EXECUTE PROCEDURE log_change('create');
+
+CREATE TRIGGER tgr_records_log_update
+AFTER UPDATE ON records
+FOR EACH ROW EXECUTE PROCEDURE log_change('update');
+
+CREATE TRIGGER tgr_deleted_log_delete
+AFTER INSERT OR UPDATE ON deleted
+FOR EACH ROW EXECUTE PROCEDURE log_change('delete');
+
+
+-- Log the existing records and tombstones.
+INSERT INTO changes (parent_id, collection_id, id, last_modified, action)
+SELECT parent_id, collection_id, id, as_epoch(last_modified), 'create'
+  FROM records
+ UNION ALL
+SELECT parent_id, collection_id, id, as_epoch(last_modified), 'delete'
+  FROM deleted;
+
+
+-- Bump storage schema version.
+INSERT INTO metadata (name, value) VALUES ('storage_schema_version', '13');
@@ -229,6 +229,66 @@ CREATE TRIGGER tgr_deleted_last_modified
 BEFORE INSERT OR UPDATE ON deleted
 FOR EACH ROW EXECUTE PROCEDURE bump_timestamp();
 
+--
+-- Append-only log of the records changes, per parent.
+--
+CREATE TABLE IF NOT EXISTS changes (
+    parent_id TEXT NOT NULL,
+    collection_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    -- Epoch in milliseconds, like exposed in the API.
+    last_modified BIGINT NOT NULL,
+    action VARCHAR(16) NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_changes_parent_id_last_modified
+    ON changes(parent_id, last_modified, collection_id, id);
+
+
+CREATE OR REPLACE FUNCTION log_change()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO changes (parent_id, collection_id, id, last_modified, action)
+    VALUES (NEW.parent_id, NEW.collection_id, NEW.id,
+            as_epoch(NEW.last_modified), TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tgr_records_log_create ON records;
+DROP TRIGGER IF EXISTS tgr_records_log_update ON records;
+DROP TRIGGER IF EXISTS tgr_deleted_log_delete ON deleted;
+
+CREATE TRIGGER tgr_records_log_create
+AFTER INSERT ON records
+FOR EACH ROW EXECUTE PROCEDURE log_change('create');
+
+CREATE TRIGGER tgr_records_log_update
+AFTER UPDATE ON records
+FOR EACH ROW EXECUTE PROCEDURE log_change('update');
+
+CREATE TRIGGER tgr_deleted_log_delete
+AFTER INSERT OR UPDATE ON deleted
+FOR EACH ROW EXECUTE PROCEDURE log_change('delete');
+
+
+--
+-- Resource events waiting to be relayed to the listeners.
+--
+CREATE TABLE IF NOT EXISTS outbox (
+    id BIGSERIAL PRIMARY KEY,
+    entry TEXT NOT NULL,
+    attempts INT NOT NULL DEFAULT 0
+);
+
+--
+-- Resource events that could not be relayed (see ``outbox.attempts``).
+--
+CREATE TABLE IF NOT EXISTS outbox_dead_letters (
+    id BIGINT PRIMARY KEY,
+    entry TEXT NOT NULL,
+    attempts INT NOT NULL
+);
+
 --
 -- Metadata table
 --
@@ -241,4 +301,4 @@ INSERT INTO metadata (name, value) VALUES ('created_at', NOW()::TEXT);
 
 -- Set storage schema version.
 -- Should match ``cliquet.storage.postgresql.PostgreSQL.schema_version``
-INSERT INTO metadata (name, value) VALUES ('storage_schema_version', '11');
+INSERT INTO metadata (name, value) VALUES ('storage_schema_version', '13');
@@ -14,6 +14,11 @@ class ResourceTest(BaseTest):
         parent_id = self.resource.get_parent_id(request)
         self.assertEquals(parent_id, 'basicauth:bob')
 
+    def test_collection_ids_are_obtained_without_instantiation(self):
+        request = self.get_request()
+        ids = self.resource_class.get_collection_ids(request)
+        self.assertEquals(ids, ('userresource', 'basicauth:bob'))
+
     def test_raise_if_backend_fails_to_obtain_timestamp(self):
         request = self.get_request()
 
@@ -51,6 +56,20 @@ class ShareableResourceTest(BaseTest):
         parent_id = self.resource.get_parent_id(request)
         self.assertEquals(parent_id, '')
 
+    def test_collection_ids_have_empty_parent_id(self):
+        request = self.get_request()
+        ids = self.resource_class.get_collection_ids(request)
+        self.assertEquals(ids, ('shareableresource', ''))
+
+    def test_collection_ids_are_unknown_if_constructor_is_overridden(self):
+        class Custom(ShareableResource):
+            def __init__(self, *args, **kwargs):
+                super(Custom, self).__init__(*args, **kwargs)
+                self.model.collection_id = 'custom'
+
+        request = self.get_request()
+        self.assertIsNone(Custom.get_collection_ids(request))
+
 
 class NewResource(UserResource):
     def get_parent_id(self, request):
@@ -67,6 +86,10 @@ class ParentIdOverrideResourceTest(BaseTest):
         self.assertEquals(parent_id, 'overrided')
         self.assertEquals(self.resource.model.parent_id, 'overrided')
 
+    def test_collection_ids_are_unknown_if_parent_id_is_overridden(self):
+        request = self.get_request()
+        self.assertIsNone(self.resource_class.get_collection_ids(request))
+
 
 class DeprecatedBaseResourceTest(unittest.TestCase):
 
@@ -3,13 +3,19 @@ import uuid
 from contextlib import contextmanager
 
 import webtest
+from pyramid import testing
 from pyramid.config import Configurator
 
 from cliquet.events import (ResourceChanged, AfterResourceChanged,
-                            ResourceRead, AfterResourceRead, ACTIONS)
+                            ResourceRead, AfterResourceRead,
+                            RelayedResourceChanged, ACTIONS,
+                            notify_resource_event, compact_event,
+                            relay_outbox)
+from cliquet.storage import redis as redis_storage
 from cliquet.storage.exceptions import BackendError
 from cliquet.tests.testapp import main as testapp
 from cliquet.tests.support import unittest, BaseWebTest, get_request_class
+from cliquet.views import batch
 from cliquet import statsd
 
 
@@ -55,6 +61,60 @@ class BaseEventTest(BaseWebTest):
         return app
 
 
+class EventsStackTest(unittest.TestCase):
+    def setUp(self):
+        self.config = testing.setUp()
+        self.request = mock.MagicMock(bound_data={},
+                                      registry=self.config.registry,
+                                      current_resource_name='mushroom')
+
+    def notify(self, action):
+        notify_resource_event(self.request, 123, [{'id': 'a'}], action)
+
+    def test_events_are_not_stacked_without_subscribers(self):
+        self.notify(ACTIONS.READ)
+        self.notify(ACTIONS.DELETE)
+        self.assertEqual(self.request.bound_data, {})
+
+    def test_events_are_stacked_if_subscribed_after_commit(self):
+        self.config.add_subscriber(mock.Mock(), AfterResourceRead)
+        self.config.commit()
+        self.notify(ACTIONS.READ)
+        self.assertEqual(len(self.request.bound_data['resource_events']), 1)
+
+    def test_changes_are_not_stacked_if_only_reads_are_subscribed(self):
+        self.config.add_subscriber(mock.Mock(), ResourceRead)
+        self.config.commit()
+        self.notify(ACTIONS.DELETE)
+        self.assertEqual(self.request.bound_data, {})
+
+
+class CompactEventTest(unittest.TestCase):
+    def setUp(self):
+        self.request = mock.MagicMock(path='/v1/mushrooms', matchdict={})
+        self.record = {'id': 'a', 'last_modified': 123, 'name': 'Amanite'}
+
+    def test_read_records_only_contain_ids_and_timestamps(self):
+        event = ResourceRead(ACTIONS.READ, 123, [self.record], self.request)
+        compacted = compact_event(event)
+        self.assertEqual(compacted.read_records,
+                         [{'id': 'a', 'last_modified': 123}])
+        self.assertEqual(compacted.payload, event.payload)
+
+    def test_impacted_records_only_contain_ids_and_timestamps(self):
+        impacted = [{'new': self.record, 'old': {'id': 'a'}}]
+        event = ResourceChanged(ACTIONS.UPDATE, 123, impacted, self.request)
+        compacted = compact_event(event)
+        self.assertEqual(compacted.impacted_records,
+                         [{'new': {'id': 'a', 'last_modified': 123},
+                           'old': {'id': 'a'}}])
+
+    def test_original_event_is_not_modified(self):
+        event = ResourceRead(ACTIONS.READ, 123, [self.record], self.request)
+        compact_event(event)
+        self.assertEqual(event.read_records, [self.record])
+
+
 class ResourceReadTest(BaseEventTest, unittest.TestCase):
 
     subscribed = (ResourceRead,)
@@ -88,6 +148,23 @@ class ResourceReadTest(BaseEventTest, unittest.TestCase):
         self.assertEqual(len(self.events), 1)
         self.assertEqual(self.events[0].payload['action'], ACTIONS.READ.value)
 
+    def test_parallel_batch_reads_are_sent_in_one_event(self):
+        ids = []
+        for i in range(2):
+            resp = self.app.post_json(self.collection_url, self.body,
+                                      headers=self.headers, status=201)
+            ids.append(resp.json['data']['id'])
+        requests = [{'path': self.collection_url},
+                    {'path': self.collection_url}]
+        body = {'requests': requests, 'parallel': True}
+        with mock.patch('cliquet.views.batch._invoke_readonly_subrequest',
+                        wraps=batch._invoke_readonly_subrequest) as invoked:
+            self.app.post_json('/batch', body, headers=self.headers)
+        self.assertEqual(invoked.call_count, 2)
+        self.assertEqual(len(self.events), 1)
+        read_ids = [r['id'] for r in self.events[0].read_records]
+        self.assertEqual(sorted(read_ids), sorted(ids + ids))
+
 
 class ResourceChangedTest(BaseEventTest, unittest.TestCase):
 
@@ -391,6 +468,83 @@ class BatchEventsTest(BaseEventTest, unittest.TestCase):
         self.assertEqual(len(self.events), 0)
 
 
+class OutboxTest(BaseEventTest, unittest.TestCase):
+
+    subscribed = (RelayedResourceChanged,)
+
+    def make_app(self, settings=None):
+        # The Redis backend has no outbox.
+        with mock.patch.object(redis_storage.Storage, 'outbox_add',
+                               create=True):
+            return super(OutboxTest, self).make_app(settings)
+
+    def setUp(self):
+        super(OutboxTest, self).setUp()
+        self.outbox = []
+        self.failed = []
+        self.storage = self.app.app.registry.storage
+        patch = mock.patch.multiple(self.storage, create=True,
+                                    outbox_add=self.outbox.extend,
+                                    outbox_relay=self.fake_relay)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def fake_relay(self, callback, limit=None, max_attempts=None):
+        entries = self.outbox[:limit]
+        self.failed = callback(entries)
+        del self.outbox[:len(entries)]
+        return len(entries) - len(self.failed)
+
+    def get_app_settings(self, *args, **kwargs):
+        settings = super(OutboxTest, self).get_app_settings(*args, **kwargs)
+        settings['event_outbox'] = 'true'
+        return settings
+
+    def test_changes_are_stored_in_the_outbox(self):
+        self.app.post_json(self.collection_url, self.body,
+                           headers=self.headers, status=201)
+        entry, = self.outbox
+        self.assertEqual(entry['payload']['action'], ACTIONS.CREATE.value)
+        self.assertEqual(entry['impacted_records'][0]['new']['name'],
+                         'de Paris')
+
+    def test_changes_are_not_stored_if_transaction_fails(self):
+        with notif_broken(self.app.app, ResourceChanged):
+            self.app.post_json(self.collection_url, self.body,
+                               headers=self.headers, status=500)
+        self.assertEqual(self.outbox, [])
+
+    def test_reads_are_not_stored_in_the_outbox(self):
+        self.app.get(self.collection_url, headers=self.headers)
+        self.assertEqual(self.outbox, [])
+
+    def test_changes_are_notified_once_relayed(self):
+        self.app.post_json(self.collection_url, self.body,
+                           headers=self.headers, status=201)
+        self.assertEqual(self.events, [])
+        relayed = relay_outbox(self.app.app.registry)
+        self.assertEqual(relayed, 1)
+        event, = self.events
+        self.assertEqual(event.payload['action'], ACTIONS.CREATE.value)
+        self.assertIsNone(event.request)
+
+    def test_relayed_changes_are_limited(self):
+        for i in range(3):
+            self.app.post_json(self.collection_url, self.body,
+                               headers=self.headers, status=201)
+        self.assertEqual(relay_outbox(self.app.app.registry, limit=2), 2)
+        self.assertEqual(len(self.outbox), 1)
+
+    def test_changes_failing_to_be_notified_are_reported(self):
+        for i in range(2):
+            self.app.post_json(self.collection_url, self.body,
+                               headers=self.headers, status=201)
+        self.outbox[0] = {}
+        self.assertEqual(relay_outbox(self.app.app.registry), 1)
+        self.assertEqual(self.failed, [0])
+        self.assertEqual(len(self.events), 1)
+
+
 def load_from_config(config, prefix):
     class ClassListener(object):
         def __call__(self, event):
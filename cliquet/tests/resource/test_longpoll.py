@@ -0,0 +1,197 @@
+import json
+import threading
+import time
+
+import mock
+
+from cliquet.resource.viewset import _release_transaction
+from cliquet.storage import exceptions as storage_exceptions
+from cliquet.tests.support import BaseWebTest, unittest
+
+
+class BaseLongPollTest(BaseWebTest):
+
+    def get_app_settings(self, additional_settings=None):
+        settings = super(BaseLongPollTest, self).get_app_settings(
+            additional_settings)
+        settings['storage_backend'] = 'cliquet.storage.memory'
+        settings['longpoll_max_wait_seconds'] = 5
+        # Rely on notifications only.
+        settings['longpoll_check_interval_seconds'] = 5
+        return settings
+
+    def setUp(self):
+        super(BaseLongPollTest, self).setUp()
+        resp = self.app.post_json(self.collection_url,
+                                  {'data': {'name': 'morel'}},
+                                  headers=self.headers)
+        self.timestamp = resp.json['data']['last_modified']
+        self.url = '%s?_since=%s' % (self.collection_url, self.timestamp)
+
+    def fail_once(self):
+        storage = self.app.app.registry.storage
+        timestamp = storage.collection_timestamp
+        errors = [storage_exceptions.BackendError]
+
+        def collection_timestamp(**kwargs):
+            if errors:
+                raise errors.pop()
+            return timestamp(**kwargs)
+        patch = mock.patch.object(storage, 'collection_timestamp',
+                                  side_effect=collection_timestamp)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def create_record_later(self, delay=0.2):
+        def create():
+            time.sleep(delay)
+            self.app.post_json(self.collection_url,
+                               {'data': {'name': 'chanterelle'}},
+                               headers=self.headers)
+        thread = threading.Thread(target=create)
+        thread.start()
+        self.addCleanup(thread.join)
+
+
+class LongPollTest(BaseLongPollTest, unittest.TestCase):
+
+    def test_returns_immediately_if_collection_changed(self):
+        url = '%s?_since=0&_wait=3' % self.collection_url
+        before = time.time()
+        resp = self.app.get(url, headers=self.headers)
+        self.assertLess(time.time() - before, 1)
+        self.assertEqual(len(resp.json['data']), 1)
+
+    def test_waits_until_timeout_if_nothing_changed(self):
+        before = time.time()
+        resp = self.app.get(self.url + '&_wait=1', headers=self.headers)
+        self.assertGreaterEqual(time.time() - before, 1)
+        self.assertEqual(resp.json['data'], [])
+
+    def test_wait_is_bounded_by_setting(self):
+        self.app.app.registry.settings['longpoll_max_wait_seconds'] = 0
+        self.addCleanup(self.app.app.registry.settings.__setitem__,
+                        'longpoll_max_wait_seconds', 5)
+        before = time.time()
+        self.app.get(self.url + '&_wait=30', headers=self.headers)
+        self.assertLess(time.time() - before, 1)
+
+    def test_returns_changes_once_collection_changed(self):
+        self.create_record_later()
+        before = time.time()
+        resp = self.app.get(self.url + '&_wait=3', headers=self.headers)
+        self.assertLess(time.time() - before, 3)
+        names = [r['name'] for r in resp.json['data']]
+        self.assertEqual(names, ['chanterelle'])
+
+    def test_wait_is_ignored_if_collection_ids_are_unknown(self):
+        with mock.patch('cliquet.resource.UserResource.get_collection_ids',
+                        return_value=None):
+            before = time.time()
+            self.app.get(self.url + '&_wait=3', headers=self.headers)
+        self.assertLess(time.time() - before, 1)
+
+    def test_view_is_run_if_timestamp_cannot_be_read(self):
+        self.fail_once()
+        before = time.time()
+        self.app.get(self.url + '&_wait=3', headers=self.headers)
+        self.assertLess(time.time() - before, 1)
+
+    def test_transaction_is_committed_while_waiting(self):
+        # The timestamp of an empty collection may have been stored.
+        request = mock.MagicMock()
+        with mock.patch('cliquet.resource.viewset.notify_on_commit'):
+            _release_transaction(request)
+        request.tm.commit.assert_called_with()
+        self.assertFalse(request.tm.abort.called)
+        request.tm.begin.assert_called_with()
+
+    def test_wait_is_ignored_without_since(self):
+        before = time.time()
+        self.app.get(self.collection_url + '?_wait=3', headers=self.headers)
+        self.assertLess(time.time() - before, 1)
+
+    def test_wait_must_be_a_positive_integer(self):
+        self.app.get(self.url + '&_wait=abc', headers=self.headers,
+                     status=400)
+        self.app.get(self.url + '&_wait=-1', headers=self.headers,
+                     status=400)
+
+    def test_capability_is_exposed(self):
+        resp = self.app.get('/')
+        self.assertIn('longpoll', resp.json['capabilities'])
+
+
+class EventStreamTest(BaseLongPollTest, unittest.TestCase):
+
+    def setUp(self):
+        super(EventStreamTest, self).setUp()
+        self.stream_headers = self.headers.copy()
+        self.stream_headers['Accept'] = 'text/event-stream'
+
+    def test_current_timestamp_is_sent_first(self):
+        url = self.collection_url + '?_wait=0'
+        resp = self.app.get(url, headers=self.stream_headers)
+        self.assertEqual(resp.content_type, 'text/event-stream')
+        self.assertEqual(resp.headers['Cache-Control'], 'no-cache')
+        event_id, data = resp.body.decode('utf-8').split('\n')[:2]
+        self.assertEqual(event_id, 'id: %s' % self.timestamp)
+        self.assertEqual(json.loads(data[len('data: '):]),
+                         {'timestamp': self.timestamp})
+
+    def test_nothing_is_sent_if_last_event_id_is_current(self):
+        self.stream_headers['Last-Event-ID'] = str(self.timestamp)
+        url = self.collection_url + '?_wait=0'
+        resp = self.app.get(url, headers=self.stream_headers)
+        self.assertEqual(resp.body, b':\n\n')
+
+    def test_changes_are_sent_until_timeout(self):
+        self.create_record_later()
+        resp = self.app.get(self.url + '&_wait=1',
+                            headers=self.stream_headers)
+        events = [e for e in resp.body.decode('utf-8').split('\n\n')
+                  if e.startswith('id:')]
+        self.assertEqual(len(events), 1)
+        new_timestamp = int(events[0].split('\n')[0][4:])
+        self.assertGreater(new_timestamp, self.timestamp)
+
+    def test_stream_lasts_until_max_wait_by_default(self):
+        self.app.app.registry.settings['longpoll_max_wait_seconds'] = 0
+        self.addCleanup(self.app.app.registry.settings.__setitem__,
+                        'longpoll_max_wait_seconds', 5)
+        resp = self.app.get(self.collection_url, headers=self.stream_headers)
+        self.assertTrue(resp.body.decode('utf-8').startswith('id: '))
+
+    def test_stream_ends_if_timestamp_cannot_be_read(self):
+        self.fail_once()
+        resp = self.app.get(self.url + '&_wait=3',
+                            headers=self.stream_headers)
+        self.assertEqual(resp.content_type, 'text/event-stream')
+        self.assertEqual(resp.body, b'')
+
+    def test_view_is_called_if_collection_ids_are_unknown(self):
+        with mock.patch('cliquet.resource.UserResource.get_collection_ids',
+                        return_value=None):
+            resp = self.app.get(self.collection_url,
+                                headers=self.stream_headers)
+        self.assertEqual(resp.content_type, 'application/json')
+
+    def test_json_is_preferred_by_default(self):
+        self.stream_headers['Accept'] = '*/*'
+        resp = self.app.get(self.collection_url,
+                            headers=self.stream_headers)
+        self.assertEqual(resp.content_type, 'application/json')
+
+
+class DisabledLongPollTest(BaseWebTest, unittest.TestCase):
+
+    def test_wait_is_ignored(self):
+        before = time.time()
+        url = self.collection_url + '?_since=0&_wait=3'
+        self.app.get(url, headers=self.headers)
+        self.assertLess(time.time() - before, 1)
+
+    def test_event_stream_is_not_acceptable(self):
+        headers = self.headers.copy()
+        headers['Accept'] = 'text/event-stream'
+        self.app.get(self.collection_url, headers=headers, status=406)
@@ -149,6 +149,19 @@ class SpecifyRecordPermissionTest(PermissionTest):
         self.assertEqual(sorted(result['permissions']['write']),
                          ['basicauth:userid', 'jean-louis'])
 
+    def test_permissions_are_set_with_a_single_backend_call(self):
+        perms = {'write': ['jean-louis']}
+        self.resource.request.validated = {'data': {}, 'permissions': perms}
+        self.resource.request.method = 'POST'
+        self.resource.context.object_uri = '/articles'
+        with mock.patch.object(self.permission, 'apply_many',
+                               wraps=self.permission.apply_many) as applied:
+            with mock.patch.object(self.permission,
+                                   'object_permissions') as read:
+                self.resource.collection_post()
+        self.assertEqual(applied.call_count, 1)
+        self.assertFalse(read.called)
+
     def test_412_errors_do_not_put_permission_in_record(self):
         self.resource.request.headers['If-Match'] = '"1234567"'  # invalid
         try:
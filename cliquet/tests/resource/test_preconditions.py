@@ -1,3 +1,5 @@
+import mock
+
 from pyramid import httpexceptions
 
 from cliquet.errors import ERRORS
@@ -28,6 +30,15 @@ class NotModifiedTest(BaseTest):
         self.assertIsNotNone(error.headers.get('ETag'))
         self.assertIsNotNone(error.headers.get('Last-Modified'))
 
+    def test_collection_timestamp_is_read_once(self):
+        with mock.patch.object(self.storage, 'collection_timestamp',
+                               wraps=self.storage.collection_timestamp) as m:
+            resource = self.resource_class(request=self.resource.request,
+                                           context=self.get_context())
+            self.assertRaises(httpexceptions.HTTPNotModified,
+                              resource.collection_get)
+        self.assertEqual(m.call_count, 1)
+
     def test_single_record_returns_304_if_no_change_meanwhile(self):
         self.resource.record_id = self.stored['id']
         try:
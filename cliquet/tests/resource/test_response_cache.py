@@ -0,0 +1,112 @@
+import mock
+from pyramid.request import Request
+
+from cliquet.cache import memory as memory_backend
+from cliquet.tests.resource import BaseTest
+
+
+class ResponseCacheTest(BaseTest):
+    setting = 'test_response_cache_ttl_seconds'
+
+    def setUp(self):
+        self.cache = memory_backend.Cache(cache_prefix='')
+        super(ResponseCacheTest, self).setUp()
+        self.patch_known_field.start()
+        for i in range(3):
+            self.model.create_record({'title': 'MoFo #%s' % i})
+        self.resource = self.new_resource()
+
+    def get_request(self):
+        request = super(ResponseCacheTest, self).get_request()
+        request.registry.cache = self.cache
+        request.registry.settings[self.setting] = 30
+        request.effective_principals = ['system.Everyone']
+        return request
+
+    def get_context(self):
+        context = super(ResponseCacheTest, self).get_context()
+        context.resource_name = 'test'
+        return context
+
+    def new_resource(self, querystring=None):
+        """Simulate a new request on the collection."""
+        resource = self.resource_class(request=self.get_request(),
+                                       context=self.get_context())
+        resource.request.GET = querystring or {}
+        mock.patch.object(resource, 'is_known_field').start()
+        return resource
+
+    def test_responses_are_not_cached_by_default(self):
+        self.resource.request.registry.settings.pop(self.setting)
+        self.resource.collection_get()
+        self.assertEqual(self.cache._store, {})
+
+    def test_responses_are_served_without_reading_storage(self):
+        expected = self.resource.collection_get()
+        resource = self.new_resource()
+        with mock.patch.object(resource.model, 'get_records') as mocked:
+            result = resource.collection_get()
+        self.assertFalse(mocked.called)
+        self.assertEqual(result, expected)
+
+    def test_headers_are_served_from_cache(self):
+        self.resource.request.GET = {'_limit': '2'}
+        self.resource.collection_get()
+        expected = self.last_response.headers.copy()
+        resource = self.new_resource({'_limit': '2'})
+        resource.collection_get()
+        headers = resource.request.response.headers
+        self.assertEqual(headers['Total-Records'], '3')
+        self.assertEqual(headers['Next-Page'], expected['Next-Page'])
+        self.assertEqual(headers['ETag'], expected['ETag'])
+
+    def test_responses_are_cached_with_the_ttl_setting(self):
+        self.resource.collection_get()
+        key, = self.cache._store.keys()
+        self.assertLessEqual(self.cache.ttl(key), 30)
+        self.assertGreater(self.cache.ttl(key), 29)
+
+    def test_changes_in_collection_are_served(self):
+        self.resource.collection_get()
+        self.model.create_record({'title': 'MoFo #4'})
+        result = self.new_resource().collection_get()
+        self.assertEqual(len(result['data']), 4)
+
+    def test_querystring_is_part_of_cache_key(self):
+        self.resource.collection_get()
+        result = self.new_resource({'_limit': '1'}).collection_get()
+        self.assertEqual(len(result['data']), 1)
+
+    def test_querystring_order_is_not_part_of_cache_key(self):
+        first = Request.blank('/?_limit=1&_sort=title').GET
+        second = Request.blank('/?_sort=title&_limit=1').GET
+        self.assertNotEqual(list(first.items()), list(second.items()))
+        self.new_resource(first).collection_get()
+        resource = self.new_resource(second)
+        with mock.patch.object(resource.model, 'get_records') as mocked:
+            resource.collection_get()
+        self.assertFalse(mocked.called)
+
+    def test_principals_are_part_of_cache_key(self):
+        self.resource.collection_get()
+        resource = self.new_resource()
+        resource.request.effective_principals = ['system.Authenticated']
+        with mock.patch.object(resource.model, 'get_records',
+                               return_value=([], 0)) as mocked:
+            resource.collection_get()
+        self.assertTrue(mocked.called)
+
+    def test_shared_records_are_part_of_cache_key(self):
+        self.resource.collection_get()
+        resource = self.new_resource()
+        resource.context.shared_ids = ['abc']
+        with mock.patch.object(resource.model, 'get_records',
+                               return_value=([], 0)) as mocked:
+            resource.collection_get()
+        self.assertTrue(mocked.called)
+
+    def test_read_event_is_notified_when_served_from_cache(self):
+        self.resource.collection_get()
+        resource = self.new_resource()
+        resource.collection_get()
+        self.assertTrue(resource.request.notify_resource_event.called)
@@ -777,3 +777,52 @@ class SchemaLessPartialResponseTest(BaseWebTest, unittest.TestCase):
         resp = self.app.get(self.collection_url + '?_fields=nationality')
         result = resp.json['data'][0]
         self.assertNotIn('nationality', result)
+
+
+class NotModifiedShortcutTest(BaseWebTest, unittest.TestCase):
+    def setUp(self):
+        super(NotModifiedShortcutTest, self).setUp()
+        resp = self.app.get(self.collection_url, headers=self.headers)
+        self.headers = self.headers.copy()
+        self.headers['If-None-Match'] = resp.headers['ETag']
+
+    def test_304_is_returned_without_calling_the_view(self):
+        with mock.patch('cliquet.resource.UserResource.collection_get') as m:
+            resp = self.app.get(self.collection_url, headers=self.headers,
+                                status=304)
+        self.assertFalse(m.called)
+        self.assertEqual(resp.headers['ETag'],
+                         self.headers['If-None-Match'])
+        self.assertIn('Last-Modified', resp.headers)
+
+    def test_304_is_not_returned_if_collection_changed(self):
+        body = {'data': MINIMALIST_RECORD}
+        self.app.post_json(self.collection_url, body, headers=self.headers)
+        self.app.get(self.collection_url, headers=self.headers, status=200)
+
+    def test_304_is_not_returned_if_collection_ids_are_unknown(self):
+        with mock.patch('cliquet.resource.UserResource.get_collection_ids',
+                        return_value=None):
+            with mock.patch('cliquet.resource.viewset.HTTPNotModified') as m:
+                # Answered by the view.
+                self.app.get(self.collection_url, headers=self.headers,
+                             status=304)
+        self.assertFalse(m.called)
+
+    def test_304_is_not_returned_if_not_authenticated(self):
+        headers = {'If-None-Match': self.headers['If-None-Match']}
+        self.app.get(self.collection_url, headers=headers, status=401)
+
+    def test_invalid_if_none_match_is_still_rejected(self):
+        self.headers['If-None-Match'] = 'abc'
+        self.app.get(self.collection_url, headers=self.headers, status=400)
+
+    def test_star_if_none_match_is_handled_by_the_view(self):
+        self.headers['If-None-Match'] = '*'
+        self.app.get(self.collection_url, headers=self.headers, status=200)
+
+    def test_backend_errors_are_handled_by_the_view(self):
+        with mock.patch.object(self.storage, 'collection_timestamp',
+                               side_effect=storage_exceptions.BackendError):
+            self.app.get(self.collection_url, headers=self.headers,
+                         status=503)
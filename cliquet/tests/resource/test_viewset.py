@@ -122,6 +122,7 @@ class ViewSetTest(unittest.TestCase):
 
         arguments = viewset.collection_arguments(mock.MagicMock, 'get')
         arguments.pop('schema')
+        arguments.pop('decorator')
         self.assertDictEqual(
             arguments,
             {
@@ -132,6 +133,13 @@ class ViewSetTest(unittest.TestCase):
             }
         )
 
+    def test_collection_get_arguments_short_circuit_not_modified(self):
+        viewset = ViewSet()
+        arguments = viewset.collection_arguments(mock.MagicMock, 'get')
+        self.assertIn('decorator', arguments)
+        arguments = viewset.collection_arguments(mock.MagicMock, 'delete')
+        self.assertNotIn('decorator', arguments)
+
     def test_default_arguments_are_used_for_record_arguments(self):
         default_arguments = {
             'cors_headers': mock.sentinel.cors_headers,
@@ -1,16 +1,20 @@
 import mock
+import threading
 import time
+from collections import defaultdict
 
 import redis
 from pyramid import testing
+from pyramid.exceptions import ConfigurationError
 
 from cliquet.utils import sqlalchemy
 from cliquet.storage import exceptions
 from cliquet.cache import (CacheBase, postgresql as postgresql_backend,
                            redis as redis_backend, memory as memory_backend,
-                           heartbeat)
+                           tiered as tiered_backend, heartbeat)
 
-from .support import unittest, skip_if_no_postgresql, load_default_settings
+from .support import (unittest, skip_if_no_postgresql, skip_if_travis,
+                      load_default_settings)
 
 
 class CacheBaseTest(unittest.TestCase):
@@ -26,10 +30,21 @@ class CacheBaseTest(unittest.TestCase):
             (self.cache.get, ''),
             (self.cache.set, '', ''),
             (self.cache.delete, ''),
+            (self.cache.get_many, ['']),
+            (self.cache.set_many, {'': ''}),
+            (self.cache.delete_many, ['']),
         ]
         for call in calls:
             self.assertRaises(NotImplementedError, *call)
 
+    def test_purge_expired_does_nothing_by_default(self):
+        self.assertEqual(self.cache.purge_expired(), 0)
+
+    def test_default_bulk_methods_rely_on_other_methods(self):
+        with mock.patch.object(self.cache, 'get',
+                               side_effect=lambda key: {'a': 1}.get(key)):
+            self.assertEqual(self.cache.get_many(['a', 'b']), {'a': 1})
+
 
 class BaseTestCache(object):
     backend = None
@@ -75,6 +90,9 @@ class BaseTestCache(object):
             (self.cache.get, ''),
             (self.cache.set, '', ''),
             (self.cache.delete, ''),
+            (self.cache.get_many, ['']),
+            (self.cache.set_many, {'': ''}),
+            (self.cache.delete_many, ['']),
         ]
         for call in calls:
             self.assertRaises(exceptions.BackendError, *call)
@@ -129,6 +147,43 @@ class BaseTestCache(object):
     def test_delete_does_not_fail_if_record_is_unknown(self):
         self.cache.delete('foobar')
 
+    def test_get_many_returns_values_of_existing_keys(self):
+        self.cache.set('foo', 'toto')
+        self.cache.set('bar', {'b': [1, 2]})
+        retrieved = self.cache.get_many(['foo', 'bar', 'unknown'])
+        self.assertEqual(retrieved, {'foo': 'toto', 'bar': {'b': [1, 2]}})
+
+    def test_get_many_supports_empty_list(self):
+        self.assertEqual(self.cache.get_many([]), {})
+
+    def test_set_many_adds_the_records(self):
+        self.cache.set('foo', 'previous')
+        self.cache.set_many({'foo': 'toto', 'bar': 3.14})
+        self.assertEqual(self.cache.get('foo'), 'toto')
+        self.assertEqual(self.cache.get('bar'), 3.14)
+
+    def test_set_many_supports_empty_dict(self):
+        self.cache.set_many({})
+
+    def test_set_many_with_ttl_sets_the_time_to_live(self):
+        self.cache.set_many({'foo': 'toto', 'bar': 'tata'}, 10)
+        self.assertGreater(self.cache.ttl('foo'), 0)
+        self.assertLessEqual(self.cache.ttl('bar'), 10)
+
+    def test_set_many_with_ttl_expires_the_values(self):
+        self.cache.set_many({'foo': 'toto', 'bar': 'tata'}, 0.01)
+        time.sleep(0.02)
+        self.assertEqual(self.cache.get_many(['foo', 'bar']), {})
+
+    def test_delete_many_removes_the_records(self):
+        self.cache.set_many({'foo': 'toto', 'bar': 'tata', 'baz': 'titi'})
+        self.cache.delete_many(['foo', 'bar', 'unknown'])
+        self.assertEqual(self.cache.get_many(['foo', 'bar', 'baz']),
+                         {'baz': 'titi'})
+
+    def test_delete_many_supports_empty_list(self):
+        self.cache.delete_many([])
+
     def test_expire_expires_the_value(self):
         self.cache.set('foobar', 'toto')
         self.cache.expire('foobar', 0.01)
@@ -205,6 +260,16 @@ class BaseTestCache(object):
         self.assertLessEqual(obtained, 10)
         self.assertGreater(obtained, 9)
 
+    def test_prefix_value_used_with_many_operations(self):
+        cache_prefix = self.get_backend_prefix(prefix='prefix_')
+        cache_prefix.set_many({'foo': 'toto', 'bar': 'tata'})
+        self.assertEqual(self.cache.get('prefix_foo'), 'toto')
+        self.assertEqual(cache_prefix.get_many(['foo', 'bar']),
+                         {'foo': 'toto', 'bar': 'tata'})
+        cache_prefix.delete_many(['foo'])
+        self.assertIsNone(self.cache.get('prefix_foo'))
+        self.assertEqual(self.cache.get('prefix_bar'), 'tata')
+
     def test_prefix_value_used_with_expire(self):
         backend_prefix = self.get_backend_prefix(prefix='prefix_')
 
@@ -232,8 +297,9 @@ class MemoryCacheTest(BaseTestCache, unittest.TestCase):
         backend_prefix = BaseTestCache.get_backend_prefix(self, prefix)
 
         # Share the store between both client for tests.
-        backend_prefix._ttl = self.cache._ttl
-        backend_prefix._store = self.cache._store
+        for attr in ('_store', '_ttl', '_expirations', '_sizes', '_policy',
+                     '_lock'):
+            setattr(backend_prefix, attr, getattr(self.cache, attr))
 
         return backend_prefix
 
@@ -247,6 +313,152 @@ class MemoryCacheTest(BaseTestCache, unittest.TestCase):
         pass
 
 
+class BoundedMemoryCacheTest(unittest.TestCase):
+    def test_settings_are_taken_into_account(self):
+        config = testing.setUp(settings={
+            'cache_prefix': '',
+            'cache_max_items': '10',
+            'cache_max_size_bytes': '1024',
+            'cache_eviction_policy': 'LFU'})
+        cache = memory_backend.load_from_config(config)
+        self.assertEqual(cache.max_items, 10)
+        self.assertEqual(cache.max_size_bytes, 1024)
+        self.assertIsInstance(cache._policy, memory_backend._LFUPolicy)
+
+    def test_least_recently_used_values_are_evicted(self):
+        cache = memory_backend.Cache(cache_prefix='', max_items=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_least_frequently_used_values_are_evicted(self):
+        cache = memory_backend.Cache(cache_prefix='', max_items=2,
+                                     eviction_policy='lfu')
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.get('a')
+        cache.get('b')
+        cache.set('c', 3)
+        cache.set('d', 4)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual(cache.get('d'), 4)
+
+    def test_lfu_policy_tracks_unknown_touched_keys(self):
+        policy = memory_backend._LFUPolicy()
+        policy.touch('a')
+        policy.add('b')
+        policy.touch('a')
+        self.assertEqual(policy._counts, {'a': 2, 'b': 1})
+
+    def test_values_are_evicted_when_size_is_exceeded(self):
+        cache = memory_backend.Cache(cache_prefix='', max_size_bytes=30)
+        cache.set('a', 'x' * 10)
+        cache.set('b', 'x' * 10)
+        cache.set('c', 'x' * 10)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache._total_size, 2 * (1 + 12))
+
+    def test_size_is_updated_when_values_are_replaced_or_deleted(self):
+        cache = memory_backend.Cache(cache_prefix='', max_size_bytes=100)
+        cache.set('a', 'x' * 10)
+        cache.set('a', 'x')
+        self.assertEqual(cache._total_size, 1 + 3)
+        cache.delete('a')
+        self.assertEqual(cache._total_size, 0)
+
+    def test_value_bigger_than_the_whole_cache_is_not_stored(self):
+        cache = memory_backend.Cache(cache_prefix='', max_size_bytes=10)
+        cache.set('a', 'x')
+        cache.set('b', 'x' * 20)
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNone(cache.get('a'))
+
+    def test_expired_values_are_removed_without_scanning_keys(self):
+        cache = memory_backend.Cache(cache_prefix='')
+        with mock.patch('cliquet.cache.memory.utils.msec_time',
+                        return_value=0):
+            cache.set('a', 1, ttl=1)
+            cache.set('b', 2, ttl=10)
+            cache.set('c', 3)
+        with mock.patch('cliquet.cache.memory.utils.msec_time',
+                        return_value=5000):
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get('b'), 2)
+        self.assertEqual(sorted(cache._store.keys()), ['b', 'c'])
+        self.assertEqual(len(cache._expirations), 1)
+
+    def test_changed_expirations_are_respected(self):
+        cache = memory_backend.Cache(cache_prefix='')
+        with mock.patch('cliquet.cache.memory.utils.msec_time',
+                        return_value=0):
+            cache.set('a', 1, ttl=1)
+            cache.expire('a', 10)
+        with mock.patch('cliquet.cache.memory.utils.msec_time',
+                        return_value=5000):
+            self.assertEqual(cache.get('a'), 1)
+
+    def test_expirations_heap_is_compacted(self):
+        cache = memory_backend.Cache(cache_prefix='')
+        for i in range(1000):
+            cache.expire('a', 10 + i)
+        self.assertLess(len(cache._expirations), 100)
+
+    def test_cache_can_be_used_from_several_threads(self):
+        cache = memory_backend.Cache(cache_prefix='', max_items=50,
+                                     eviction_policy='lfu')
+        errors = []
+
+        def work(thread_id):
+            try:
+                for i in range(500):
+                    key = '%s-%s' % (thread_id, i % 80)
+                    cache.set(key, i, ttl=0.001 * (i % 3))
+                    cache.get(key)
+                    cache.delete('%s-%s' % (thread_id, i % 7))
+            except Exception as e:  # pragma: no cover
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(i,))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(cache._store), 50)
+
+    def _benchmark(self, nb_keys, nb_operations=2000):
+        cache = memory_backend.Cache(cache_prefix='', max_items=nb_keys)
+        for i in range(nb_keys):
+            cache.set('key-%s' % i, {'value': i}, ttl=3600)
+
+        start = time.time()
+        for i in range(nb_operations):
+            cache.get('key-%s' % (i * 7 % nb_keys))
+        get_duration = time.time() - start
+
+        start = time.time()
+        for i in range(nb_operations):
+            cache.set('new-%s' % i, {'value': i}, ttl=3600)
+        set_duration = time.time() - start
+        return get_duration, set_duration
+
+    @skip_if_travis
+    def test_get_and_set_do_not_depend_on_number_of_keys(self):
+        small_get, small_set = self._benchmark(1000)
+        large_get, large_set = self._benchmark(100000)
+        # Previously, every get() was scanning all keys.
+        self.assertLess(large_get, small_get * 3)
+        self.assertLess(large_set, small_set * 3)
+
+
 class RedisCacheTest(BaseTestCache, unittest.TestCase):
     backend = redis_backend
     settings = {
@@ -258,8 +470,8 @@ class RedisCacheTest(BaseTestCache, unittest.TestCase):
     def setUp(self):
         super(RedisCacheTest, self).setUp()
         self.client_error_patcher = mock.patch.object(
-            self.cache._client,
-            'execute_command',
+            self.cache._client.connection_pool,
+            'get_connection',
             side_effect=redis.RedisError)
 
     def test_config_is_taken_in_account(self):
@@ -271,6 +483,205 @@ class RedisCacheTest(BaseTestCache, unittest.TestCase):
             {'host': 'peer.loc', 'password': 'secret', 'db': 7, 'port': 4444})
 
 
+class TieredCacheTest(BaseTestCache, unittest.TestCase):
+    backend = tiered_backend
+    settings = {
+        'cache_tiered_backend': 'cliquet.cache.redis',
+        'cache_tiered_max_items': 100,
+        'cache_tiered_ttl_seconds': 60,
+        'cache_tiered_invalidation_url': 'redis://localhost:6379/0',
+        'cache_url': '',
+        'cache_pool_size': 10,
+        'cache_prefix': ''
+    }
+
+    def setUp(self):
+        super(TieredCacheTest, self).setUp()
+        self.client_error_patcher = mock.patch.object(
+            self.cache.remote._client.connection_pool,
+            'get_connection',
+            side_effect=redis.RedisError)
+        self.other = self.backend.load_from_config(self._get_config())
+
+    def get_backend_prefix(self, prefix):
+        backend_prefix = BaseTestCache.get_backend_prefix(self, prefix)
+
+        # Share the memory store between both clients for tests, since
+        # invalidations are asynchronous.
+        backend_prefix._start_listener()
+        self.cache._start_listener()
+        for attr in ('_store', '_ttl', '_expirations', '_sizes', '_policy',
+                     '_lock'):
+            setattr(backend_prefix.near, attr, getattr(self.cache.near, attr))
+
+        return backend_prefix
+
+    def wait_for(self, condition):
+        for _ in range(100):
+            if condition():
+                return True
+            time.sleep(0.02)
+        return False
+
+    def test_missing_remote_backend_raises_configuration_error(self):
+        settings = self.settings.copy()
+        settings['cache_tiered_backend'] = ''
+        self.assertRaises(ConfigurationError,
+                          self.backend.load_from_config,
+                          self._get_config(settings))
+
+    def test_hot_values_are_not_read_from_remote(self):
+        self.cache.set('foobar', 'toto')
+        with mock.patch.object(self.cache.remote, 'get') as remote_get:
+            self.assertEqual(self.cache.get('foobar'), 'toto')
+            self.assertEqual(self.cache.get_many(['foobar']),
+                             {'foobar': 'toto'})
+        self.assertFalse(remote_get.called)
+
+    def test_remote_values_are_kept_in_memory(self):
+        self.other.set('foobar', 'toto')
+        self.assertEqual(self.cache.get('foobar'), 'toto')
+        self.assertEqual(self.cache.near.get('foobar'), 'toto')
+        self.other.set('foo', 'bar')
+        self.assertEqual(self.cache.get_many(['foo', 'unknown']),
+                         {'foo': 'bar'})
+        self.assertEqual(self.cache.near.get('foo'), 'bar')
+
+    def test_memory_values_do_not_outlive_remote_ttl(self):
+        self.cache.set('foobar', 'toto', 0.01)
+        self.assertLessEqual(self.cache.near.ttl('foobar'), 0.01)
+
+    def test_memory_copies_do_not_outlive_remote_ttl(self):
+        self.other.set('foobar', 'toto', 5)
+        self.other.set('foo', 'bar', 5)
+        self.cache.get('foobar')
+        self.cache.get_many(['foo'])
+        self.assertLessEqual(self.cache.near.ttl('foobar'), 5)
+        self.assertLessEqual(self.cache.near.ttl('foo'), 5)
+
+    def test_memory_copies_of_values_without_ttl_expire_after_tiered_ttl(self):
+        self.other.set('foobar', 'toto')
+        self.cache.get('foobar')
+        self.assertGreater(self.cache.near.ttl('foobar'), 59)
+
+    def test_values_about_to_expire_are_not_kept_in_memory(self):
+        self.other.set('foobar', 'toto')
+        with mock.patch.object(self.cache.remote, 'ttl', return_value=0):
+            self.assertEqual(self.cache.get('foobar'), 'toto')
+        self.assertIsNone(self.cache.near.get('foobar'))
+
+    def test_memory_values_expire_after_tiered_ttl(self):
+        self.cache.near_ttl = 0.01
+        self.cache.set('foobar', 'toto')
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.near.get('foobar'))
+
+    def test_changes_evict_copies_of_other_processes(self):
+        self.cache.set('foobar', 'toto')
+        self.cache.set('foo', 'bar')
+        self.assertEqual(self.other.get('foobar'), 'toto')
+        self.assertEqual(self.other.get('foo'), 'bar')
+
+        self.cache.set('foobar', 'tata')
+        self.assertTrue(self.wait_for(
+            lambda: self.other.near.get('foobar') is None))
+        self.assertEqual(self.other.get('foobar'), 'tata')
+
+        self.cache.delete_many(['foo'])
+        self.assertTrue(self.wait_for(
+            lambda: self.other.near.get('foo') is None))
+
+    def test_flush_evicts_every_copy_of_other_processes(self):
+        self.cache.set('foobar', 'toto')
+        self.assertEqual(self.other.get('foobar'), 'toto')
+        self.cache.flush()
+        self.assertTrue(self.wait_for(
+            lambda: self.other.near.get('foobar') is None))
+
+    def test_own_changes_do_not_evict_copies(self):
+        self.cache.get('foobar')
+        self.cache.set('foobar', 'toto')
+        time.sleep(0.05)
+        self.assertEqual(self.cache.near.get('foobar'), 'toto')
+
+    def test_broadcast_errors_are_not_raised(self):
+        with mock.patch.object(self.cache.invalidation_client, 'publish',
+                               side_effect=redis.RedisError):
+            self.cache.set('foobar', 'toto')
+        self.assertEqual(self.cache.get('foobar'), 'toto')
+
+    def test_hits_and_misses_are_counted_by_tier(self):
+        self.cache.statsd = mock.MagicMock()
+        self.other.set('foobar', 'toto')
+        self.cache.get('foobar')
+        self.cache.get('foobar')
+        self.cache.get('unknown')
+        counted = [c[0][0] for c in self.cache.statsd.count.call_args_list]
+        self.assertEqual(counted, ['cache.tiered.near.misses',
+                                   'cache.tiered.remote.hits',
+                                   'cache.tiered.near.hits',
+                                   'cache.tiered.near.misses',
+                                   'cache.tiered.remote.misses'])
+
+    def test_bulk_hits_and_misses_are_counted_at_once(self):
+        self.cache.statsd = mock.MagicMock()
+        self.other.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.cache.get('a')
+        self.cache.get_many(['a', 'b', 'c', 'd'])
+        self.cache.statsd.count.assert_has_calls([
+            mock.call('cache.tiered.near.hits', count=1),
+            mock.call('cache.tiered.near.misses', count=3),
+            mock.call('cache.tiered.remote.hits', count=2),
+            mock.call('cache.tiered.remote.misses', count=1)])
+
+    def test_expired_values_are_purged_on_remote_backend(self):
+        with mock.patch.object(self.cache.remote, 'purge_expired',
+                               return_value=3) as purge_expired:
+            self.assertEqual(self.cache.purge_expired(limit=10), 3)
+        purge_expired.assert_called_with(limit=10)
+
+    def test_memory_ttl_is_value_ttl_if_not_bounded(self):
+        self.cache.near_ttl = None
+        self.cache.set('foobar', 'toto', 60)
+        self.assertGreater(self.cache.near.ttl('foobar'), 59)
+
+    def test_invalid_remote_backend_raises_configuration_error(self):
+        settings = self.settings.copy()
+        settings['cache_tiered_backend'] = 'cliquet.tests.testapp'
+        with mock.patch('cliquet.tests.testapp.load_from_config',
+                        create=True, return_value=object()):
+            self.assertRaises(ConfigurationError,
+                              self.backend.load_from_config,
+                              self._get_config(settings))
+
+    def test_listener_flushes_memory_on_subscription_errors(self):
+        pubsub = self.cache.invalidation_client.pubsub = mock.MagicMock()
+        pubsub().subscribe.side_effect = redis.RedisError
+        self.cache.near.set('foobar', 'toto')
+
+        class Stop(Exception):
+            pass
+
+        with mock.patch('cliquet.cache.tiered.time.sleep', side_effect=Stop):
+            self.assertRaises(Stop, self.cache._listen, threading.Event())
+        self.assertIsNone(self.cache.near.get('foobar'))
+        self.assertTrue(pubsub().close.called)
+
+
+class TieredCacheWithoutInvalidationTest(unittest.TestCase):
+    def setUp(self):
+        config = testing.setUp(settings={
+            'cache_tiered_backend': 'cliquet.cache.memory',
+            'cache_prefix': ''
+        })
+        self.cache = tiered_backend.load_from_config(config)
+
+    def test_values_are_served_without_broadcasting(self):
+        self.cache.set('foobar', 'toto')
+        self.assertEqual(self.cache.get('foobar'), 'toto')
+        self.assertIsNone(self.cache._listener)
+
+
 @skip_if_no_postgresql
 class PostgreSQLCacheTest(BaseTestCache, unittest.TestCase):
     backend = postgresql_backend
@@ -282,3 +693,79 @@ class PostgreSQLCacheTest(BaseTestCache, unittest.TestCase):
             self.cache.client,
             'session_factory',
             side_effect=sqlalchemy.exc.SQLAlchemyError)
+
+    def test_expired_values_are_not_returned_before_purge(self):
+        self.cache.set('foobar', 'toto', 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('foobar'))
+        self.assertEqual(self.cache.get_many(['foobar']), {})
+        self.assertEqual(self.cache.ttl('foobar'), -1)
+        with self.cache.client.connect(readonly=True) as conn:
+            result = conn.execute("SELECT key FROM cache;")
+            self.assertEqual(result.rowcount, 1)
+
+    def test_reads_do_not_write(self):
+        self.cache.set('foobar', 'toto')
+        with mock.patch.object(self.cache.client, 'connect',
+                               wraps=self.cache.client.connect) as connect:
+            self.cache.get('foobar')
+            self.cache.get_many(['foobar'])
+        for call in connect.call_args_list:
+            self.assertEqual(call, mock.call(readonly=True))
+
+    def test_purge_expired_deletes_expired_values(self):
+        self.cache.set('a', 'toto', 0.01)
+        self.cache.set('b', 'toto', 0.01)
+        self.cache.set('c', 'toto', 60)
+        self.cache.set('d', 'toto')
+        time.sleep(0.02)
+        self.assertEqual(self.cache.purge_expired(limit=1), 1)
+        self.assertEqual(self.cache.purge_expired(), 1)
+        self.assertEqual(self.cache.purge_expired(), 0)
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c', 'd']),
+                         {'c': 'toto', 'd': 'toto'})
+
+    def test_writes_purge_expired_values_periodically(self):
+        self.cache.purge_interval = 60
+        self.cache.purge_batch_size = 10
+        with mock.patch.object(self.cache, 'purge_expired') as purge:
+            self.cache.set('a', 'toto')
+            self.assertFalse(purge.called)
+            self.cache._last_purge -= 61
+            self.cache.set_many({'b': 'toto'})
+            purge.assert_called_with(limit=10)
+            purge.reset_mock()
+            self.cache.set('c', 'toto')
+            self.assertFalse(purge.called)
+
+    def test_periodic_purge_can_be_disabled(self):
+        settings = self.settings.copy()
+        settings['cache_purge_interval_seconds'] = '0'
+        cache = self.backend.load_from_config(self._get_config(settings))
+        cache._last_purge -= 3600
+        with mock.patch.object(cache, 'purge_expired') as purge:
+            cache.set('a', 'toto')
+        self.assertFalse(purge.called)
+
+    def test_cache_table_can_be_unlogged(self):
+        query = "SELECT relpersistence FROM pg_class WHERE relname = 'cache';"
+        settings = self.settings.copy()
+        settings['cache_unlogged'] = 'true'
+        cache = self.backend.load_from_config(self._get_config(settings))
+        cache.initialize_schema()
+        with cache.client.connect(readonly=True) as conn:
+            persistence = conn.execute(query).fetchone()['relpersistence']
+        self.assertEqual(persistence, 'u')
+
+        self.cache.initialize_schema()
+        with cache.client.connect(readonly=True) as conn:
+            persistence = conn.execute(query).fetchone()['relpersistence']
+        self.assertEqual(persistence, 'p')
+
+    def test_cliquet_settings_are_not_passed_to_engine(self):
+        from cliquet import DEFAULT_SETTINGS
+        settings = DEFAULT_SETTINGS.copy()
+        settings.update(self.settings)
+        clients = defaultdict(dict)
+        with mock.patch('cliquet.storage.postgresql.client._CLIENTS', clients):
+            self.backend.load_from_config(self._get_config(settings))
@@ -103,6 +103,22 @@ class InitializationTest(unittest.TestCase):
         config_fails({'cliquet.cache_backend': 'cliquet.storage.memory'})
         config_fails({'cliquet.permission_backend': 'cliquet.storage.memory'})
 
+    def test_storage_timestamps_can_be_kept_in_cache_backend(self):
+        from cliquet.storage.caching import CachedTimestampStorage
+        config = Configurator(settings={
+            'storage_backend': 'cliquet.storage.memory',
+            'cache_backend': 'cliquet.cache.memory'})
+        cliquet.initialize(config, '0.0.1', 'project_name')
+        self.assertNotIsInstance(config.registry.storage,
+                                 CachedTimestampStorage)
+
+        config = Configurator(settings={
+            'storage_backend': 'cliquet.storage.memory',
+            'cache_backend': 'cliquet.cache.memory',
+            'storage_timestamp_cache_ttl_seconds': '60'})
+        cliquet.initialize(config, '0.0.1', 'project_name')
+        self.assertIsInstance(config.registry.storage, CachedTimestampStorage)
+
     def test_environment_values_override_configuration(self):
         import os
 
@@ -302,6 +318,12 @@ class StatsDConfigurationTest(unittest.TestCase):
         c = initialization.setup_statsd(self.config)
         c.watch_execution_time.assert_any_call({}, prefix='cache')
 
+    @mock.patch('cliquet.statsd.Client')
+    def test_statsd_is_given_to_tiered_cache(self, mocked):
+        self.config.registry.cache = mock.Mock(statsd=None)
+        c = initialization.setup_statsd(self.config)
+        self.assertEqual(self.config.registry.cache.statsd, c)
+
     @mock.patch('cliquet.statsd.Client')
     def test_statsd_is_set_on_storage(self, mocked):
         c = initialization.setup_statsd(self.config)
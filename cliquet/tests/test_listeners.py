@@ -1,19 +1,45 @@
 # -*- coding: utf-8 -*-
 import json
+import time
 import uuid
 from contextlib import contextmanager
 from datetime import datetime
 
 import mock
+import redis
 from pyramid import testing
+from pyramid.exceptions import ConfigurationError
 
 from cliquet import initialization
-from cliquet.events import ResourceChanged, ResourceRead, ACTIONS
+from cliquet.events import (ResourceChanged, ResourceRead,
+                            RelayedResourceChanged, ACTIONS)
 from cliquet.listeners import ListenerBase
+from cliquet.listeners.asynchronous import Dispatcher
+from cliquet.listeners import redis_stream
+from cliquet.storage import memory, StorageBase
+from cliquet.storage.caching import CachedTimestampStorage
 from cliquet.storage.redis import create_from_config
 from cliquet.tests.support import unittest
 
 
+@contextmanager
+def capture_dispatchers():
+    dispatchers = []
+
+    def create(*args, **kwargs):
+        dispatcher = Dispatcher(*args, **kwargs)
+        dispatchers.append(dispatcher)
+        return dispatcher
+
+    with mock.patch('cliquet.initialization.Dispatcher', side_effect=create):
+        yield dispatchers
+
+
+class OutboxStorage(StorageBase):
+    def outbox_add(self, entries):
+        pass
+
+
 class ListenerSetupTest(unittest.TestCase):
     def setUp(self):
         redis_patch = mock.patch('cliquet.listeners.redis.load_from_config')
@@ -26,6 +52,7 @@ class ListenerSetupTest(unittest.TestCase):
         }
         settings.update(**extra_settings)
         config = testing.setUp(settings=settings)
+        config.registry.storage = OutboxStorage()
         config.commit()
         initialization.setup_listeners(config)
         return config
@@ -102,6 +129,133 @@ class ListenerSetupTest(unittest.TestCase):
 
         self.assertEqual(self.redis_mocked.return_value.call_count, 2)
 
+    def test_events_are_dispatched_asynchronously_if_specified(self):
+        with capture_dispatchers() as dispatchers:
+            config = self.make_app({
+                'event_listeners.redis.async': 'true',
+                'event_listeners.redis.async_workers': '0',
+            })
+        event = ResourceChanged(ACTIONS.CREATE, 123456, [], Request())
+        config.registry.notify(event)
+        listener = self.redis_mocked.return_value
+        self.assertFalse(listener.called)
+        self.assertFalse(listener.call_many.called)
+
+        dispatcher, = dispatchers
+        dispatcher.flush()
+        listener.call_many.assert_called_with([event])
+
+    def test_outbox_requires_a_supporting_storage_backend(self):
+        config = testing.setUp(settings={'event_listeners': '',
+                                         'event_outbox': 'true',
+                                         'storage_backend':
+                                         'cliquet.storage.memory'})
+        config.registry.storage = CachedTimestampStorage(memory.Storage())
+        self.assertRaises(ConfigurationError,
+                          initialization.setup_listeners, config)
+
+    def test_changes_are_not_delivered_during_requests_if_outbox(self):
+        config = self.make_app({'event_outbox': 'true'})
+        event = ResourceChanged(ACTIONS.CREATE, 123456, [], Request())
+        config.registry.notify(event)
+        self.assertFalse(self.redis_mocked.return_value.called)
+
+    def test_relayed_changes_are_delivered_if_outbox(self):
+        config = self.make_app({'event_outbox': 'true',
+                                'event_listeners.redis.resources': 'toad'})
+        payload = {'action': 'create', 'resource_name': 'toad'}
+        config.registry.notify(RelayedResourceChanged(payload, []))
+        payload = {'action': 'create', 'resource_name': 'bucket'}
+        config.registry.notify(RelayedResourceChanged(payload, []))
+        self.assertEqual(self.redis_mocked.return_value.call_count, 1)
+
+    def test_events_records_are_compacted_if_specified(self):
+        config = self.make_app({'event_listeners.redis.compact': 'true'})
+        impacted = [{'new': {'id': 'a', 'name': 'Amanite'}}]
+        event = ResourceChanged(ACTIONS.CREATE, 123456, impacted, Request())
+        config.registry.notify(event)
+        received, = self.redis_mocked.return_value.call_args[0]
+        self.assertEqual(received.impacted_records, [{'new': {'id': 'a'}}])
+
+
+class DispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.listener = mock.MagicMock()
+        self.statsd = mock.MagicMock()
+        self.dispatcher = Dispatcher(self.listener, name='redis',
+                                     queue_size=3, batch_size=2,
+                                     flush_interval=0.01, workers=0,
+                                     statsd=self.statsd)
+
+    def test_unknown_overflow_policy_is_rejected(self):
+        self.assertRaises(ValueError, Dispatcher, self.listener,
+                          overflow='ignore')
+
+    def test_events_are_queued(self):
+        self.dispatcher(mock.sentinel.event)
+        self.assertFalse(self.listener.called)
+        self.assertFalse(self.listener.call_many.called)
+
+    def test_flush_delivers_events_by_batches(self):
+        for i in range(3):
+            self.dispatcher(i)
+        self.dispatcher.flush()
+        self.assertEqual(self.listener.call_many.call_args_list,
+                         [mock.call([0, 1]), mock.call([2])])
+
+    def test_deliveries_are_timed_with_statsd(self):
+        self.dispatcher(mock.sentinel.event)
+        self.dispatcher.flush()
+        self.statsd.timer.assert_called_with('listeners.redis')
+
+    def test_events_are_dropped_and_counted_when_queue_is_full(self):
+        for i in range(4):
+            self.dispatcher(i)
+        self.statsd.count.assert_called_with('listeners.redis.dropped')
+        self.dispatcher.flush()
+        delivered = [e for c in self.listener.call_many.call_args_list
+                     for e in c[0][0]]
+        self.assertEqual(delivered, [0, 1, 2])
+
+    def test_delivery_errors_are_logged(self):
+        self.listener.call_many.side_effect = ValueError
+        self.dispatcher(mock.sentinel.event)
+        with mock.patch('cliquet.listeners.asynchronous.logger') as mocked:
+            self.dispatcher.flush()
+        self.assertTrue(mocked.error.called)
+
+    def test_several_events_can_be_queued_at_once(self):
+        self.dispatcher.call_many([0, 1, 2])
+        self.dispatcher.flush()
+        self.assertEqual(self.listener.call_many.call_args_list,
+                         [mock.call([0, 1]), mock.call([2])])
+
+    def test_workers_do_not_wait_for_more_events_after_interval(self):
+        self.dispatcher.flush_interval = 0
+        for i in range(2):
+            self.dispatcher(i)
+
+        class Stop(Exception):
+            pass
+
+        with mock.patch.object(self.dispatcher, '_deliver',
+                               side_effect=Stop) as mocked:
+            self.assertRaises(Stop, self.dispatcher._work)
+        mocked.assert_called_with([0])
+
+    def test_workers_deliver_the_queued_events(self):
+        self.dispatcher.workers = 1
+        for i in range(3):
+            self.dispatcher(i)
+        for i in range(100):
+            if self.dispatcher._queue.empty():
+                break
+            time.sleep(0.01)
+        time.sleep(0.05)
+        delivered = [e for c in self.listener.call_many.call_args_list
+                     for e in c[0][0]]
+        self.assertEqual(delivered, [0, 1, 2])
+
 
 @contextmanager
 def broken_redis():
@@ -165,14 +319,15 @@ class ListenerCalledTest(unittest.TestCase):
         self.config.registry.notify(event)
 
     @contextmanager
-    def redis_listening(self):
+    def redis_listening(self, extra_settings={}):
         config = self.config
         listener = 'cliquet.listeners.redis'
 
         # setting up the redis listener
-        with mock.patch.dict(config.registry.settings,
-                             [('event_listeners', listener),
-                              ('event_listeners.redis.pool_size', '1')]):
+        settings = [('event_listeners', listener),
+                    ('event_listeners.redis.pool_size', '1')]
+        settings.extend(extra_settings.items())
+        with mock.patch.dict(config.registry.settings, settings):
             initialization.setup_listeners(config)
             config.commit()
             yield
@@ -189,6 +344,21 @@ class ListenerCalledTest(unittest.TestCase):
         last = json.loads(last.decode('utf8'))
         self.assertEqual(last['action'], ACTIONS.CREATE.value)
 
+    def test_events_are_pushed_at_once_if_asynchronous(self):
+        settings = {'event_listeners.redis.async': 'true',
+                    'event_listeners.redis.async_workers': '0'}
+        redis_mock = mock.patch('redis.StrictRedis.lpush')
+        with capture_dispatchers() as dispatchers:
+            with self.redis_listening(settings), redis_mock as mocked:
+                for i in range(3):
+                    event = ResourceChanged(ACTIONS.CREATE, 123456, [],
+                                            Request())
+                    self.config.registry.notify(event)
+                self.assertFalse(mocked.called)
+                dispatchers[0].flush()
+        listname, a, b, c = mocked.call_args[0]
+        self.assertEqual(listname, 'cliquet.events')
+
     def test_notification_is_broken(self):
         with self.redis_listening():
             # an event with a bad JSON should silently break and send nothing
@@ -212,9 +382,123 @@ class ListenerCalledTest(unittest.TestCase):
             self.assertFalse(self.has_redis_changed())
 
 
+class RedisStreamListenerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        prefix = 'event_listeners.stream.'
+        self.config.add_settings({prefix + 'url': 'redis://localhost:6379/0',
+                                  prefix + 'pool_size': 1,
+                                  prefix + 'stream': 'test.events',
+                                  prefix + 'maxlen': 5})
+        self.listener = redis_stream.load_from_config(self.config, prefix)
+        self.client = self.listener._client
+        self.stream = 'test.events.bucket'
+        self.client.delete(self.stream)
+        self.addCleanup(self.client.delete, self.stream)
+
+        self.consumer = redis_stream.Consumer(self.client, [self.stream],
+                                              group='workers', name='w1',
+                                              block_ms=10)
+        self.consumer.create_group(start='0')
+
+    def test_events_are_added_to_the_resource_stream(self):
+        event = ResourceChanged(ACTIONS.CREATE, 123456, [], Request())
+        self.listener(event)
+        self.assertEqual(self.client.execute_command('XLEN', self.stream), 1)
+
+    def test_events_are_sent_in_a_single_round_trip(self):
+        events = [ResourceChanged(ACTIONS.CREATE, i, [], Request())
+                  for i in range(3)]
+        with mock.patch.object(self.client, 'pipeline') as pipeline:
+            self.listener.call_many(events)
+        self.assertEqual(pipeline.call_count, 1)
+        pipe = pipeline.return_value
+        self.assertEqual(pipe.execute_command.call_count, 3)
+        self.assertEqual(pipe.execute.call_count, 1)
+
+    def test_streams_are_trimmed_approximately(self):
+        # Trimming happens by whole nodes of entries.
+        with mock.patch.object(self.client, 'pipeline') as pipeline:
+            self.listener(ResourceChanged(ACTIONS.CREATE, 1, [], Request()))
+        command = pipeline.return_value.execute_command.call_args[0]
+        self.assertEqual(command[:5],
+                         ('XADD', self.stream, 'MAXLEN', '~', 5))
+
+    def test_unserializable_events_are_ignored(self):
+        event = ResourceChanged(ACTIONS.CREATE, datetime.now(), [], Request())
+        self.listener(event)
+        self.assertEqual(self.client.execute_command('XLEN', self.stream), 0)
+
+    def test_redis_errors_are_ignored(self):
+        with mock.patch.object(self.client, 'pipeline') as pipeline:
+            pipeline.return_value.execute.side_effect = Exception('boom')
+            event = ResourceChanged(ACTIONS.CREATE, 123456, [], Request())
+            self.listener(event)
+        self.assertTrue(pipeline.return_value.execute.called)
+
+    def test_consumer_reads_the_events_payloads(self):
+        event = ResourceChanged(ACTIONS.CREATE, 123456, [], Request())
+        self.listener(event)
+        (stream, _, payload), = self.consumer.read()
+        self.assertEqual(stream, self.stream)
+        self.assertEqual(payload['timestamp'], 123456)
+
+    def test_consumer_group_can_be_created_twice(self):
+        self.consumer.create_group()
+
+    def test_consumer_group_creation_errors_are_raised(self):
+        self.client.set('test.events.string', 'abc')
+        self.addCleanup(self.client.delete, 'test.events.string')
+        consumer = redis_stream.Consumer(self.client, ['test.events.string'],
+                                         group='workers', name='w1')
+        self.assertRaises(redis.ResponseError, consumer.create_group)
+
+    def _read_reply(self, reply):
+        with mock.patch.object(self.client, 'execute_command',
+                               return_value=reply):
+            return self.consumer.read()
+
+    def test_consumer_skips_deleted_events(self):
+        reply = [[b'stream', [[b'1-0', None]]]]
+        self.assertEqual(self._read_reply(reply), [])
+
+    def test_consumer_supports_parsed_replies(self):
+        reply = [['stream', [('1-0', {'event': '{"timestamp": 1}'})]]]
+        self.assertEqual(self._read_reply(reply),
+                         [('stream', '1-0', {'timestamp': 1})])
+
+    def test_consumer_supports_streams_mappings_replies(self):
+        reply = {b'stream': [[b'1-0', [b'event', b'{"timestamp": 1}']]]}
+        self.assertEqual(self._read_reply(reply),
+                         [('stream', '1-0', {'timestamp': 1})])
+
+    def test_events_are_delivered_to_one_consumer_of_the_group(self):
+        other = redis_stream.Consumer(self.client, [self.stream],
+                                      group='workers', name='w2',
+                                      block_ms=10)
+        self.listener(ResourceChanged(ACTIONS.CREATE, 1, [], Request()))
+        self.assertEqual(len(self.consumer.read()), 1)
+        self.assertEqual(other.read(), [])
+
+    def test_unacknowledged_events_can_be_read_again(self):
+        self.listener(ResourceChanged(ACTIONS.CREATE, 1, [], Request()))
+        self.listener(ResourceChanged(ACTIONS.CREATE, 2, [], Request()))
+        (stream, first_id, _), _ = self.consumer.read()
+        self.consumer.ack(stream, first_id)
+        pending = self.consumer.read(pending=True)
+        self.assertEqual([p['timestamp'] for (_, _, p) in pending], [2])
+
+
 class ListenerBaseTest(unittest.TestCase):
 
     def test_not_implemented(self):
         # make sure we can't use the base listener
         listener = ListenerBase()
         self.assertRaises(NotImplementedError, listener, object())
+
+    def test_events_are_delivered_one_by_one_by_default(self):
+        listener = ListenerBase()
+        with mock.patch.object(ListenerBase, '__call__') as mocked:
+            listener.call_many([1, 2])
+        self.assertEqual(mocked.call_args_list, [mock.call(1), mock.call(2)])
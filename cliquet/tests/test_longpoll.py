@@ -0,0 +1,123 @@
+import mock
+import threading
+import time
+
+import redis
+from pyramid import testing
+
+from cliquet import initialization
+from cliquet import longpoll
+from cliquet import DEFAULT_SETTINGS
+
+from .support import unittest
+
+
+class NotifierTest(unittest.TestCase):
+    settings = {}
+
+    def setUp(self):
+        self.notifier = self.load_notifier()
+
+    def load_notifier(self):
+        config = testing.setUp(settings=DEFAULT_SETTINGS.copy())
+        config.add_settings(self.settings)
+        return longpoll.load_from_config(config)
+
+    def notify_later(self, notifier, key, delay=0.1):
+        timer = threading.Timer(delay, notifier.notify, args=(key,))
+        timer.start()
+        self.addCleanup(timer.join)
+
+    def test_generation_is_incremented_on_notify(self):
+        generation = self.notifier.generation('article')
+        self.notifier.notify('article')
+        self.assertTrue(self.wait_for(
+            lambda: self.notifier.generation('article') > generation))
+
+    def test_wait_returns_false_after_timeout(self):
+        generation = self.notifier.generation('article')
+        before = time.time()
+        self.assertFalse(self.notifier.wait('article', generation, 0.1))
+        self.assertGreaterEqual(time.time() - before, 0.1)
+
+    def test_wait_returns_true_when_notified(self):
+        generation = self.notifier.generation('article')
+        self.notify_later(self.notifier, 'article')
+        before = time.time()
+        self.assertTrue(self.notifier.wait('article', generation, 5))
+        self.assertLess(time.time() - before, 5)
+
+    def test_wait_returns_immediately_if_notified_meanwhile(self):
+        generation = self.notifier.generation('article')
+        self.notifier.notify('article')
+        self.assertTrue(self.notifier.wait('article', generation, 1))
+
+    def test_other_keys_do_not_wake_up(self):
+        generation = self.notifier.generation('article')
+        self.notify_later(self.notifier, 'comment')
+        self.assertFalse(self.notifier.wait('article', generation, 0.3))
+
+    def wait_for(self, condition):
+        for _ in range(100):
+            if condition():
+                return True
+            time.sleep(0.02)
+        return False
+
+
+class RedisNotifierTest(NotifierTest):
+    settings = {
+        'longpoll_notifier_url': 'redis://localhost:6379/0'
+    }
+
+    def setUp(self):
+        super(RedisNotifierTest, self).setUp()
+        self.other = self.load_notifier()
+
+    def test_other_processes_are_woken_up(self):
+        generation = self.other.generation('article')
+        self.notify_later(self.notifier, 'article')
+        self.assertTrue(self.other.wait('article', generation, 5))
+
+    def test_broadcast_errors_wake_up_current_process(self):
+        generation = self.notifier.generation('article')
+        with mock.patch.object(self.notifier.client, 'publish',
+                               side_effect=redis.RedisError):
+            self.notifier.notify('article')
+        self.assertTrue(self.notifier.wait('article', generation, 0))
+
+    def test_listener_subscribes_again_after_errors(self):
+        class Stop(Exception):
+            pass
+
+        client = mock.MagicMock()
+        pubsub = client.pubsub.return_value
+        pubsub.subscribe.side_effect = [redis.RedisError, Stop]
+        notifier = longpoll.Notifier(client=client, channel='channel')
+        subscribed = threading.Event()
+        with mock.patch('cliquet.longpoll.time.sleep') as sleep:
+            with mock.patch('cliquet.longpoll.logger') as logger:
+                self.assertRaises(Stop, notifier._listen, subscribed)
+        self.assertTrue(logger.error.called)
+        self.assertTrue(sleep.called)
+        self.assertEqual(pubsub.subscribe.call_count, 2)
+        self.assertEqual(pubsub.close.call_count, 2)
+        self.assertFalse(subscribed.is_set())
+
+
+class SetupTest(unittest.TestCase):
+
+    def setup_longpoll(self, settings):
+        config = testing.setUp(settings=DEFAULT_SETTINGS.copy())
+        config.add_settings(settings)
+        config.add_directive('add_api_capability', mock.MagicMock())
+        initialization.setup_longpoll(config)
+        return config.registry
+
+    def test_notifier_is_not_set_up_by_default(self):
+        registry = self.setup_longpoll({})
+        self.assertIsNone(registry.longpoll)
+
+    def test_notifier_is_set_up_if_enabled(self):
+        registry = self.setup_longpoll({'longpoll_max_wait_seconds': 30})
+        self.assertIsInstance(registry.longpoll, longpoll.Notifier)
@@ -5,9 +5,11 @@ from pyramid import testing
 
 from cliquet.utils import sqlalchemy
 from cliquet.storage import exceptions
+from cliquet.cache import memory as memory_cache
 from cliquet.permission import (PermissionBase, redis as redis_backend,
                                 memory as memory_backend,
                                 postgresql as postgresql_backend, heartbeat)
+from cliquet.permission.caching import CachedPermission
 
 from .support import unittest, skip_if_no_postgresql, DummyRequest, load_default_settings
 
@@ -76,6 +78,7 @@ class BaseTestPermission(object):
             (self.permission.object_permissions, ''),
             (self.permission.replace_object_permissions, '', {'write': []}),
             (self.permission.delete_object_permissions, ''),
+            (self.permission.apply_many, [('delete', '', None)]),
             (self.permission.principals_accessible_objects, [], ''),
             (self.permission.object_permission_authorized_principals, '', ''),
         ]
@@ -432,6 +435,78 @@ class BaseTestPermission(object):
         object_permissions = self.permission.object_permissions('/url/a/id/1')
         self.assertEqual(len(object_permissions), 0)
 
+    def test_apply_many_replaces_adds_and_deletes_permissions(self):
+        self.permission.add_principal_to_ace('/url/a', 'read', 'user1')
+        self.permission.add_principal_to_ace('/url/a', 'write', 'user1')
+        self.permission.add_principal_to_ace('/url/b', 'write', 'user1')
+        self.permission.apply_many([
+            ('replace', '/url/a', {'read': ['user2'], 'obj:del': []}),
+            ('add', '/url/a', {'write': ['user3']}),
+            ('delete', '/url/b', None),
+            ('add', '/url/c', {'read': ['user1', 'user2']}),
+        ])
+        self.assertDictEqual(self.permission.object_permissions('/url/a'), {
+            'read': {'user2'},
+            'write': {'user1', 'user3'}
+        })
+        self.assertEqual(len(self.permission.object_permissions('/url/b')),
+                         0)
+        self.assertDictEqual(self.permission.object_permissions('/url/c'), {
+            'read': {'user1', 'user2'}
+        })
+        object_ids = self.permission.principals_accessible_objects(['user1'],
+                                                                   'write')
+        self.assertEqual(object_ids, {'/url/a'})
+
+    def test_apply_many_returns_resulting_permissions(self):
+        self.permission.add_principal_to_ace('/url/a', 'read', 'user1')
+        self.permission.add_principal_to_ace('/url/b', 'read', 'user1')
+        result = self.permission.apply_many([
+            ('add', '/url/a', {'write': ['user2']}),
+            ('replace', '/url/a', {'read': []}),
+            ('delete', '/url/b', None),
+        ])
+        self.assertDictEqual(result, {
+            '/url/a': {'write': {'user2'}},
+            '/url/b': {}
+        })
+
+    def test_apply_many_operations_are_applied_in_order(self):
+        self.permission.add_principal_to_ace('/url/a', 'read', 'user1')
+        result = self.permission.apply_many([
+            ('add', '/url/a', {'read': ['user2']}),
+            ('delete', '/url/a', None),
+            ('replace', '/url/a', {'write': ['user3']}),
+            ('add', '/url/a', {'write': ['user1', 'user3']}),
+        ])
+        self.assertDictEqual(result, {'/url/a': {'write': {'user1', 'user3'}}})
+        self.assertDictEqual(self.permission.object_permissions('/url/a'),
+                             {'write': {'user1', 'user3'}})
+
+    def test_default_apply_many_relies_on_other_methods(self):
+        self.permission.add_principal_to_ace('/url/a', 'read', 'user1')
+        result = PermissionBase.apply_many(self.permission, [
+            ('delete', '/url/a', None),
+            ('replace', '/url/a', {'write': ['user2']}),
+            ('add', '/url/a', {'write': ['user3']}),
+        ])
+        self.assertDictEqual(result, {'/url/a': {'write': {'user2', 'user3'}}})
+
+    def test_apply_many_supports_iterators(self):
+        changes = [('add', '/url/a', {'write': ['user1']})]
+        for apply_many in (self.permission.apply_many,
+                           lambda c: PermissionBase.apply_many(
+                               self.permission, c)):
+            result = apply_many(iter(changes))
+            self.assertDictEqual(result, {'/url/a': {'write': {'user1'}}})
+
+    def test_apply_many_supports_empty_list(self):
+        self.assertEqual(self.permission.apply_many([]), {})
+
+    def test_apply_many_rejects_unknown_operations(self):
+        self.assertRaises(ValueError, self.permission.apply_many,
+                          [('remove', '/url/a', {})])
+
     def test_delete_object_permissions_remove_all_given_objects_acls(self):
         self.permission.add_principal_to_ace('/url/a/id/1', 'write', 'user1')
         self.permission.add_principal_to_ace('/url/a/id/1', 'write', 'user2')
@@ -466,6 +541,75 @@ class MemoryPermissionTest(BaseTestPermission, unittest.TestCase):
     def test_ping_logs_error_if_unavailable(self):
         pass
 
+    def test_indexes_are_cleaned_when_objects_are_deleted(self):
+        self.permission.add_principal_to_ace('/url/a', 'read', 'user1')
+        self.permission.replace_object_permissions('/url/b', {
+            'write': ['user1']})
+        self.permission.delete_object_permissions('/url/a', '/url/b')
+        self.assertEqual(self.permission._aces, {})
+        self.assertEqual(self.permission._principal_objects, {})
+
+    def test_indexes_are_cleaned_when_aces_are_removed(self):
+        self.permission.add_principal_to_ace('/url/a', 'read', 'user1')
+        self.permission.remove_principal_from_ace('/url/a', 'read', 'user1')
+        self.assertEqual(self.permission._aces, {})
+        self.assertEqual(self.permission._principal_objects, {})
+
+    def test_accessible_objects_patterns_are_anchored(self):
+        self.permission.add_principal_to_ace('/url/a', 'read', 'user1')
+        self.permission.add_principal_to_ace('/url/a/id/1', 'read', 'user1')
+        self.permission.add_principal_to_ace('/url/a.b', 'read', 'user1')
+        object_ids = self.permission.principals_accessible_objects(
+            ['user1'], 'read', object_id_match='/url/a')
+        self.assertEqual(object_ids, {'/url/a'})
+        object_ids = self.permission.principals_accessible_objects(
+            ['user1'], 'read', object_id_match='/url/a.*')
+        self.assertEqual(object_ids, {'/url/a.b'})
+
+    def test_principals_without_permissions_are_skipped(self):
+        self.permission.add_principal_to_ace('/url/a', 'read', 'user1')
+        object_ids = self.permission.principals_accessible_objects(
+            ['user1', 'user2'], 'read', object_id_match='/url/*')
+        self.assertEqual(object_ids, {'/url/a'})
+        object_ids = self.permission.principals_accessible_objects(
+            ['user1'], 'read', object_id_match='/url/b')
+        self.assertEqual(object_ids, set())
+
+
+class PrefixTreeTest(unittest.TestCase):
+    def setUp(self):
+        self.tree = memory_backend._PrefixTree()
+        for object_id in ('/buckets/a', '/buckets/a/collections/c',
+                          '/buckets/ab', '/buckets/b', 'id1'):
+            self.tree.add(object_id)
+
+    def test_objects_can_be_looked_up_by_prefix(self):
+        self.assertEqual(set(self.tree.startswith('/buckets/a')),
+                         {'/buckets/a', '/buckets/a/collections/c',
+                          '/buckets/ab'})
+        self.assertEqual(set(self.tree.startswith('/buckets/a/')),
+                         {'/buckets/a/collections/c'})
+        self.assertEqual(set(self.tree.startswith('/unknown/')), set())
+
+    def test_empty_prefix_returns_every_object(self):
+        self.assertEqual(len(list(self.tree.startswith(''))), 5)
+
+    def test_size_is_maintained(self):
+        self.assertEqual(len(self.tree), 5)
+        self.tree.add('id1')
+        self.tree.discard('unknown')
+        self.tree.discard('/buckets')
+        self.assertEqual(len(self.tree), 5)
+        self.tree.discard('id1')
+        self.assertEqual(len(self.tree), 4)
+
+    def test_empty_branches_are_pruned(self):
+        self.tree.discard('/buckets/a/collections/c')
+        self.assertNotIn('collections', self.tree._root['']['buckets']['a'])
+        for object_id in ('/buckets/a', '/buckets/ab', '/buckets/b', 'id1'):
+            self.tree.discard(object_id)
+        self.assertEqual(self.tree._root, {})
+
 
 class RedisPermissionTest(BaseTestPermission, unittest.TestCase):
     backend = redis_backend
@@ -494,6 +638,86 @@ class RedisPermissionTest(BaseTestPermission, unittest.TestCase):
             backend.settings,
             {'host': 'db.loc', 'password': 'pass', 'db': 5, 'port': 1234})
 
+    def modified_concurrently(self, write):
+        object_acls = self.permission._object_acls
+        writes = [write]
+
+        def concurrent_object_acls(*args, **kwargs):
+            acls = object_acls(*args, **kwargs)
+            if writes:
+                writes.pop()()
+            return acls
+        return mock.patch.object(self.permission, '_object_acls',
+                                 side_effect=concurrent_object_acls)
+
+    def test_replace_is_retried_if_acls_are_modified_concurrently(self):
+        self.permission.add_principal_to_ace('/url', 'read', 'user1')
+        with self.modified_concurrently(
+                lambda: self.permission.add_principal_to_ace(
+                    '/url', 'read', 'user2')) as m:
+            self.permission.replace_object_permissions('/url',
+                                                       {'read': ['user3']})
+        self.assertEqual(m.call_count, 2)
+        self.assertEqual(self.permission.principals_accessible_objects(
+            ['user2'], 'read'), set())
+        self.assertEqual(self.permission.object_permissions('/url'),
+                         {'read': {'user3'}})
+
+    def test_changes_are_retried_if_acls_are_modified_concurrently(self):
+        self.permission.add_principal_to_ace('/url', 'read', 'user1')
+        with self.modified_concurrently(
+                lambda: self.permission.add_principal_to_ace(
+                    '/url', 'write', 'user2')) as m:
+            self.permission.apply_many([('delete', '/url', None)])
+        self.assertEqual(m.call_count, 2)
+        self.assertEqual(self.permission.principals_accessible_objects(
+            ['user2'], 'write'), set())
+
+    def test_keyspace_is_not_scanned_to_lookup_permissions(self):
+        self.permission.add_principal_to_ace('/url/a', 'read', 'user1')
+        with mock.patch.object(self.permission._client, 'scan_iter') as m:
+            self.permission.principals_accessible_objects(['user1'], 'read')
+            self.permission.object_permissions('/url/a')
+            self.permission.delete_object_permissions('/url/a')
+        self.assertFalse(m.called)
+
+    def test_reverse_indexes_are_cleaned_when_objects_are_deleted(self):
+        self.permission.add_principal_to_ace('/url/a', 'read', 'user1')
+        self.permission.add_principal_to_ace('/url/a', 'write', 'user2')
+        self.permission.delete_object_permissions('/url/a')
+        self.assertEqual(self.permission._client.keys(), [])
+
+    def test_reverse_indexes_are_cleaned_when_aces_are_removed(self):
+        self.permission.add_principal_to_ace('/url/a', 'read', 'user1')
+        self.permission.remove_principal_from_ace('/url/a', 'read', 'user1')
+        self.assertEqual(self.permission._client.keys(), [])
+
+    def test_reverse_indexes_are_updated_when_permissions_are_replaced(self):
+        self.permission.add_principal_to_ace('/url/a', 'read', 'user1')
+        self.permission.add_principal_to_ace('/url/a', 'write', 'user1')
+        self.permission.replace_object_permissions('/url/a', {
+            'read': ['user2'],
+            'write': []
+        })
+        self.assertEqual(
+            self.permission.principals_accessible_objects(['user1'], 'read'),
+            set())
+        self.assertEqual(
+            self.permission.principals_accessible_objects(['user2'], 'read'),
+            {'/url/a'})
+        self.assertEqual(self.permission.object_permissions('/url/a'),
+                         {'read': {'user2'}})
+
+    def test_initialize_schema_builds_indexes_of_existing_aces(self):
+        self.permission._client.sadd('permission:/url/a:read', 'fxa:user')
+        self.permission.initialize_schema()
+        self.assertEqual(
+            self.permission.principals_accessible_objects(['fxa:user'],
+                                                          'read'),
+            {'/url/a'})
+        self.assertEqual(self.permission.object_permissions('/url/a'),
+                         {'read': {'fxa:user'}})
+
 
 @skip_if_no_postgresql
 class PostgreSQLPermissionTest(BaseTestPermission, unittest.TestCase):
@@ -506,3 +730,284 @@ class PostgreSQLPermissionTest(BaseTestPermission, unittest.TestCase):
             self.permission.client,
             'session_factory',
             side_effect=sqlalchemy.exc.SQLAlchemyError)]
+
+    def _explain_accessible_objects(self, *args, **kwargs):
+        query, placeholders = self.permission._accessible_objects_query(
+            *args, **kwargs)
+        with self.permission.client.connect() as conn:
+            # Tables of test suites are too small for index to be preferred.
+            conn.execute('SET LOCAL enable_seqscan = off;')
+            result = conn.execute('EXPLAIN ' + query, placeholders)
+            plan = '\n'.join([r[0] for r in result.fetchall()])
+        return plan
+
+    def test_accessible_objects_lookup_uses_prefix_index(self):
+        plan = self._explain_accessible_objects(
+            ['user1', 'group'], 'read',
+            object_id_match='/url/a/id/*',
+            get_bound_permissions=lambda o, p: [('/url/a/id/*', 'read'),
+                                                ('/url/a/id/*', 'write')])
+        self.assertNotIn('Seq Scan', plan)
+        # Prefix is used as index range (``~>=~`` unless C collation).
+        self.assertRegexpMatches(plan, "Index Cond: .*object_id "
+                                       "(~>=~|>=) '/url/a/id/'")
+
+    def test_accessible_objects_patterns_are_escaped(self):
+        self.permission.add_principal_to_ace('/url/a_1', 'read', 'user1')
+        self.permission.add_principal_to_ace('/url/ab1', 'read', 'user1')
+        self.permission.add_principal_to_ace("/url/'%", 'read', 'user1')
+        object_ids = self.permission.principals_accessible_objects(
+            ['user1'], 'read', object_id_match='/url/a_*')
+        self.assertEqual(object_ids, {'/url/a_1'})
+        object_ids = self.permission.principals_accessible_objects(
+            ['user1'], 'read', object_id_match="/url/'%")
+        self.assertEqual(object_ids, {"/url/'%"})
+
+    def _check_permission_queries(self, *args, **kwargs):
+        from sqlalchemy.orm import Session
+        with mock.patch.object(Session, 'execute', autospec=True,
+                               side_effect=Session.execute) as mocked:
+            self.permission.check_permission(*args, **kwargs)
+        return [call[0][1:] for call in mocked.call_args_list]
+
+    def test_check_permission_query_does_not_depend_on_values(self):
+        queries = self._check_permission_queries(
+            '/url/a', 'read', {'user1'})
+        other = self._check_permission_queries(
+            '/url/b', 'write', {'user1', 'user2', 'group'},
+            get_bound_permissions=lambda o, p: [('/url/b', 'write'),
+                                                ('/url', 'write')])
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(str(queries[0][0]), str(other[0][0]))
+
+    def test_check_permission_lookup_uses_covering_index(self):
+        [(query, placeholders)] = self._check_permission_queries(
+            '/url/a', 'read', {'user1'})
+        with self.permission.client.connect() as conn:
+            conn.execute('SET LOCAL enable_seqscan = off;')
+            result = conn.execute('EXPLAIN ' + str(query), placeholders)
+            plan = '\n'.join([r[0] for r in result.fetchall()])
+        self.assertIn('Index Only Scan', plan)
+        self.assertNotIn('Seq Scan on access_control_entries', plan)
+
+    def test_accessible_objects_without_principals(self):
+        self.permission.add_principal_to_ace('/url/a', 'read', 'user1')
+        object_ids = self.permission.principals_accessible_objects([], 'read')
+        self.assertEqual(object_ids, set())
+
+
+class CachedMemoryPermissionTest(MemoryPermissionTest):
+    def setUp(self):
+        super(CachedMemoryPermissionTest, self).setUp()
+        registry = mock.MagicMock()
+        registry.cache = memory_cache.Cache(cache_prefix='')
+        self.permission = CachedPermission(self.permission,
+                                           registry=registry,
+                                           ttl=60)
+
+
+class BaseCachedPermissionTest(object):
+    ttl = None
+
+    def setUp(self):
+        self.backend = memory_backend.Permission()
+        self.cache = memory_cache.Cache(cache_prefix='')
+        self.registry = mock.MagicMock(cache=self.cache)
+        self.permission = CachedPermission(self.backend,
+                                           registry=self.registry,
+                                           ttl=self.ttl)
+        self.request = DummyRequest()
+        self.request.bound_data = {}
+        patch = mock.patch('cliquet.permission.caching.get_current_request',
+                           return_value=self.request)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_wrapped_backend_attributes_are_exposed(self):
+        self.assertEqual(self.permission._aces, self.backend._aces)
+
+    def test_missing_backend_does_not_recurse(self):
+        # e.g. while being copied or unpickled.
+        permission = CachedPermission.__new__(CachedPermission)
+        self.assertRaises(AttributeError, getattr, permission, '_aces')
+
+    def test_memoized_values_are_shared_through_bound_data(self):
+        self.permission.user_principals('fxa:user')
+        self.assertIn('permission_cache', self.request.bound_data)
+
+    def test_check_permission_is_invalidated_on_write(self):
+        self.assertFalse(self.permission.check_permission(
+            '/url', 'read', {'fxa:user'}))
+        self.permission.add_principal_to_ace('/url', 'read', 'fxa:user')
+        self.assertTrue(self.permission.check_permission(
+            '/url', 'read', {'fxa:user'}))
+        self.permission.replace_object_permissions('/url', {'read': []})
+        self.assertFalse(self.permission.check_permission(
+            '/url', 'read', {'fxa:user'}))
+
+    def test_check_permission_memoization_depends_on_bound_permissions(self):
+        self.backend.add_principal_to_ace('/parent', 'write', 'fxa:user')
+
+        def get_bound_permissions(object_id, permission):
+            return [(object_id, permission), ('/parent', 'write')]
+
+        self.assertFalse(self.permission.check_permission(
+            '/url', 'read', {'fxa:user'}))
+        self.assertTrue(self.permission.check_permission(
+            '/url', 'read', {'fxa:user'},
+            get_bound_permissions=get_bound_permissions))
+
+    def test_user_principals_are_invalidated_on_write(self):
+        self.assertEqual(self.permission.user_principals('fxa:user'), set())
+        self.permission.add_user_principal('fxa:user', 'group:admins')
+        self.assertEqual(self.permission.user_principals('fxa:user'),
+                         {'group:admins'})
+
+    def test_object_permissions_returned_can_be_modified(self):
+        self.permission.add_principal_to_ace('/url', 'read', 'fxa:user')
+        permissions = self.permission.object_permissions('/url')
+        permissions['read'].add('fxa:other')
+        self.assertEqual(self.permission.object_permissions('/url'),
+                         {'read': {'fxa:user'}})
+
+    def test_object_permissions_can_be_filtered(self):
+        self.permission.add_principal_to_ace('/url', 'read', 'fxa:user')
+        self.permission.add_principal_to_ace('/url', 'write', 'fxa:user')
+        permissions = self.permission.object_permissions('/url', ['write'])
+        self.assertEqual(permissions, {'write': {'fxa:user'}})
+
+
+class CachedPermissionTest(BaseCachedPermissionTest,
+                           unittest.TestCase):
+    def test_check_permission_is_memoized_during_request(self):
+        self.backend.add_principal_to_ace('/url', 'read', 'fxa:user')
+        with mock.patch.object(self.backend, 'check_permission',
+                               wraps=self.backend.check_permission) as m:
+            for i in range(3):
+                allowed = self.permission.check_permission(
+                    '/url', 'read', {'fxa:user'})
+                self.assertTrue(allowed)
+        self.assertEqual(m.call_count, 1)
+
+    def test_memoized_values_are_not_shared_among_requests(self):
+        self.permission.check_permission('/url', 'read', {'fxa:user'})
+        self.request.bound_data = {}
+        self.backend.add_principal_to_ace('/url', 'read', 'fxa:user')
+        allowed = self.permission.check_permission('/url', 'read',
+                                                   {'fxa:user'})
+        self.assertTrue(allowed)
+
+    def test_nothing_is_memoized_outside_requests(self):
+        self.request.bound_data = None
+        self.permission.check_permission('/url', 'read', {'fxa:user'})
+        self.backend.add_principal_to_ace('/url', 'read', 'fxa:user')
+        self.assertTrue(self.permission.check_permission(
+            '/url', 'read', {'fxa:user'}))
+
+    def test_acls_are_not_stored_in_cache_backend_by_default(self):
+        self.permission.add_principal_to_ace('/url', 'read', 'fxa:user')
+        self.permission.check_permission('/url', 'read', {'fxa:user'})
+        self.assertIsNone(self.cache.get('permission_acl:/url'))
+
+
+class CachedPermissionAcrossRequestsTest(BaseCachedPermissionTest,
+                                         unittest.TestCase):
+    ttl = 60
+
+    def test_acls_are_stored_in_cache_backend(self):
+        self.permission.add_principal_to_ace('/url', 'read', 'fxa:user')
+        self.permission.check_permission('/url', 'read', {'fxa:user'})
+        self.assertEqual(self.cache.get('permission_acl:/url'),
+                         {'read': ['fxa:user']})
+
+    def test_check_permission_is_memoized_during_request(self):
+        self.backend.add_principal_to_ace('/url', 'read', 'fxa:user')
+        with mock.patch.object(self.backend, 'object_permissions',
+                               wraps=self.backend.object_permissions) as m:
+            for i in range(3):
+                allowed = self.permission.check_permission(
+                    '/url', 'read', {'fxa:user'})
+                self.assertTrue(allowed)
+        self.assertEqual(m.call_count, 1)
+
+    def test_memoized_values_are_shared_among_requests(self):
+        self.permission.check_permission('/url', 'read', {'fxa:user'})
+        self.request.bound_data = {}
+        # Written behind the cache: not seen until the entry expires.
+        self.backend.add_principal_to_ace('/url', 'read', 'fxa:user')
+        allowed = self.permission.check_permission('/url', 'read',
+                                                   {'fxa:user'})
+        self.assertFalse(allowed)
+
+    def test_acls_are_cached_outside_requests(self):
+        self.request.bound_data = None
+        self.permission.add_principal_to_ace('/url', 'read', 'fxa:user')
+        self.assertTrue(self.permission.check_permission(
+            '/url', 'read', {'fxa:user'}))
+        self.assertEqual(self.cache.get('permission_acl:/url'),
+                         {'read': ['fxa:user']})
+
+    def test_cached_acls_are_used_by_next_requests(self):
+        self.permission.add_principal_to_ace('/url', 'read', 'fxa:user')
+        self.permission.object_permissions('/url')
+        self.request.bound_data = {}
+        with mock.patch.object(self.backend, 'object_permissions') as m:
+            allowed = self.permission.check_permission('/url', 'read',
+                                                       {'fxa:user'})
+        self.assertTrue(allowed)
+        self.assertFalse(m.called)
+
+    def test_cached_acls_are_purged_on_write(self):
+        self.permission.object_permissions('/url')
+        self.permission.add_principal_to_ace('/url', 'read', 'fxa:user')
+        self.assertIsNone(self.cache.get('permission_acl:/url'))
+        self.permission.object_permissions('/url')
+        self.permission.delete_object_permissions('/url')
+        self.assertIsNone(self.cache.get('permission_acl:/url'))
+
+    def test_user_principals_are_stored_in_cache_backend(self):
+        self.permission.add_user_principal('fxa:user', 'group:admins')
+        self.permission.user_principals('fxa:user')
+        self.request.bound_data = {}
+        with mock.patch.object(self.backend, 'user_principals') as m:
+            principals = self.permission.user_principals('fxa:user')
+        self.assertEqual(principals, {'group:admins'})
+        self.assertFalse(m.called)
+
+    def test_cached_user_principals_are_purged_on_write(self):
+        self.permission.user_principals('fxa:user')
+        self.permission.add_user_principal('fxa:user', 'group:admins')
+        self.request.bound_data = {}
+        self.assertEqual(self.permission.user_principals('fxa:user'),
+                         {'group:admins'})
+        self.permission.remove_user_principal('fxa:user', 'group:admins')
+        self.request.bound_data = {}
+        self.assertEqual(self.permission.user_principals('fxa:user'), set())
+
+    def test_cached_user_principals_are_outdated_on_principal_removal(self):
+        self.permission.add_user_principal('fxa:user1', 'group:admins')
+        self.permission.add_user_principal('fxa:user2', 'group:admins')
+        self.permission.user_principals('fxa:user1')
+        self.permission.user_principals('fxa:user2')
+        self.permission.remove_principal('group:admins')
+        self.request.bound_data = {}
+        self.assertEqual(self.permission.user_principals('fxa:user1'), set())
+        self.assertEqual(self.permission.user_principals('fxa:user2'), set())
+
+    def test_cached_user_principals_are_outdated_if_version_is_lost(self):
+        self.permission.add_user_principal('fxa:user', 'group:admins')
+        self.permission.user_principals('fxa:user')
+        self.cache.delete('permission_principals_version')
+        self.request.bound_data = {}
+        with mock.patch.object(self.backend, 'user_principals',
+                               return_value=set()) as m:
+            self.permission.user_principals('fxa:user')
+        self.assertTrue(m.called)
+
+    def test_cached_acls_are_purged_again_after_commit(self):
+        with mock.patch('cliquet.permission.caching.transaction') as tm:
+            self.permission.add_principal_to_ace('/url', 'read', 'fxa:user')
+        hook = tm.get.return_value.addAfterCommitHook.call_args[0][0]
+        self.cache.set('permission_acl:/url', {})
+        hook(True)
+        self.assertIsNone(self.cache.get('permission_acl:/url'))
@@ -9,11 +9,12 @@ class InitSchemaTest(unittest.TestCase):
     def setUp(self):
         self.registry = mock.MagicMock()
 
-    def run_command(self, command):
+    def run_command(self, command, *args):
         with mock.patch('cliquet.scripts.cliquet.bootstrap') as mocked:
             mocked.return_value = {'registry': self.registry}
             with mock.patch('cliquet.scripts.cliquet.sys') as sys_mocked:
                 sys_mocked.argv = ['prog', '--ini', 'foo.ini', command]
+                sys_mocked.argv.extend(args)
                 cliquet_script.main()
 
     def test_deprecated_init_command_is_supported(self):
@@ -36,3 +37,67 @@ class InitSchemaTest(unittest.TestCase):
                                    'while in readonly mode.')
             mocked.assert_any_call('Cannot migrate the permission backend '
                                    'while in readonly mode.')
+
+    def test_purge_cache_deletes_expired_values(self):
+        self.registry.cache.purge_expired.return_value = 3
+        self.run_command('purge-cache')
+        self.registry.cache.purge_expired.assert_called_with()
+
+    def test_relay_events_relays_until_outbox_is_empty(self):
+        self.registry.settings = {'event_outbox_relay_batch_size': 10,
+                                  'event_outbox_relay_interval_seconds': 1,
+                                  'event_outbox_relay_max_attempts': 5}
+        with mock.patch('cliquet.scripts.cliquet.relay_outbox',
+                        side_effect=[10, 10, 3]) as mocked:
+            self.run_command('relay-events', '--once')
+        self.assertEqual(mocked.call_count, 3)
+        mocked.assert_called_with(self.registry, limit=10, max_attempts=5)
+
+    def test_relay_events_attempts_can_be_unlimited(self):
+        self.registry.settings = {'event_outbox_relay_batch_size': 10,
+                                  'event_outbox_relay_interval_seconds': 1,
+                                  'event_outbox_relay_max_attempts': 0}
+        with mock.patch('cliquet.scripts.cliquet.relay_outbox',
+                        return_value=0) as mocked:
+            self.run_command('relay-events', '--once')
+        mocked.assert_called_with(self.registry, limit=10, max_attempts=None)
+
+    def test_relay_events_waits_between_relays(self):
+        self.registry.settings = {'event_outbox_relay_batch_size': 10,
+                                  'event_outbox_relay_interval_seconds': 2,
+                                  'event_outbox_relay_max_attempts': 5}
+        patch_sleep = mock.patch('cliquet.scripts.cliquet.time.sleep',
+                                 side_effect=[None, KeyboardInterrupt])
+        with mock.patch('cliquet.scripts.cliquet.relay_outbox',
+                        return_value=0) as mocked:
+            with patch_sleep as sleep:
+                self.assertRaises(KeyboardInterrupt,
+                                  self.run_command, 'relay-events')
+        self.assertEqual(mocked.call_count, 2)
+        sleep.assert_called_with(2.0)
+
+    def test_relay_events_backs_off_on_errors(self):
+        self.registry.settings = {'event_outbox_relay_batch_size': 10,
+                                  'event_outbox_relay_interval_seconds': 2,
+                                  'event_outbox_relay_max_attempts': 5}
+        patch_sleep = mock.patch('cliquet.scripts.cliquet.time.sleep',
+                                 side_effect=[None] * 6 + [KeyboardInterrupt])
+        errors = [ValueError] * 6 + [0]
+        with mock.patch('cliquet.scripts.cliquet.relay_outbox',
+                        side_effect=errors):
+            with mock.patch('cliquet.scripts.cliquet.logger') as logger:
+                with patch_sleep as sleep:
+                    self.assertRaises(KeyboardInterrupt,
+                                      self.run_command, 'relay-events')
+        self.assertEqual(logger.error.call_count, 6)
+        delays = [c[0][0] for c in sleep.call_args_list]
+        self.assertEqual(delays, [4.0, 8.0, 16.0, 32.0, 60, 60, 2.0])
+
+    def test_relay_events_errors_are_raised_once(self):
+        self.registry.settings = {'event_outbox_relay_batch_size': 10,
+                                  'event_outbox_relay_interval_seconds': 2,
+                                  'event_outbox_relay_max_attempts': 5}
+        with mock.patch('cliquet.scripts.cliquet.relay_outbox',
+                        side_effect=ValueError):
+            self.assertRaises(ValueError, self.run_command, 'relay-events',
+                              '--once')
@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
+import json
 import time
 
 import mock
 import redis
+import transaction
 from pyramid import testing
 
 from cliquet.utils import sqlalchemy
@@ -13,6 +15,9 @@ from cliquet.storage import (
     Sort, StorageBase, heartbeat
 )
 
+from cliquet.storage.caching import CachedTimestampStorage
+from cliquet.cache import memory as memory_cache
+
 from .support import (unittest, ThreadMixin, DummyRequest, load_default_settings,
                       skip_if_travis, skip_if_no_postgresql)
 
@@ -56,6 +61,26 @@ class GeneratorTest(unittest.TestCase):
         invalid_uuid4 = '00000000-0000-4000-e000-000000000000'
         self.assertTrue(generator.match(invalid_uuid4))
 
+    def test_uuid7_generator_pattern_accepts_former_uuid4(self):
+        generator = generators.UUID7()
+        self.assertTrue(generator.match(generator()))
+        self.assertTrue(generator.match(RECORD_ID))
+
+    def test_uuid7_generator_sets_version_and_variant(self):
+        record_id = generators.UUID7()()
+        self.assertEqual(record_id[14], '7')
+        self.assertIn(record_id[19], '89ab')
+
+    def test_uuid7_generator_ids_are_ordered_in_time(self):
+        generator = generators.UUID7()
+        with mock.patch('cliquet.storage.generators.utils.msec_time',
+                        return_value=1463500000000):
+            before = generator()
+        with mock.patch('cliquet.storage.generators.utils.msec_time',
+                        return_value=1463500000001):
+            after = generator()
+        self.assertLess(before, after)
+
 
 class StorageBaseTest(unittest.TestCase):
     def setUp(self):
@@ -73,6 +98,9 @@ class StorageBaseTest(unittest.TestCase):
             (self.storage.delete_all, '', ''),
             (self.storage.purge_deleted, '', ''),
             (self.storage.get_all, '', ''),
+            (self.storage.get_changes, ''),
+            (self.storage.outbox_add, []),
+            (self.storage.outbox_relay, lambda entries: None),
         ]
         for call in calls:
             self.assertRaises(NotImplementedError, *call)
@@ -1082,6 +1110,85 @@ class ParentRecordAccessTest(object):
         self.assertNotIn("another", not_updated)
 
 
+class ChangesTest(object):
+    def setUp(self):
+        super(ChangesTest, self).setUp()
+        self.changes_kw = {'parent_id': self.storage_kw['parent_id']}
+
+    def test_changes_are_logged_chronologically(self):
+        created = self.create_record()
+        record_id = created['id']
+        timestamps = [created['last_modified']]
+        updated = self.storage.update(object_id=record_id,
+                                      record={'foo': 'baz'},
+                                      **self.storage_kw)
+        timestamps.append(updated['last_modified'])
+        deleted = self.storage.delete(object_id=record_id,
+                                      **self.storage_kw)
+        timestamps.append(deleted['last_modified'])
+        changes = self.storage.get_changes(**self.changes_kw)
+        self.assertEqual([c['action'] for c in changes],
+                         ['create', 'update', 'delete'])
+        self.assertEqual([c['last_modified'] for c in changes], timestamps)
+        self.assertEqual(changes[0]['id'], record_id)
+        self.assertEqual(changes[0]['collection_id'], 'test')
+
+    def test_records_created_on_update_are_logged_as_created(self):
+        self.storage.update(object_id='abc', record={},
+                            **self.storage_kw)
+        change, = self.storage.get_changes(**self.changes_kw)
+        self.assertEqual(change['action'], 'create')
+
+    def test_changes_of_every_collection_of_parent_are_returned(self):
+        self.create_record()
+        kw = dict(self.storage_kw, collection_id='other')
+        self.storage.create(record={}, **kw)
+        kw = dict(self.storage_kw, parent_id=self.other_parent_id)
+        self.storage.create(record={}, **kw)
+        changes = self.storage.get_changes(**self.changes_kw)
+        self.assertEqual(sorted([c['collection_id'] for c in changes]),
+                         ['other', 'test'])
+
+    def test_changes_can_be_filtered_by_timestamp(self):
+        first = self.create_record()
+        second = self.create_record()
+        changes = self.storage.get_changes(since=first['last_modified'],
+                                           **self.changes_kw)
+        self.assertEqual([c['id'] for c in changes], [second['id']])
+
+    def test_changes_can_be_paginated(self):
+        # Same timestamps in different collections.
+        for collection_id in ('c', 'b', 'a'):
+            kw = dict(self.storage_kw, collection_id=collection_id)
+            self.storage.create(record={'last_modified': 42}, **kw)
+        self.create_record({'last_modified': 41})
+
+        first = self.storage.get_changes(limit=2, **self.changes_kw)
+        self.assertEqual([(c['last_modified'], c['collection_id'])
+                          for c in first], [(41, 'test'), (42, 'a')])
+        last = first[-1]
+        after = (last['last_modified'], last['collection_id'], last['id'])
+        second = self.storage.get_changes(limit=2, after=after,
+                                          **self.changes_kw)
+        self.assertEqual([c['collection_id'] for c in second], ['b', 'c'])
+
+    def test_changes_are_purged_with_tombstones(self):
+        self.create_record()
+        kw = dict(self.storage_kw, collection_id='other')
+        self.storage.create(record={}, **kw)
+        self.storage.purge_deleted(**self.storage_kw)
+        change, = self.storage.get_changes(**self.changes_kw)
+        self.assertEqual(change['collection_id'], 'other')
+
+    def test_changes_are_purged_up_to_tombstones_timestamp(self):
+        self.create_record()
+        newer = self.create_record()
+        self.storage.purge_deleted(before=newer['last_modified'],
+                                   **self.storage_kw)
+        changes = self.storage.get_changes(**self.changes_kw)
+        self.assertEqual([c['id'] for c in changes], [newer['id']])
+
+
 class StorageTest(ThreadMixin,
                   FieldsUnicityTest,
                   TimestampsTest,
@@ -1092,7 +1199,7 @@ class StorageTest(ThreadMixin,
     pass
 
 
-class MemoryStorageTest(StorageTest, unittest.TestCase):
+class MemoryStorageTest(ChangesTest, StorageTest, unittest.TestCase):
     backend = memory
 
     def setUp(self):
@@ -1118,6 +1225,170 @@ class MemoryStorageTest(StorageTest, unittest.TestCase):
         pass
 
 
+class CachedTimestampMemoryStorageTest(MemoryStorageTest):
+    def setUp(self):
+        super(CachedTimestampMemoryStorageTest, self).setUp()
+        registry = mock.MagicMock(cache=memory_cache.Cache(cache_prefix=''))
+        self.storage = CachedTimestampStorage(self.storage,
+                                              registry=registry,
+                                              ttl=60)
+
+
+class CachedTimestampStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = memory.Storage()
+        self.cache = memory_cache.Cache(cache_prefix='')
+        self.registry = mock.MagicMock(cache=self.cache,
+                                       settings={'transaction_per_request':
+                                                 True})
+        self.storage = CachedTimestampStorage(self.backend,
+                                              registry=self.registry,
+                                              ttl=60)
+        self.request = DummyRequest()
+        self.request.bound_data = {}
+        patch = mock.patch('cliquet.storage.caching.get_current_request',
+                           return_value=self.request)
+        patch.start()
+        self.addCleanup(patch.stop)
+        transaction.abort()
+        self.addCleanup(transaction.abort)
+        self.storage_kw = {'collection_id': 'test', 'parent_id': '1234'}
+
+    def new_request(self):
+        transaction.commit()
+        self.request.bound_data = {}
+
+    def cached_timestamp(self):
+        cached = self.cache.get('storage_timestamp:test:1234')
+        return cached and cached['timestamp']
+
+    def test_wrapped_backend_attributes_are_exposed(self):
+        self.assertEqual(self.storage._store, self.backend._store)
+
+    def test_outbox_methods_are_delegated_to_backend(self):
+        with mock.patch.multiple(self.backend, create=True,
+                                 outbox_add=mock.DEFAULT,
+                                 outbox_relay=mock.DEFAULT) as mocked:
+            self.storage.outbox_add([{}])
+            self.storage.outbox_relay(None, limit=2)
+        mocked['outbox_add'].assert_called_with([{}])
+        mocked['outbox_relay'].assert_called_with(None, limit=2)
+
+    def test_wrapped_backend_is_never_looked_up_recursively(self):
+        storage = CachedTimestampStorage.__new__(CachedTimestampStorage)
+        self.assertRaises(AttributeError, getattr, storage, '_store')
+
+    def test_schema_initialization_is_delegated_to_backend(self):
+        with mock.patch.object(self.backend, 'initialize_schema') as m:
+            self.storage.initialize_schema()
+        self.assertTrue(m.called)
+
+    def test_timestamps_are_stored_in_cache_backend_once_committed(self):
+        timestamp = self.storage.collection_timestamp(**self.storage_kw)
+        self.assertIsNone(self.cached_timestamp())
+        transaction.commit()
+        self.assertEqual(self.cached_timestamp(), timestamp)
+        self.assertLessEqual(self.cache.ttl('storage_timestamp:test:1234'),
+                             60)
+
+    def test_timestamps_are_not_cached_if_transaction_is_aborted(self):
+        self.storage.collection_timestamp(**self.storage_kw)
+        transaction.abort()
+        self.assertIsNone(self.cached_timestamp())
+
+    def test_timestamps_are_cached_at_once_without_transactions(self):
+        self.registry.settings['transaction_per_request'] = False
+        timestamp = self.storage.collection_timestamp(**self.storage_kw)
+        self.assertEqual(self.cached_timestamp(), timestamp)
+
+    def test_timestamps_are_cached_at_once_outside_requests(self):
+        with mock.patch('cliquet.storage.caching.get_current_request',
+                        return_value=None):
+            timestamp = self.storage.collection_timestamp(**self.storage_kw)
+        self.assertEqual(self.cached_timestamp(), timestamp)
+
+    def test_cached_timestamps_are_used_by_next_requests(self):
+        before = self.storage.collection_timestamp(**self.storage_kw)
+        self.new_request()
+        with mock.patch.object(self.backend, 'collection_timestamp') as m:
+            timestamp = self.storage.collection_timestamp(**self.storage_kw)
+        self.assertEqual(timestamp, before)
+        self.assertFalse(m.called)
+
+    def test_cached_timestamps_are_outdated_on_write(self):
+        for method, args in [('create', ({},)),
+                             ('update', ('abc', {})),
+                             ('delete', ('abc',)),
+                             ('delete_all', ()),
+                             ('purge_deleted', ())]:
+            self.new_request()
+            before = self.storage.collection_timestamp(**self.storage_kw)
+            self.new_request()
+            getattr(self.storage, method)('test', '1234', *args)
+            self.new_request()
+            with mock.patch.object(self.backend, 'collection_timestamp',
+                                   return_value=before + 1) as m:
+                timestamp = self.storage.collection_timestamp(
+                    **self.storage_kw)
+            self.assertTrue(m.called)
+            self.assertEqual(timestamp, before + 1)
+
+    def test_wildcard_writes_outdate_every_parent(self):
+        before = self.storage.collection_timestamp(**self.storage_kw)
+        self.new_request()
+        self.storage.delete_all('test', '*')
+        self.new_request()
+        with mock.patch.object(self.backend, 'collection_timestamp',
+                               return_value=before + 1):
+            timestamp = self.storage.collection_timestamp(**self.storage_kw)
+        self.assertEqual(timestamp, before + 1)
+
+    def test_modified_timestamps_are_not_cached_until_end_of_request(self):
+        self.storage.create(record={}, **self.storage_kw)
+        self.storage.collection_timestamp(**self.storage_kw)
+        self.assertIsNone(self.cached_timestamp())
+
+    def test_timestamps_read_during_a_write_are_not_served_after_commit(self):
+        before = self.storage.collection_timestamp(**self.storage_kw)
+        self.new_request()
+        with mock.patch('cliquet.storage.caching.transaction') as mocked:
+            self.storage.create(record={}, **self.storage_kw)
+        add_hook = mocked.get.return_value.addAfterCommitHook
+        # Another request reads the timestamp before the write is committed.
+        self.new_request()
+        with mock.patch.object(self.backend, 'collection_timestamp',
+                               return_value=before):
+            self.storage.collection_timestamp(**self.storage_kw)
+        self.new_request()
+        self.assertEqual(self.cached_timestamp(), before)
+        bump, = add_hook.call_args[0]
+        bump(True)
+        timestamp = self.storage.collection_timestamp(**self.storage_kw)
+        self.assertGreater(timestamp, before)
+
+    def test_versions_are_bumped_once_per_request(self):
+        with mock.patch('cliquet.storage.caching.transaction') as mocked:
+            self.storage.create(record={}, **self.storage_kw)
+            self.storage.create(record={}, **self.storage_kw)
+        add_hook = mocked.get.return_value.addAfterCommitHook
+        self.assertEqual(add_hook.call_count, 1)
+
+    def test_nothing_is_bumped_after_commit_without_transactions(self):
+        self.registry.settings['transaction_per_request'] = False
+        with mock.patch('cliquet.storage.caching.transaction') as mocked:
+            self.storage.create(record={}, **self.storage_kw)
+        self.assertFalse(mocked.get.called)
+
+    def test_timestamps_are_read_from_backend_without_cache(self):
+        self.registry.cache = None
+        self.storage.create(record={}, **self.storage_kw)
+        self.storage.collection_timestamp(**self.storage_kw)
+        self.new_request()
+        with mock.patch.object(self.backend, 'collection_timestamp') as m:
+            self.storage.collection_timestamp(**self.storage_kw)
+        self.assertTrue(m.called)
+
+
 class RedisStorageTest(MemoryStorageTest, unittest.TestCase):
     backend = redisbackend
     settings = {
@@ -1151,6 +1422,27 @@ class RedisStorageTest(MemoryStorageTest, unittest.TestCase):
                                side_effect=redis.RedisError):
             StorageTest.test_backend_error_is_raised_anywhere(self)
 
+    def test_changes_are_logged_chronologically(self):
+        pass
+
+    def test_records_created_on_update_are_logged_as_created(self):
+        pass
+
+    def test_changes_of_every_collection_of_parent_are_returned(self):
+        pass
+
+    def test_changes_can_be_filtered_by_timestamp(self):
+        pass
+
+    def test_changes_can_be_paginated(self):
+        pass
+
+    def test_changes_are_purged_with_tombstones(self):
+        pass
+
+    def test_changes_are_purged_up_to_tombstones_timestamp(self):
+        pass
+
     def test_get_all_handle_expired_values(self):
         record = '{"id": "foo"}'.encode('utf-8')
         mocked_smember = mock.patch.object(self.storage._client, "smembers",
@@ -1172,7 +1464,7 @@ class RedisStorageTest(MemoryStorageTest, unittest.TestCase):
 
 
 @skip_if_no_postgresql
-class PostgreSQLStorageTest(StorageTest, unittest.TestCase):
+class PostgreSQLStorageTest(ChangesTest, StorageTest, unittest.TestCase):
     backend = postgresql
     settings = load_default_settings('storage')
 
@@ -1221,6 +1513,69 @@ class PostgreSQLStorageTest(StorageTest, unittest.TestCase):
             result = conn.execute(query)
             self.assertEqual(result.fetchone()[0], 1)
 
+    def test_outbox_entries_are_relayed_in_order(self):
+        self.storage.outbox_add([{'a': 1}, {'a': 2}])
+        self.storage.outbox_add([{'a': 3}])
+        relayed = []
+        self.assertEqual(self.storage.outbox_relay(relayed.extend, limit=2), 2)
+        self.assertEqual(relayed, [{'a': 1}, {'a': 2}])
+
+    def test_outbox_entries_are_deleted_once_relayed(self):
+        self.storage.outbox_add([{'a': 1}])
+        self.storage.outbox_relay(lambda entries: None)
+        self.assertEqual(self.storage.outbox_relay(lambda entries: None), 0)
+
+    def test_outbox_entries_are_kept_if_callback_fails(self):
+        self.storage.outbox_add([{'a': 1}])
+
+        def fail(entries):
+            raise ValueError
+
+        self.assertRaises(ValueError, self.storage.outbox_relay, fail)
+        relayed = []
+        self.storage.outbox_relay(relayed.extend)
+        self.assertEqual(relayed, [{'a': 1}])
+
+    def test_outbox_entries_are_not_stored_if_empty(self):
+        self.storage.outbox_add([])
+        self.assertEqual(self.storage.outbox_relay(lambda entries: None), 0)
+
+    def test_outbox_entries_that_failed_are_kept(self):
+        self.storage.outbox_add([{'a': 1}, {'a': 2}])
+        self.assertEqual(self.storage.outbox_relay(lambda entries: [0]), 1)
+        relayed = []
+        self.storage.outbox_relay(relayed.extend)
+        self.assertEqual(relayed, [{'a': 1}])
+
+    def test_outbox_entries_are_moved_aside_after_max_attempts(self):
+        self.storage.outbox_add([{'a': 1}, {'a': 2}])
+        for i in range(2):
+            self.storage.outbox_relay(lambda entries: [0], max_attempts=2)
+        relayed = []
+        self.storage.outbox_relay(relayed.extend)
+        self.assertEqual(relayed, [])
+        with self.storage.client.connect() as conn:
+            query = "SELECT entry, attempts FROM outbox_dead_letters;"
+            dead = conn.execute(query).fetchall()
+        self.assertEqual([(json.loads(entry), attempts)
+                          for entry, attempts in dead], [({'a': 1}, 2)])
+
+    def test_outbox_entries_being_relayed_are_skipped(self):
+        self.storage.outbox_add([{'a': 1}, {'a': 2}])
+        # The storage connection is shared (``StaticPool``).
+        engine = sqlalchemy.create_engine(self.settings['storage_url'])
+        other = engine.connect()
+        locking = other.begin()
+        other.execute("SELECT id FROM outbox ORDER BY id LIMIT 1 FOR UPDATE;")
+        try:
+            relayed = []
+            self.storage.outbox_relay(relayed.extend)
+            self.assertEqual(relayed, [{'a': 2}])
+        finally:
+            locking.rollback()
+            other.close()
+            engine.dispose()
+
     def test_pool_object_is_shared_among_backend_instances(self):
         config = self._get_config()
         storage1 = self.backend.load_from_config(config)
@@ -1228,6 +1583,44 @@ class PostgreSQLStorageTest(StorageTest, unittest.TestCase):
         self.assertEqual(id(storage1.client),
                          id(storage2.client))
 
+    def _benchmark_ids_insertion(self, generator, nb_records=3000):
+        create = """
+        CREATE TEMPORARY TABLE bench_ids (
+            id TEXT NOT NULL,
+            parent_id TEXT NOT NULL,
+            collection_id TEXT NOT NULL,
+            PRIMARY KEY (id, parent_id, collection_id)
+        ) ON COMMIT DROP;
+        """
+        insert = """
+        INSERT INTO bench_ids (id, parent_id, collection_id)
+        VALUES (:object_id, :parent_id, :collection_id);
+        """
+        index_size = "SELECT pg_relation_size('bench_ids_pkey') AS size;"
+        placeholders = dict(parent_id='bob', collection_id='test')
+        with self.storage.client.connect() as conn:
+            conn.execute(create)
+            started = time.time()
+            for i in range(nb_records):
+                placeholders['object_id'] = generator()
+                conn.execute(insert, placeholders)
+            duration = time.time() - started
+            result = conn.execute(index_size)
+            size = result.fetchone()['size']
+        return duration, size
+
+    def test_time_ordered_ids_produce_smaller_primary_key_index(self):
+        _, random_size = self._benchmark_ids_insertion(generators.UUID4())
+        _, ordered_size = self._benchmark_ids_insertion(generators.UUID7())
+        self.assertLess(ordered_size, random_size)
+
+    @skip_if_travis
+    def test_time_ordered_ids_are_not_slower_to_insert(self):
+        random_duration, _ = self._benchmark_ids_insertion(generators.UUID4())
+        ordered_duration, _ = self._benchmark_ids_insertion(generators.UUID7())
+        # Leave some margin for timing noise.
+        self.assertLess(ordered_duration, random_duration * 1.5)
+
     def test_warns_if_configured_pool_size_differs_for_same_backend_type(self):
         self.backend.load_from_config(self._get_config())
         settings = self.settings.copy()
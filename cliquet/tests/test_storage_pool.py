@@ -1,3 +1,4 @@
+import mock
 import time
 import threading
 
@@ -78,3 +79,25 @@ class QueuePoolWithMaxBacklogTest(unittest.TestCase):
         other = pool.recreate()
         self.assertEqual(pool._pool.__class__, other._pool.__class__)
         self.assertEqual(other._pool.max_backlog, 2)
+
+
+@skip_if_no_postgresql
+class EngineSettingsTest(unittest.TestCase):
+    def test_cliquet_settings_are_not_passed_to_sqlalchemy(self):
+        from cliquet.storage.postgresql.client import create_from_config
+
+        config = testing.setUp(settings={
+            'enginetest_url': 'sqlite://',
+            'enginetest_pool_size': 2,
+        })
+        # Every default setting of the prefix (e.g. cache TTL).
+        with mock.patch.dict('cliquet.DEFAULT_SETTINGS',
+                             {'enginetest_backend': 'foo',
+                              'enginetest_cache_ttl_seconds': 10,
+                              'enginetest_url': '',
+                              'enginetest_pool_size': 25}):
+            config.add_settings({'enginetest_backend': 'foo',
+                                 'enginetest_cache_ttl_seconds': 10})
+            client = create_from_config(config, prefix='enginetest_')
+        engine = client.session_factory().get_bind()
+        self.assertEqual(engine.pool.size(), 2)
@@ -14,7 +14,7 @@ from pyramid import testing
 from cliquet.utils import (
     native_value, strip_whitespace, random_bytes_hex, read_env, hmac_digest,
     current_service, encode_header, decode_header, follow_subrequest,
-    build_request, dict_subset
+    build_request, build_response, dict_subset, JSONRenderer
 )
 
 from .support import unittest, DummyRequest
@@ -141,6 +141,54 @@ class BuildRequestTest(unittest.TestCase):
         self.assertTrue(hasattr(request, 'current_service'))
 
 
+class BuildResponseTest(unittest.TestCase):
+
+    def setUp(self):
+        original = build_real_request({'PATH_INFO': '/v0/batch'})
+        self.request = build_request(original, {"path": "/foo"})
+
+    def test_response_body_is_parsed(self):
+        response = pyramid_request.Response(body=b'{"a": 1}')
+        dict_obj = build_response(response, self.request)
+        self.assertEqual(dict_obj['body'], {'a': 1})
+
+    def test_unrendered_value_is_used_as_body(self):
+        self.request.defer_json_rendering = True
+        render = JSONRenderer()(None)
+        render({'a': 1}, {'request': self.request})
+        dict_obj = build_response(self.request.response, self.request)
+        self.assertEqual(dict_obj['body'], {'a': 1})
+        self.assertNotIn('Content-Length', dict_obj['headers'])
+
+
+class JSONRendererTest(unittest.TestCase):
+
+    def setUp(self):
+        self.request = build_real_request({'PATH_INFO': '/foo'})
+        self.render = JSONRenderer()(None)
+
+    def test_values_are_serialized_by_default(self):
+        body = self.render({'a': 1}, {'request': self.request})
+        self.assertEqual(body, '{"a": 1}')
+        self.assertFalse(hasattr(self.request.response, 'json_value'))
+
+    def test_values_are_attached_to_response_if_rendering_is_deferred(self):
+        self.request.defer_json_rendering = True
+        body = self.render({'a': 1}, {'request': self.request})
+        self.assertEqual(body, '')
+        self.assertEqual(self.request.response.json_value, {'a': 1})
+        self.assertEqual(self.request.response.content_type,
+                         'application/json')
+
+    def test_deferred_values_do_not_follow_later_changes(self):
+        self.request.defer_json_rendering = True
+        value = {'data': {'last_modified': 1}}
+        self.render(value, {'request': self.request})
+        value['data']['last_modified'] = 2
+        self.assertEqual(self.request.response.json_value,
+                         {'data': {'last_modified': 1}})
+
+
 class EncodeHeaderTest(unittest.TestCase):
 
     def test_returns_a_string_if_passed_a_string(self):
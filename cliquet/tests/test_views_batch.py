@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import colander
 import mock
+import threading
 import uuid
 
 from pyramid.response import Response
@@ -159,6 +160,172 @@ class BatchViewTest(BaseWebTest, unittest.TestCase):
         self.assertEqual(resp.json['responses'][0]['status'], 201)
         self.assertEqual(resp.json['responses'][1]['status'], 412)
 
+    def test_responses_bodies_are_not_parsed_again(self):
+        request = {'path': '/mushrooms'}
+        body = {'requests': [request]}
+        with mock.patch('webob.response.Response.json',
+                        new_callable=mock.PropertyMock) as mocked:
+            resp = self.app.post_json('/batch', body, headers=self.headers)
+        self.assertFalse(mocked.called)
+        collection = resp.json['responses'][0]
+        self.assertEqual(collection['body'], {'data': []})
+
+    def test_read_records_are_returned_once_within_batch(self):
+        self.app.post_json('/mushrooms', {'data': {'name': 'Amanite'}},
+                           headers=self.headers)
+        request = {'path': '/mushrooms'}
+        body = {'requests': [request, request]}
+        resp = self.app.post_json('/batch', body, headers=self.headers)
+        for collection in resp.json['responses']:
+            self.assertEqual(len(collection['body']['data']), 1)
+
+    def test_responses_can_be_streamed_as_ndjson(self):
+        headers = dict(self.headers, Accept='application/x-ndjson')
+        requests = [{'path': '/mushrooms'}, {'path': '/unknown'}]
+        body = {'requests': requests}
+        resp = self.app.post_json('/batch', body, headers=headers)
+        self.assertIn('application/x-ndjson', resp.headers['Content-Type'])
+        lines = resp.body.decode('utf-8').splitlines()
+        responses = [json.loads(line) for line in lines]
+        self.assertEqual([r['status'] for r in responses], [200, 404])
+        self.assertEqual(responses[0]['body'], {'data': []})
+
+    def test_streamed_writes_are_committed(self):
+        headers = dict(self.headers, Accept='application/x-ndjson')
+        create = {'method': 'POST', 'path': '/mushrooms',
+                  'body': {'data': {'name': 'Amanite'}}}
+        body = {'requests': [create, {'path': '/mushrooms'}]}
+        resp = self.app.post_json('/batch', body, headers=headers)
+        lines = resp.body.decode('utf-8').splitlines()
+        self.assertEqual(len(json.loads(lines[1])['body']['data']), 1)
+        resp = self.app.get('/mushrooms', headers=self.headers)
+        self.assertEqual(len(resp.json['data']), 1)
+
+    def test_parallel_responses_are_provided_in_requests_order(self):
+        requests = [{'path': '/mushrooms'}, {'path': '/'},
+                    {'path': '/unknown'}, {'path': '/mushrooms'}]
+        body = {'requests': requests, 'parallel': True}
+        resp = self.app.post_json('/batch', body, headers=self.headers)
+        responses = resp.json['responses']
+        self.assertEqual([r['status'] for r in responses],
+                         [200, 200, 404, 200])
+        self.assertEqual(responses[1]['body']['project_name'], 'myapp')
+
+    def test_parallel_reads_after_writes_see_the_batch_changes(self):
+        create = {'method': 'POST', 'path': '/mushrooms',
+                  'body': {'data': {'name': 'Amanite'}}}
+        requests = [create, {'path': '/mushrooms'}, {'path': '/mushrooms'}]
+        body = {'requests': requests, 'parallel': True}
+        resp = self.app.post_json('/batch', body, headers=self.headers)
+        responses = resp.json['responses']
+        self.assertEqual(len(responses[1]['body']['data']), 1)
+        self.assertEqual(len(responses[2]['body']['data']), 1)
+
+
+class MemoryBatchViewTest(BaseWebTest, unittest.TestCase):
+
+    def get_app_settings(self, extras=None):
+        settings = super(MemoryBatchViewTest, self).get_app_settings(extras)
+        # Returns the stored records themselves.
+        settings['storage_backend'] = 'cliquet.storage.memory'
+        return settings
+
+    def test_read_records_are_not_altered_by_next_subrequests(self):
+        resp = self.app.post_json('/mushrooms',
+                                  {'data': {'name': 'Amanite'}},
+                                  headers=self.headers)
+        record = resp.json['data']
+        url = '/mushrooms/%s' % record['id']
+        requests = [{'path': url}, {'method': 'DELETE', 'path': url}]
+        resp = self.app.post_json('/batch', {'requests': requests},
+                                  headers=self.headers)
+        read, deleted = resp.json['responses']
+        self.assertEqual(read['body']['data'], record)
+        self.assertEqual(read['headers']['ETag'],
+                         '"%s"' % record['last_modified'])
+        self.assertNotEqual(deleted['body']['data']['last_modified'],
+                            record['last_modified'])
+
+
+class BatchCostTest(BaseWebTest, unittest.TestCase):
+
+    def get_app_settings(self, extras=None):
+        settings = super(BatchCostTest, self).get_app_settings(extras)
+        settings['batch_max_requests'] = None
+        settings['batch_max_cost'] = 10
+        return settings
+
+    def setUp(self):
+        super(BatchCostTest, self).setUp()
+        self.record_url = '/mushrooms/%s' % uuid.uuid4()
+        self.patch = {'method': 'PATCH', 'path': self.record_url,
+                      'body': {'data': {'name': 'Amanite'}}}
+
+    def post_batch(self, requests, status=200):
+        body = {'requests': requests}
+        return self.app.post_json('/batch', body, headers=self.headers,
+                                  status=status)
+
+    def test_requests_are_allowed_within_the_budget(self):
+        self.post_batch([self.patch] * 5)
+
+    def test_request_exceeding_the_budget_is_reported(self):
+        resp = self.post_batch([self.patch] * 6, status=400)
+        error = resp.json['details'][0]
+        self.assertEqual(error['name'], 'requests.5')
+        self.assertEqual(error['description'],
+                         'Batch cost is limited to 10 (exceeded by request 5 '
+                         'with cost 2.0)')
+
+    def test_collection_reads_cost_depends_on_number_of_records(self):
+        self.post_batch([{'path': '/mushrooms'}], status=400)
+        self.post_batch([{'path': '/mushrooms?_limit=100'}] * 5)
+
+    def test_invalid_limit_costs_the_maximum_number_of_records(self):
+        self.post_batch([{'path': '/mushrooms?_limit=abc'}], status=400)
+
+    def test_negative_limit_costs_the_maximum_number_of_records(self):
+        self.post_batch([{'path': '/mushrooms?_limit=-100000'}], status=400)
+
+    def test_zero_limit_costs_the_maximum_number_of_records(self):
+        self.post_batch([{'path': '/mushrooms?_limit=0'}], status=400)
+
+    def test_collection_reads_cost_is_bounded_by_max_fetch_size(self):
+        settings = self.app.app.registry.settings
+        with mock.patch.dict(settings, [('storage_max_fetch_size', 100)]):
+            self.post_batch([{'path': '/mushrooms?_limit=10000'}] * 5)
+
+    def test_collection_reads_cost_is_bounded_by_pagination(self):
+        settings = self.app.app.registry.settings
+        with mock.patch.dict(settings, [('paginate_by', 10)]):
+            self.post_batch([{'path': '/mushrooms?_limit=10000'}] * 9)
+
+    def test_resources_can_have_a_cost_factor(self):
+        settings = self.app.app.registry.settings
+        with mock.patch.dict(settings, [('mushroom_batch_cost_factor', 6)]):
+            self.post_batch([self.patch], status=400)
+
+    def test_unknown_paths_cost_depends_on_method_only(self):
+        self.post_batch([{'path': '/unknown'}] * 10)
+
+    def test_other_views_cost_depends_on_method_only(self):
+        self.post_batch([{'path': '/'}] * 10)
+        self.post_batch([{'path': '/'}] * 11, status=400)
+
+    def test_users_cost_is_limited_per_period(self):
+        settings = self.app.app.registry.settings
+        with mock.patch.dict(settings, [('batch_user_max_cost', 15)]):
+            self.post_batch([self.patch] * 5)
+            resp = self.post_batch([self.patch] * 3, status=429)
+        self.assertEqual(resp.json['errno'], 117)
+        self.assertLessEqual(int(resp.headers['Retry-After']), 60)
+
+    def test_anonymous_cost_is_not_limited_per_period(self):
+        settings = self.app.app.registry.settings
+        with mock.patch.dict(settings, [('batch_user_max_cost', 15)]):
+            for i in range(3):
+                self.app.post_json('/batch', {'requests': [self.patch] * 5})
+
 
 class BatchSchemaTest(unittest.TestCase):
     def setUp(self):
@@ -170,6 +337,10 @@ class BatchSchemaTest(unittest.TestCase):
     def test_requests_is_mandatory(self):
         self.assertInvalid({})
 
+    def test_parallel_is_disabled_by_default(self):
+        deserialized = self.schema.deserialize({'requests': []})
+        self.assertFalse(deserialized['parallel'])
+
     def test_unknown_attributes_are_dropped(self):
         deserialized = self.schema.deserialize({'requests': [], 'unknown': 42})
         self.assertNotIn('unknown', deserialized)
@@ -409,3 +580,95 @@ class BatchServiceTest(unittest.TestCase):
         self.assertEqual(self.request.errors[0]['description'],
                          'Number of requests is limited to 22')
         self.assertIsNone(result)  # rest of view not executed
+
+    def _invoked_threads(self, validated):
+        threads = []
+
+        def invoke(subrequest, **kwargs):
+            threads.append(threading.current_thread())
+            return Response()
+
+        self.request.invoke_subrequest.side_effect = invoke
+        self.post(validated)
+        return threads
+
+    def test_subrequests_are_invoked_sequentially_by_default(self):
+        requests = [{'path': '/'}, {'path': '/'}]
+        threads = self._invoked_threads({'requests': requests})
+        self.assertEqual(set(threads), {threading.current_thread()})
+
+    def test_readonly_subrequests_are_invoked_in_pool_if_parallel(self):
+        requests = [{'path': '/'}, {'path': '/', 'method': 'HEAD'}]
+        threads = self._invoked_threads({'requests': requests,
+                                         'parallel': True})
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_subrequests_following_a_write_are_invoked_sequentially(self):
+        requests = [{'path': '/'}, {'path': '/'},
+                    {'path': '/', 'method': 'POST'}, {'path': '/'}]
+        threads = self._invoked_threads({'requests': requests,
+                                         'parallel': True})
+        current = threading.current_thread()
+        self.assertNotEqual(threads[0], current)
+        self.assertNotEqual(threads[1], current)
+        self.assertEqual(threads[2:], [current, current])
+
+    def test_parallel_subrequests_have_their_own_bound_data(self):
+        self.request.bound_data = {'memo': {'a': 1}, 'modified': set()}
+        bound_data = []
+
+        def invoke(subrequest, **kwargs):
+            bound_data.append(subrequest.bound_data)
+            subrequest.bound_data['memo'][subrequest.path] = 2
+            subrequest.bound_data['modified'].add(subrequest.path)
+            subrequest.bound_data.setdefault('principals', []).append(1)
+            return Response()
+
+        self.request.invoke_subrequest.side_effect = invoke
+        requests = [{'path': '/a'}, {'path': '/b'}]
+        self.post({'requests': requests, 'parallel': True})
+
+        self.assertNotIn(self.request.bound_data, bound_data)
+        self.assertIsNot(bound_data[0]['memo'], bound_data[1]['memo'])
+        self.assertEqual(self.request.bound_data,
+                         {'memo': {'a': 1, '/v0/a': 2, '/v0/b': 2},
+                          'modified': {'/v0/a', '/v0/b'},
+                          'principals': [1]})
+
+    def test_parallel_is_ignored_if_no_workers_are_configured(self):
+        self.request.registry.settings['batch_parallel_max_workers'] = 0
+        requests = [{'path': '/'}, {'path': '/'}]
+        threads = self._invoked_threads({'requests': requests,
+                                         'parallel': True})
+        self.assertEqual(set(threads), {threading.current_thread()})
+
+    def _stream(self, requests):
+        self.request.accept.best_match.return_value = 'application/x-ndjson'
+        return self.post({'requests': requests})
+
+    def test_readonly_subrequests_are_invoked_while_streaming(self):
+        response = self._stream([{'path': '/'}, {'path': '/'}])
+        self.assertFalse(self.request.invoke_subrequest.called)
+        lines = list(response.app_iter)
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(self.request.invoke_subrequest.call_count, 2)
+
+    def test_streamed_reads_are_run_within_a_transaction(self):
+        with mock.patch('cliquet.views.batch.transaction') as mocked:
+            response = self._stream([{'path': '/'}])
+            list(response.app_iter)
+        self.assertTrue(mocked.begin.called)
+        self.assertTrue(mocked.commit.called)
+
+    def test_subrequests_are_invoked_before_streaming_if_writes(self):
+        self._stream([{'path': '/', 'method': 'POST'}, {'path': '/'}])
+        self.assertEqual(self.request.invoke_subrequest.call_count, 2)
+
+    def test_stream_ends_with_an_error_if_streamed_subrequest_fails(self):
+        self.request.invoke_subrequest.side_effect = (Response(), ValueError)
+        with mock.patch('cliquet.views.batch.transaction') as mocked:
+            response = self._stream([{'path': '/'}, {'path': '/'}])
+            lines = list(response.app_iter)
+        self.assertTrue(mocked.abort.called)
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[1].decode('utf-8'))['status'], 500)
@@ -0,0 +1,86 @@
+from cliquet.utils import encode64, json
+
+from .support import BaseWebTest, unittest
+
+
+class ChangesViewTest(BaseWebTest, unittest.TestCase):
+
+    def get_app_settings(self, additional_settings=None):
+        settings = super(ChangesViewTest, self).get_app_settings(
+            additional_settings)
+        settings['storage_backend'] = 'cliquet.storage.memory'
+        settings['changes_enabled'] = True
+        return settings
+
+    def setUp(self):
+        super(ChangesViewTest, self).setUp()
+        self.records = []
+        for i in range(3):
+            resp = self.app.post_json(self.collection_url,
+                                      {'data': {'name': 'mush-%s' % i}},
+                                      headers=self.headers)
+            self.records.append(resp.json['data'])
+
+    def test_returns_changes_of_current_user(self):
+        record_id = self.records[0]['id']
+        self.app.delete(self.get_item_url(record_id), headers=self.headers)
+        resp = self.app.get('/changes', headers=self.headers)
+        changes = resp.json['data']
+        self.assertEqual([c['action'] for c in changes],
+                         ['create', 'create', 'create', 'delete'])
+        self.assertEqual(changes[-1]['id'], record_id)
+        self.assertEqual(changes[-1]['collection'], 'mushroom')
+
+    def test_changes_of_other_users_are_not_returned(self):
+        headers = self.headers.copy()
+        headers['Authorization'] = 'Basic bWF0OjI='
+        resp = self.app.get('/changes', headers=headers)
+        self.assertEqual(resp.json['data'], [])
+
+    def test_requires_authentication(self):
+        self.app.get('/changes', status=401)
+
+    def test_changes_can_be_filtered_by_timestamp(self):
+        since = self.records[0]['last_modified']
+        resp = self.app.get('/changes?_since=%s' % since,
+                            headers=self.headers)
+        self.assertEqual([c['id'] for c in resp.json['data']],
+                         [r['id'] for r in self.records[1:]])
+
+    def test_since_must_be_an_integer(self):
+        self.app.get('/changes?_since=abc', headers=self.headers, status=400)
+
+    def test_changes_are_paginated(self):
+        resp = self.app.get('/changes?_limit=2', headers=self.headers)
+        self.assertEqual(len(resp.json['data']), 2)
+        next_page = resp.headers['Next-Page'].replace('http://localhost/v0',
+                                                      '')
+        resp = self.app.get(next_page, headers=self.headers)
+        self.assertEqual([c['id'] for c in resp.json['data']],
+                         [self.records[2]['id']])
+        self.assertNotIn('Next-Page', resp.headers)
+
+    def test_limit_must_be_a_positive_integer(self):
+        for limit in ('abc', '0', '-1'):
+            self.app.get('/changes?_limit=%s' % limit, headers=self.headers,
+                         status=400)
+
+    def test_invalid_token_is_rejected(self):
+        self.app.get('/changes?_token=abc', headers=self.headers, status=400)
+
+    def test_token_values_types_are_checked(self):
+        for last_change in (['abc', 'mushroom', 'a'], [True, 'mushroom', 'a'],
+                            [1, 2, 'a'], [1, 'mushroom', None]):
+            token = encode64(json.dumps({'last_change': last_change}))
+            self.app.get('/changes?_token=%s' % token, headers=self.headers,
+                         status=400)
+
+    def test_capability_is_exposed(self):
+        resp = self.app.get('/')
+        self.assertIn('changes', resp.json['capabilities'])
+
+
+class DisabledChangesViewTest(BaseWebTest, unittest.TestCase):
+
+    def test_endpoint_is_not_available_by_default(self):
+        self.app.get('/changes', headers=self.headers, status=404)
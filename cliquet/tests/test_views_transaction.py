@@ -54,7 +54,7 @@ class PostgreSQLTest(BaseWebTest):
     def run_failing_post(self):
         patch = mock.patch.object(
             self.permission,
-            'add_principal_to_ace',
+            'apply_many',
             side_effect=BackendError('boom'))
         self.addCleanup(patch.stop)
         patch.start()
@@ -93,6 +93,16 @@ class TransactionTest(PostgreSQLTest, unittest.TestCase):
         self.assertEqual(resp.json['responses'][1]['body']['data'][0]['name'],
                          'Vesse de loup')
 
+    def test_parallel_reads_are_served_from_committed_data(self):
+        self.app.post_json('/mushrooms', {'data': {'name': 'Amanite'}},
+                           headers=self.headers)
+        request_get = {'method': 'GET', 'path': '/mushrooms'}
+        body = {'requests': [request_get] * 10, 'parallel': True}
+        for i in range(3):
+            resp = self.app.post_json('/batch', body, headers=self.headers)
+            for response in resp.json['responses']:
+                self.assertEqual(len(response['body']['data']), 1)
+
     def test_modifications_are_rolled_back_on_error(self):
         self.run_failing_batch()
 
@@ -1,4 +1,5 @@
 import ast
+import copy
 import hashlib
 import hmac
 import os
@@ -37,6 +38,7 @@ except ImportError:  # pragma: no cover
     sqlalchemy = None
 
 from pyramid import httpexceptions
+from pyramid.renderers import JSON
 from pyramid.request import Request, apply_request_extensions
 from pyramid.settings import aslist
 from pyramid.view import render_view_to_response
@@ -236,6 +238,32 @@ def current_resource_name(request):
     return resource_name
 
 
+class JSONRenderer(JSON):
+    """JSON renderer that does not serialize the values of subrequests
+    flagged with a ``defer_json_rendering`` attribute.
+
+    A copy of the value is attached to the response instead
+    (``json_value``), so that the batch view can use it as is, rather than
+    parsing the response body (see :func:`build_response`). Since it is
+    serialized later, it must not follow the changes of the next
+    subrequests to the objects returned by the view (e.g. stored records).
+    """
+    def __call__(self, info):
+        render = super(JSONRenderer, self).__call__(info)
+
+        def _render(value, system):
+            request = system.get('request')
+            if getattr(request, 'defer_json_rendering', False) is not True:
+                return render(value, system)
+            response = request.response
+            if response.content_type == response.default_content_type:
+                response.content_type = 'application/json'
+            response.json_value = copy.deepcopy(value)
+            return ''
+
+        return _render
+
+
 def build_request(original, dict_obj):
     """
     Transform a dict object into a ``pyramid.request.Request`` object.
@@ -297,10 +325,15 @@ def build_response(response, request):
     body = ''
     if request.method != 'HEAD':
         # XXX : Pyramid should not have built response body for HEAD!
-        try:
-            body = response.json
-        except ValueError:
-            body = response.body
+        if hasattr(response, 'json_value'):
+            # Not serialized (see :class:`JSONRenderer`).
+            body = response.json_value
+            dict_obj['headers'].pop('Content-Length', None)
+        else:
+            try:
+                body = response.json
+            except ValueError:
+                body = response.body
     dict_obj['body'] = body
 
     return dict_obj
@@ -1,18 +1,42 @@
+import copy
+import functools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
 import colander
 import six
+import transaction
 
 from pyramid import httpexceptions
+from pyramid.interfaces import IRoutesMapper
+from pyramid.response import Response
 from pyramid.security import NO_PERMISSION_REQUIRED
 
 from cliquet import errors
+from cliquet import events
 from cliquet import logger
 from cliquet import Service
-from cliquet.utils import merge_dicts, build_request, build_response
+from cliquet.utils import (merge_dicts, build_request, build_response,
+                           json_serializer, encode_header)
 
 
 valid_http_method = colander.OneOf(('GET', 'HEAD', 'DELETE', 'TRACE',
                                     'POST', 'PUT', 'PATCH'))
 
+READONLY_METHODS = ('GET', 'HEAD')
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+_POOL_LOCK = threading.Lock()
+_POOLS = {}
+
+# See :func:`cliquet.events.notify_resource_event`.
+_RESOURCE_EVENTS_KEY = 'resource_events'
+
 
 def string_values(node, cstruct):
     """Validate that a ``colander.Mapping`` only has strings in its values.
@@ -44,6 +68,8 @@ class BatchPayloadSchema(colander.MappingSchema):
     defaults = BatchRequestSchema(missing=colander.drop).clone()
     requests = colander.SchemaNode(colander.Sequence(),
                                    BatchRequestSchema())
+    parallel = colander.SchemaNode(colander.Boolean(),
+                                   missing=False)
 
     def unflatten(self, data):
         """Preprocess received data to merge defaults.
@@ -85,38 +111,297 @@ def post_batch(request):
         request.errors.add('body', 'requests', error_msg)
         return
 
-    responses = []
-
-    sublogger = logger.new()
+    acceptable = ('application/json', NDJSON_CONTENT_TYPE)
+    stream = request.accept.best_match(acceptable) == NDJSON_CONTENT_TYPE
 
+    subrequests = []
     for subrequest_spec in requests:
         subrequest = build_request(request, subrequest_spec)
+        # Obtain the responses values as is, instead of serializing them
+        # to be parsed again.
+        subrequest.defer_json_rendering = True
+        if stream and 'Accept' not in subrequest_spec.get('headers', {}):
+            # The batch request ``Accept`` header is not meant for them.
+            subrequest.headers['Accept'] = 'application/json'
+        subrequests.append(subrequest)
 
-        sublogger.bind(path=subrequest.path,
-                       method=subrequest.method)
+    if not _check_cost(request, subrequests):
+        return
+
+    if stream:
+        readonly = all([subrequest.method in READONLY_METHODS
+                        for subrequest in subrequests])
+        if readonly:
+            # Run the subrequests while streaming, once the batch
+            # transaction is over.
+            results = _in_transaction(request,
+                                      _invoke_subrequests(request,
+                                                          subrequests))
+        else:
+            # The writes have to be part of the batch transaction.
+            results = list(_invoke_subrequests(request, subrequests))
+        _bind_summary(request, batch_size)
+        return Response(app_iter=_iter_ndjson(results),
+                        content_type=NDJSON_CONTENT_TYPE,
+                        charset='utf-8')
+
+    results = _invoke_subrequests(request, subrequests)
+    responses = [build_response(resp, subrequest)
+                 for resp, subrequest in _log_subrequests(results)]
+
+    _bind_summary(request, batch_size)
+    return {
+        'responses': responses
+    }
+
+
+def subrequest_cost(request, subrequest):
+    """Estimate the cost of the specified batch subrequest.
+
+    The cost of its method (e.g. ``cliquet.batch_get_cost``) is increased
+    by the number of records that can be read or deleted on collections
+    (``cliquet.batch_record_cost`` each), and multiplied by the factor of its
+    resource (e.g. ``cliquet.mushroom_batch_cost_factor``).
+
+    :rtype: float
+    """
+    settings = request.registry.settings
+    method = subrequest.method.lower()
+    cost = float(settings.get('batch_%s_cost' % method, 1))
+
+    mapper = request.registry.queryUtility(IRoutesMapper)
+    route = mapper(subrequest)['route']
+    if route is None:
+        return cost
+    service = request.registry.cornice_services.get(route.pattern)
+    resource = getattr(service, 'resource', None)
+    if resource is None:
+        return cost
+
+    viewset = service.viewset
+    is_collection = service.name == viewset.get_service_name('collection',
+                                                             resource)
+    if is_collection and method in ('get', 'head', 'delete'):
+        paginate_by = settings.get('paginate_by')
+        max_fetch_size = settings.get('storage_max_fetch_size')
+        max_records = int(paginate_by or max_fetch_size or 0)
         try:
-            # Invoke subrequest without individual transaction.
-            resp, subrequest = request.follow_subrequest(subrequest,
-                                                         use_tweens=False)
-        except httpexceptions.HTTPException as e:
-            if e.content_type == 'application/json':
-                resp = e
-            else:
-                # JSONify raw Pyramid errors.
-                resp = errors.http_error(e)
-
-        sublogger.bind(code=resp.status_code)
-        sublogger.info('subrequest.summary')
+            records = int(subrequest.GET['_limit'])
+        except (KeyError, TypeError, ValueError):
+            records = 0
+        if records <= 0 or (max_records and records > max_records):
+            # Zero (or less) means no limit, like a missing ``_limit``.
+            records = max_records
+        cost += records * float(settings.get('batch_record_cost', 0))
+
+    resource_name = viewset.get_name(resource)
+    factor = settings.get('%s_batch_cost_factor' % resource_name, 1)
+    return cost * float(factor)
+
 
-        dict_resp = build_response(resp, subrequest)
-        responses.append(dict_resp)
+def _check_cost(request, subrequests):
+    """Reject the batch if its cost exceeds the budget of a batch, or the
+    remaining budget of the current user.
 
+    :returns: ``False`` if errors were added to the request.
+    """
+    settings = request.registry.settings
+    max_cost = settings.get('batch_max_cost')
+    user_max_cost = settings.get('batch_user_max_cost')
+    if not max_cost and not user_max_cost:
+        return True
+
+    total = 0
+    for i, subrequest in enumerate(subrequests):
+        cost = subrequest_cost(request, subrequest)
+        total += cost
+        if max_cost and total > float(max_cost):
+            error_msg = ('Batch cost is limited to %s (exceeded by request %s '
+                         'with cost %s)' % (max_cost, i, cost))
+            request.errors.add('body', 'requests.%s' % i, error_msg)
+            return False
+
+    # The batch endpoint itself does not require authentication.
+    if not user_max_cost or request.authenticated_userid is None:
+        return True
+    userid = request.prefixed_userid
+
+    # Count the cost of the batches of the current period.
+    period = float(settings['batch_user_cost_period_seconds'])
+    now = time.time()
+    started = math.floor(now / period) * period
+    key = 'batch_cost:%s:%s' % (userid, int(started))
+    spent = float(request.registry.cache.get(key) or 0)
+    if spent + total > float(user_max_cost):
+        retry_after = int(math.ceil(started + period - now))
+        error_msg = ('Batch cost is limited to %s per %s seconds '
+                     '(%s remaining)' % (user_max_cost, int(period),
+                                         float(user_max_cost) - spent))
+        response = errors.http_error(
+            httpexceptions.HTTPTooManyRequests(),
+            errno=errors.ERRORS.CLIENT_REACHED_CAPACITY,
+            message=error_msg)
+        response.headers['Retry-After'] = encode_header('%s' % retry_after)
+        raise response
+    request.registry.cache.set(key, spent + total, period)
+    return True
+
+
+def _bind_summary(request, batch_size):
     # Rebing batch request for summary
     logger.bind(path=batch.path,
                 method=request.method,
                 batch_size=batch_size,
                 agent=request.headers.get('User-Agent'),)
 
-    return {
-        'responses': responses
-    }
+
+def _invoke_subrequests(request, subrequests):
+    """Invoke the subrequests, and yield their responses in order."""
+    readonly = []
+    max_workers = int(request.registry.settings.get(
+        'batch_parallel_max_workers') or 0)
+    if request.validated.get('parallel') and max_workers > 0:
+        # Reads that precede the first write do not depend on the batch
+        # transaction: run them concurrently.
+        for subrequest in subrequests:
+            if subrequest.method not in READONLY_METHODS:
+                break
+            readonly.append(subrequest)
+    if len(readonly) > 1:
+        # Pool threads must not share the batch request bound data.
+        for subrequest in readonly:
+            subrequest.bound_data = _copy_bound_data(request.bound_data)
+        pool = _get_pool(max_workers)
+        invoke = functools.partial(_invoke_readonly_subrequest, request)
+        for resp, subrequest in pool.imap(invoke, readonly):
+            _merge_bound_data(request.bound_data, subrequest.bound_data)
+            yield resp, subrequest
+    else:
+        readonly = []
+
+    # Writes (and what follows) share the batch transaction, in order.
+    for subrequest in subrequests[len(readonly):]:
+        yield _invoke_subrequest(request, subrequest)
+
+
+def _log_subrequests(results):
+    sublogger = logger.new()
+
+    for resp, subrequest in results:
+        sublogger.bind(path=subrequest.path,
+                       method=subrequest.method,
+                       code=resp.status_code)
+        sublogger.info('subrequest.summary')
+        yield resp, subrequest
+
+
+def _in_transaction(request, results):
+    """Obtain the `results` within a transaction of their own, that notifies
+    the resource events of `request` once committed.
+    """
+    transaction.begin()
+    events.notify_on_commit(request)
+    success = False
+    try:
+        for result in results:
+            yield result
+        success = True
+    finally:
+        # Also when the client goes away before the end.
+        if success:
+            transaction.commit()
+        else:
+            transaction.abort()
+
+
+def _iter_ndjson(results):
+    """Serialize the subresponses as soon as they are obtained, one JSON
+    mapping per line.
+    """
+    try:
+        for resp, subrequest in _log_subrequests(results):
+            dict_resp = build_response(resp, subrequest)
+            yield (json_serializer(dict_resp) + '\n').encode('utf-8')
+    except Exception:
+        # The response status was already sent: end the stream with an
+        # error instead of the missing subresponses.
+        logger.exception("Batch stream failure")
+        error = errors.http_error(httpexceptions.HTTPInternalServerError(),
+                                  errno=errors.ERRORS.UNDEFINED)
+        dict_resp = {'path': batch.path,
+                     'status': error.status_code,
+                     'headers': {},
+                     'body': error.json}
+        yield (json_serializer(dict_resp) + '\n').encode('utf-8')
+
+
+def _invoke_subrequest(request, subrequest):
+    try:
+        # Invoke subrequest without individual transaction.
+        return request.follow_subrequest(subrequest, use_tweens=False)
+    except httpexceptions.HTTPException as e:
+        if e.content_type == 'application/json':
+            return e, subrequest
+        # JSONify raw Pyramid errors.
+        return errors.http_error(e), subrequest
+
+
+def _invoke_readonly_subrequest(request, subrequest):
+    """Invoke a read-only subrequest from a pool thread, within a
+    transaction of its own (and thus with its own storage connection).
+    """
+    transaction.begin()
+    try:
+        return _invoke_subrequest(request, subrequest)
+    finally:
+        # Nothing to commit.
+        transaction.abort()
+
+
+def _copy_bound_data(bound_data):
+    """Return a copy of the specified request bound data, down to the values
+    (e.g. memoized permissions), for a subrequest run in a pool thread.
+    Its resource events are stacked from scratch.
+    """
+    return dict([(key, copy.copy(value)) for key, value in bound_data.items()
+                 if key != _RESOURCE_EVENTS_KEY])
+
+
+def _merge_bound_data(bound_data, other):
+    """Merge the bound data of a subrequest run in a pool thread into the
+    batch request ones. Values already known to the batch request are kept,
+    and resource events are stacked after the previous ones.
+    """
+    for key, value in other.items():
+        if key == _RESOURCE_EVENTS_KEY:
+            _merge_resource_events(bound_data, value)
+            continue
+        current = bound_data.setdefault(key, value)
+        if isinstance(current, dict) and current is not value:
+            for subkey, subvalue in value.items():
+                current.setdefault(subkey, subvalue)
+        elif isinstance(current, set) and current is not value:
+            current.update(value)
+
+
+def _merge_resource_events(bound_data, other):
+    """Extend the impacted records of the similar resource events (same
+    resource, same action) like :func:`cliquet.events.notify_resource_event`
+    does, or stack new ones.
+    """
+    events = bound_data.setdefault(_RESOURCE_EVENTS_KEY, OrderedDict())
+    for group_by, (action, timestamp, impacted, request) in other.items():
+        event = events.setdefault(group_by, (action, timestamp, [], request))
+        event[2].extend(impacted)
+
+
+def _get_pool(max_workers):
+    """Return the threads pool shared by batch requests, created lazily so
+    that every forked worker process has its own.
+    """
+    key = (os.getpid(), max_workers)
+    with _POOL_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = ThreadPool(max_workers)
+    return pool
@@ -0,0 +1,92 @@
+import six
+from pyramid import httpexceptions
+from pyramid.security import NO_PERMISSION_REQUIRED, Authenticated
+
+from cliquet import Service
+from cliquet.errors import raise_invalid
+from cliquet.utils import (native_value, encode64, decode64, encode_header,
+                           json)
+
+changes = Service(name="changes", path='/changes',
+                  description="Changes of every collection")
+
+
+@changes.get(permission=NO_PERMISSION_REQUIRED)
+def get_changes(request):
+    """Return the changes of the records of every collection of the current
+    user, in chronological order.
+
+    Pages are obtained with a range scan of the storage changes log, that
+    resumes after the last change of the previous page (*keyset
+    pagination*).
+    """
+    if Authenticated not in request.effective_principals:
+        # Changes are isolated by user.
+        raise httpexceptions.HTTPForbidden()
+
+    settings = request.registry.settings
+    since = _extract_integer(request, '_since')
+    limit = _extract_integer(request, '_limit', minimum=1)
+    paginate_by = settings['paginate_by']
+    if limit is None or (paginate_by and limit > int(paginate_by)):
+        limit = int(paginate_by or settings['storage_max_fetch_size'])
+    after = _extract_token(request)
+
+    storage = request.registry.storage
+    entries = storage.get_changes(parent_id=request.prefixed_userid,
+                                  since=since, after=after, limit=limit)
+
+    data = [{'id': entry['id'],
+             'collection': entry['collection_id'],
+             'last_modified': entry['last_modified'],
+             'action': entry['action']} for entry in entries]
+
+    if len(entries) == limit:
+        last = entries[-1]
+        token = {'last_change': [last['last_modified'],
+                                 last['collection_id'],
+                                 last['id']]}
+        params = request.GET.copy()
+        params['_limit'] = limit
+        params['_token'] = encode64(json.dumps(token))
+        next_page = request.route_url(changes.name, _query=params)
+        request.response.headers['Next-Page'] = encode_header(next_page)
+
+    return {'data': data}
+
+
+def _extract_integer(request, param, minimum=None):
+    value = request.GET.get(param)
+    if value is None:
+        return None
+    value = native_value(value.strip('"'))
+    if not isinstance(value, six.integer_types) or \
+            (minimum is not None and value < minimum):
+        error_details = {
+            'name': param,
+            'location': 'querystring',
+            'description': 'Invalid value for %s' % param
+        }
+        raise_invalid(request, **error_details)
+    return value
+
+
+def _extract_token(request):
+    token = request.GET.get('_token')
+    if not token:
+        return None
+    try:
+        tokeninfo = json.loads(decode64(token))
+        last_modified, collection_id, object_id = tokeninfo['last_change']
+        if isinstance(last_modified, bool) or \
+                not isinstance(last_modified, six.integer_types) or \
+                not isinstance(collection_id, six.string_types) or \
+                not isinstance(object_id, six.string_types):
+            raise ValueError('Invalid last change')
+    except (ValueError, KeyError, TypeError):
+        error_details = {
+            'location': 'querystring',
+            'description': '_token has invalid content'
+        }
+        raise_invalid(request, **error_details)
+    return (last_modified, collection_id, object_id)